@@ -38,6 +38,10 @@ def build(nonumba, noupx):
     shutil.copytree("documentation/", "dist/VolatileSpace/documentation/", dirs_exist_ok=True)
     shutil.copytree("Resources/", "dist/VolatileSpace/Resources/", dirs_exist_ok=True)
 
+    # prebuilt numba cache, so packaged build starts without compiling
+    if not nonumba:
+        os.system("uv run python main.py --precompile dist/VolatileSpace/numba_cache")
+
     # cleanup
     try:
         os.remove(f"{APP_NAME}.spec")
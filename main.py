@@ -1,34 +1,20 @@
-import pygame
-from numba import njit  # noqa
-
-from volatilespace import peripherals
-
-
-# these functions are used to import physics which is then compiled
-# but pygame is kept responsive, and able to quit
-def import_quartic_solver():
-    """Import just to compile numba"""
-    from volatilespace.physics import quartic_solver   # noqa
-
-
-def import_phys_shared():
-    """Import just to compile numba"""
-    from volatilespace.physics import phys_shared   # noqa
-    from volatilespace.physics.enhanced_kepler_solver import solve_kepler_ell   # noqa
+import argparse
+import multiprocessing
+from ast import literal_eval
 
+import pygame
 
-def import_orbit_intersect():
-    """Import just to compile numba"""
-    from volatilespace.physics import orbit_intersect   # noqa
+from volatilespace import compiler, peripherals
 
 
+# these functions are used to import modules while pygame is kept responsive, and able to quit
 def import_game():
-    """Import just to compile numba"""
+    """Import game"""
     from volatilespace import game   # noqa
 
 
 def import_editor():
-    """Import just to compile numba"""
+    """Import editor"""
     from volatilespace import editor   # noqa
 
 
@@ -41,8 +27,10 @@ def main():
     if peripherals.load_settings("graphics", "first_run") is True:
         avail_res = pygame.display.get_desktop_sizes()
         (screen_x, screen_y) = avail_res[0]   # use highest resolution
-        peripherals.save_settings("graphics", "resolution", [screen_x, screen_y])
-        peripherals.save_settings("graphics", "first_run", False)
+        peripherals.save_settings_many([
+            ("graphics", "resolution", [screen_x, screen_y]),
+            ("graphics", "first_run", False),
+        ])
     else:
         (screen_x, screen_y) = peripherals.load_settings("graphics", "resolution")
     fullscreen = peripherals.load_settings("graphics", "fullscreen")
@@ -62,18 +50,14 @@ def main():
     loading.stage(0)
     from volatilespace import menu
     loading.stage(1)
-    responsive_blocking(target=import_quartic_solver)
+    compiler.compile_all(loading.progress)
     loading.stage(2)
-    responsive_blocking(target=import_phys_shared)
-    loading.stage(3)
-    responsive_blocking(target=import_orbit_intersect)
-    loading.stage(4)
     responsive_blocking(target=import_game)
     from volatilespace import game
-    loading.stage(5)
+    loading.stage(3)
     responsive_blocking(target=import_editor)
     from volatilespace import editor
-    loading.stage(6)
+    loading.stage(4)
     menu = menu.Menu()
     game = game.Game()
     editor = editor.Editor()
@@ -124,8 +108,56 @@ def main():
                     game.reload_settings()
             if event.type == pygame.QUIT:
                 run = False
+    peripherals.wait_saves()
     pygame.quit()
 
 
+def parser():
+    """Setup argument parser for CLI"""
+    parser = argparse.ArgumentParser(
+        prog="main.py",
+        description="Volatile Space",
+    )
+    parser._positionals.title = "arguments"
+    parser.add_argument(
+        "--precompile",
+        nargs="?",
+        const="",
+        metavar="DIR",
+        help="Compile physics for all configurations and store it in cache, optionally in specified directory, then exit",
+    )
+    parser.add_argument(
+        "--sweep",
+        nargs=2,
+        metavar=("SAVE", "GRID"),
+        help="Run all scenarios from parameter grid on save in parallel, and write COI and impact events to csv next to save, then exit. "
+        "Grid is dict of vessel orbit parameters (a, ecc, pe_arg, ma, ref, dir), vessel and warp schedule, each with list of values, "
+        "for example: \"{'a': [8e5, 9e5], 'warp': [((600, 10), (600, 100))]}\"",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        metavar="N",
+        help="Number of processes used by --sweep, default is number of CPUs",
+    )
+    return parser.parse_args()
+
+
+def sweep(path, grid_text, jobs):
+    """Run scenario sweep from command line"""
+    from volatilespace import sweeper
+    grid = literal_eval(grid_text)
+    all_scenarios, events = sweeper.sweep(path, grid, jobs=jobs, progress=lambda done, total: print(f"Scenario {done}/{total}", end="\r"))
+    sweeper.write_results(sweeper.results_path(path), grid, all_scenarios, events)
+    print(f"\nRan {len(all_scenarios)} scenarios with {len(events)} events, results are in: {sweeper.results_path(path)}")
+
+
 if __name__ == "__main__":
-    main()
+    multiprocessing.freeze_support()
+    args = parser()
+    if args.precompile is not None:
+        compiler.precompile(args.precompile)
+    elif args.sweep is not None:
+        sweep(*args.sweep, args.jobs)
+    else:
+        main()
@@ -0,0 +1,307 @@
+import functools
+import hashlib
+import importlib
+import importlib.util
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pygame
+
+from volatilespace import peripherals
+
+# prebuilt cache is keyed by cpu, so it is built and loaded for generic cpu, to be usable on any machine
+# this must be set before numba is imported, and it is inherited by compiling processes
+if getattr(sys, "frozen", False) or "--precompile" in sys.argv:
+    os.environ["NUMBA_CPU_NAME"] = "generic"
+    os.environ["NUMBA_CPU_FEATURES"] = ""
+
+try:   # to allow building without numba
+    from numba import __version__ as numba_version
+    from numba import config
+    from numba.core import caching, event
+    from numba.core.registry import CPUDispatcher
+    numba_avail = True
+except ImportError:
+    numba_avail = False
+
+cache_base = None   # overrides numba cache base directory, used when building
+
+# physics modules with numba functions and modules they import
+modules = {
+    "volatilespace.physics.quartic_solver": (),
+    "volatilespace.physics.enhanced_kepler_solver": (),
+    "volatilespace.physics.phys_shared": (),
+    "volatilespace.physics.spatial_index": (),
+    "volatilespace.physics.ephemeris": ("volatilespace.physics.enhanced_kepler_solver", ),
+    "volatilespace.physics.orbit_intersect": (
+        "volatilespace.physics.quartic_solver",
+        "volatilespace.physics.enhanced_kepler_solver",
+        "volatilespace.physics.phys_shared",
+        "volatilespace.physics.ephemeris",
+    ),
+    "volatilespace.physics.convert": (
+        "volatilespace.physics.enhanced_kepler_solver",
+        "volatilespace.physics.phys_shared",
+        "volatilespace.physics.spatial_index",
+    ),
+    "volatilespace.physics.phys_editor": (
+        "volatilespace.physics.enhanced_kepler_solver",
+        "volatilespace.physics.phys_shared",
+    ),
+    "volatilespace.physics.phys_vessel": (
+        "volatilespace.physics.enhanced_kepler_solver",
+        "volatilespace.physics.phys_shared",
+        "volatilespace.physics.orbit_intersect",
+        "volatilespace.physics.spatial_index",
+        "volatilespace.physics.convert",
+        "volatilespace.physics.ephemeris",
+    ),
+    "volatilespace.physics.maneuver": (
+        "volatilespace.physics.enhanced_kepler_solver",
+        "volatilespace.physics.phys_shared",
+        "volatilespace.physics.orbit_intersect",
+        "volatilespace.physics.convert",
+        "volatilespace.physics.ephemeris",
+    ),
+}
+
+
+def cache_root():
+    """Get base directory for numba caches of all configurations"""
+    if cache_base:
+        return cache_base
+    if getattr(sys, "frozen", False):   # cache is kept next to executable
+        return os.path.join(os.path.dirname(sys.executable), "numba_cache")
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "__pycache__", "numba")
+
+
+def cache_dir(use_numba, fastmath):
+    """Get numba cache directory for this configuration, each configuration has its own cache"""
+    return os.path.join(cache_root(), f"numba-{use_numba}_fastmath-{fastmath}")
+
+
+@functools.cache
+def source_stamp():
+    """
+    Get hash of all compiled modules sources, numba and python version.
+    Packaged builds have no sources, so stamp stored in cache when it was built is used.
+    """
+    if getattr(sys, "frozen", False):
+        try:
+            with open(os.path.join(cache_root(), "source_stamp")) as f:
+                return f.read()
+        except OSError:
+            return "frozen"
+    hasher = hashlib.sha256()
+    hasher.update(f"{numba_version} {sys.version}".encode())
+    for module in modules:
+        with open(importlib.util.find_spec(module).origin, "rb") as f:
+            hasher.update(f.read())
+    return hasher.hexdigest()
+
+
+def cache_valid(path):
+    """Check if all modules in this cache directory are already compiled"""
+    try:
+        with open(os.path.join(path, "complete")) as f:
+            return f.read() == source_stamp()
+    except OSError:
+        return False
+
+
+def mark_valid(path):
+    """Mark this cache directory as complete for current sources"""
+    try:
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "complete"), "w") as f:
+            f.write(source_stamp())
+        with open(os.path.join(cache_root(), "source_stamp"), "w") as f:
+            f.write(source_stamp())
+    except OSError:
+        pass
+
+
+def setup(use_numba=None, fastmath=None):
+    """Point numba cache to directory for current configuration, optionally overriding settings for this process only"""
+    if not numba_avail:
+        return None
+    if use_numba is None:
+        use_numba = peripherals.load_settings("game", "numba")
+    else:
+        peripherals.override_setting("game", "numba", use_numba)
+    if fastmath is None:
+        fastmath = peripherals.load_settings("game", "fastmath")
+    else:
+        peripherals.override_setting("game", "fastmath", fastmath)
+    path = cache_dir(use_numba, fastmath)
+    os.environ["NUMBA_CACHE_DIR"] = path   # numba reloads config from environment before compiling
+    config.CACHE_DIR = path
+    if RelocatableCacheLocator is not None and RelocatableCacheLocator not in cache_impl._locator_classes:
+        cache_impl._locator_classes.insert(0, RelocatableCacheLocator)
+    return path
+
+
+def compile_listener(callback):
+    """Get numba event listener that calls callback with name of each function being compiled (not loaded from cache)"""
+
+    class CompileListener(event.Listener):
+        """Numba compile event listener"""
+        def on_start(self, ev):
+            """Called when function compilation starts"""
+            function = ev.data["dispatcher"].py_func
+            if function.__module__.startswith("volatilespace"):   # skip numba internal functions
+                callback(f"{function.__module__.split('.')[-1]}.{function.__qualname__}")
+
+        def on_end(self, ev):
+            """Called when function compilation ends"""
+
+    return CompileListener()
+
+
+def init_worker(base, fastmath, events):
+    """Setup worker process for compiling"""
+    global cache_base
+    cache_base = base
+    setup(True, fastmath)
+    event.register("numba:compile", compile_listener(events.put))
+
+
+def compile_module(module):
+    """Import module in worker process, so its numba functions are compiled and cached"""
+    importlib.import_module(module)
+    return module
+
+
+def compile_parallel(fastmath, progress=None, responsive=True, jobs=None):
+    """Compile all modules in separate processes, each module is started as soon as modules it imports are compiled"""
+    context = multiprocessing.get_context("spawn")
+    manager = context.Manager()
+    events = manager.Queue()
+    done = set()
+    running = {}
+    compiled = 0
+    executor = ProcessPoolExecutor(max_workers=jobs, mp_context=context, initializer=init_worker, initargs=(cache_base, fastmath, events))
+    with executor:
+        while len(done) < len(modules):
+            for module, requires in modules.items():
+                if module not in done and module not in running.values() and all(x in done for x in requires):
+                    running[executor.submit(compile_module, module)] = module
+            finished, _ = wait(running, timeout=1/60, return_when=FIRST_COMPLETED)
+            for future in finished:
+                done.add(future.result())
+                del running[future]
+            try:
+                while True:
+                    name = events.get_nowait()
+                    compiled += 1
+                    if progress:
+                        progress(f"{name} ({compiled})")
+            except queue.Empty:
+                pass
+            if responsive and pygame.display.get_init():   # events can be pumped only with initialized display
+                for e in pygame.event.get():
+                    if e.type == pygame.QUIT:
+                        pygame.quit()
+                        sys.exit()
+    manager.shutdown()
+    return compiled
+
+
+def compile_all(progress=None):
+    """
+    Compile all numba functions, or load them from cache.
+    If cache for current configuration is incomplete, modules are compiled in parallel processes first.
+    Then they are imported in this process, loading from cache.
+    Returns number of compiled functions and number of functions loaded from cache.
+    """
+    from volatilespace.utils import responsive_blocking
+    path = setup()
+    if path is None or not peripherals.load_settings("game", "numba"):
+        return 0, 0
+    compiled = 0
+    if not cache_valid(path):
+        compiled = compile_parallel(peripherals.load_settings("game", "fastmath"), progress)
+
+    names = []
+    hits = 0
+    with event.install_listener("numba:compile", compile_listener(names.append)):
+        for module in modules:
+            if progress:
+                progress(module.split(".")[-1])
+
+            def update(first=len(names)):
+                """Show last compiled function"""
+                if len(names) > first and progress:
+                    progress(f"{names[-1]} ({len(names)})")
+            loaded = responsive_blocking(target=importlib.import_module, args=(module, ), update=update)
+            for value in vars(loaded).values():
+                if isinstance(value, CPUDispatcher) and value.__module__ == module:
+                    hits += sum(value.stats.cache_hits.values())
+    mark_valid(path)
+    return compiled + len(names), hits
+
+
+def precompile(base=None):
+    """
+    Populate caches for both fastmath configurations, used from command line at install or build time.
+    Optionally, cache can be stored in specified directory, such as "numba_cache" next to packaged executable.
+    """
+    global cache_base
+    if not numba_avail:
+        sys.exit("Numba is not installed, nothing to compile")
+    if base:
+        cache_base = os.path.abspath(base)
+    for fastmath in (False, True):
+        path = setup(True, fastmath)
+        start = time.time()
+        compiled = compile_parallel(fastmath, progress=print, responsive=False)
+        mark_valid(path)
+        print(f"Compiled {compiled} functions with fastmath={fastmath} in {round(time.time() - start, 2)}s")
+
+
+RelocatableCacheLocator = None
+if numba_avail:
+    # private numba api, if it is changed, functions are compiled on each run instead of loaded from prebuilt cache
+    cache_impl = getattr(caching, "CacheImpl", None) or getattr(caching, "_CacheImpl", None)   # renamed in newer numba
+    locator_base = getattr(caching, "_CacheLocator", None)
+    if not isinstance(getattr(cache_impl, "_locator_classes", None), list):
+        locator_base = None
+
+if numba_avail and locator_base is not None:
+    class RelocatableCacheLocator(locator_base):
+        """
+        Numba cache locator that does not depend on absolute path or modification time of source file.
+        So cache can be built once and shipped with packaged builds, which have no source files.
+        If cached function is missing or stale, it is compiled as usual.
+        """
+        def __init__(self, py_func):
+            self._lineno = py_func.__code__.co_firstlineno
+            self._cache_path = os.path.join(config.CACHE_DIR, py_func.__module__)
+
+        def get_cache_path(self):
+            """Get directory where function is cached"""
+            return self._cache_path
+
+        def get_source_stamp(self):
+            """Get stamp representing freshness of all compiled modules"""
+            return source_stamp()
+
+        def get_disambiguator(self):
+            """Get string that disambiguates functions with same name"""
+            return str(self._lineno)
+
+        @classmethod
+        def from_function(cls, py_func, _py_file):
+            """Create locator for game functions, others are left to default numba locators"""
+            if not config.CACHE_DIR or not py_func.__module__.startswith("volatilespace."):
+                return None
+            self = cls(py_func)
+            try:
+                self.ensure_cache_path()
+            except OSError:   # cache directory is not writable, fall back to default locators
+                return None
+            return self
@@ -1,35 +1,48 @@
 import pygame as pg
 
 settings = {
-    "first_run": "True",
-    "resolution": [1366, 768],
-    "fullscreen": "True",
-    "vsync": "True",
-    "curve_points": 300,
-    "grid_spacing_min": 100,
-    "grid_spacing_max": 200,
-    "mouse_warp": "True",
-    "antialiasing": "True",
-    "stars_num": 400,
-    "stars_new_color": "False",
-    "use_img": "True",
-    "extra_frame": 1000,
-    "stars_speed_mult": 1,
-    "stars_opacity": 1,
-    "cluster_enable": "True",
-    "cluster_new": "False",
-    "cluster_num": 6,
-    "cluster_star": [10, 30],
-    "cluster_size_mult": [2, 4],
-    "stars_radius": [0.6, 0.3, 0.1],
-    "stars_speed": [0.5, 0.3, 0.2],
-    "stars_zoom_min": 0.5,
-    "stars_zoom_max": 2,
-    "zoom_mult": 5,
-    "stars": "True",
-    "autosave_time": 5,
-    "numba": "True",
-    "fastmath": "False",
+    "graphics": {
+        "first_run": "True",
+        "resolution": [1366, 768],
+        "fullscreen": "True",
+        "vsync": "True",
+        "curve_points": 300,
+        "grid_spacing_min": 100,
+        "grid_spacing_max": 200,
+        "mouse_warp": "True",
+        "antialiasing": "True",
+    },
+    "background": {
+        "stars_num": 400,
+        "stars_new_color": "False",
+        "use_img": "True",
+        "extra_frame": 1000,
+        "stars_speed_mult": 1,
+        "stars_opacity": 1,
+        "cluster_enable": "True",
+        "cluster_new": "False",
+        "cluster_num": 6,
+        "cluster_star": [10, 30],
+        "cluster_size_mult": [2, 4],
+        "stars_radius": [0.6, 0.3, 0.1],
+        "stars_speed": [0.5, 0.3, 0.2],
+        "stars_zoom_min": 0.5,
+        "stars_zoom_max": 2,
+        "zoom_mult": 5,
+        "stars": "True",
+    },
+    "game": {
+        "autosave_time": 5,
+        "numba": "True",
+        "fastmath": "False",
+        "predict_coi_limit": 300,
+        "predict_coi_orbits": 10,
+        "predict_orbit_budget": 2,
+        "kepler_table": "False",
+        "ephemeris": "True",
+        "floating_origin": "False",
+        "record": "False",
+    },
 }
 
 
@@ -49,6 +62,8 @@ keybindings = {
     "toggle_ui_visibility": pg.K_F2,
     "toggle_labels_visibility": pg.K_F3,
     "quicksave": pg.K_F4,
+    "toggle_replay": pg.K_F5,
+    "plan_transfer": pg.K_t,
     "delete_body_in_editor": pg.K_DELETE,
     "rotate_cw": pg.K_d,
     "rotate_ccw": pg.K_a,
@@ -293,7 +293,7 @@ class Editor():
         self.vessel_data = None
         self.vessel_orb_data = None
         if body_orb_data["kepler"]:   # convert to newtonian model
-            body_orb_data = convert.to_newton(self.mass, body_orb_data, self.sim_conf["gc"], self.sim_conf["coi_coef"])
+            body_orb_data = convert.to_newton(self.mass, body_orb_data, self.sim_conf["gc"])
             self.vessel_data = vessel_data
             self.vessel_orb_data = vessel_orb_data
         physics.load_system(self.sim_conf, body_data, body_orb_data)   # add it to physics class
@@ -857,18 +857,14 @@ class Editor():
                     self.select_toggle = False
                     if e.button != 2:   # don't select body with middle click when in insert mode
                         if mouse_move < self.select_sensitivity:
-                            curves = physics.curve()
-                            for body, body_pos in enumerate(self.position):
-                                curve = np.column_stack(self.screen_coords(curves[:, body]))   # line coords on screen
-                                diff = np.amax(curve, 0) - np.amin(curve, 0)
-                                if body == 0 or diff[0]+diff[1] > 32:   # skip hidden bodies with too small orbits
-                                    scr_radius = self.radius[body]*self.zoom
-                                    if scr_radius < 5:   # if body is small on screen, there is marker
-                                        scr_radius = 8
-                                    # if mouse is inside body radius on its location: (body_x - mouse_x)**2 + (body_y - mouse_y)**2 < radius**2
-                                    if sum(np.square(self.screen_coords(body_pos) - self.mouse_raw)) < (scr_radius)**2:
-                                        self.selected = body
-                                        self.select_toggle = True   # do not exit select mode
+                            curve_size = np.sum(np.ptp(physics.curve(), axis=2), axis=0)   # curve width + height
+                            radius = np.where(self.radius * self.zoom < 5, 8 / self.zoom, self.radius)   # if body is small on screen, there is marker
+                            inside = np.sum((self.position - self.sim_coords(self.mouse_raw))**2, axis=1) < radius**2
+                            large = curve_size * self.zoom > 32   # skip hidden bodies with too small orbits
+                            large[0] = True
+                            for body in np.where(np.logical_and(inside, large))[0]:
+                                self.selected = body
+                                self.select_toggle = True   # do not exit select mode
                             if self.select_toggle is False and self.right_menu not in [3, 4]:   # if inside select mode and not in edit right menus
                                 self.selected = None
                                 if self.right_menu in [3, 4]:
@@ -1602,10 +1598,10 @@ class Editor():
 
         # bodies drawing
         curves = physics.curve()
+        curve_size = np.sum(np.ptp(curves, axis=2), axis=0)
         for body in range(len(self.mass)):
             curve = np.column_stack(self.screen_coords(curves[:, body]))   # line coords on screen
-            diff = np.amax(curve, 0) - np.amin(curve, 0)
-            if body == 0 or diff[0]+diff[1] > 32:   # skip bodies with too small orbits
+            if body == 0 or curve_size[body] * self.zoom > 32:   # skip bodies with too small orbits
 
                 # draw orbit curve lines
                 if body != 0:   # skip root
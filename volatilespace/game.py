@@ -6,7 +6,7 @@ import time
 import numpy as np
 import pygame
 
-from volatilespace import format_time, metric, peripherals, textinput
+from volatilespace import format_time, metric, peripherals, recorder, textinput
 from volatilespace.graphics import bg_stars, graphics, rgb
 from volatilespace.physics import convert, phys_body, phys_vessel
 from volatilespace.physics.phys_shared import point_between
@@ -157,12 +157,20 @@ class Game():
         self.visible_bodies = np.array([])
         self.visible_coi = np.array([])
         self.visible_body_orbits = np.array([])
-        self.visible_vessel_orbits = np.array([])
+        self.visible_vessel_orbits = np.array([], dtype=int)
         self.visible_vessels = np.array([])
         self.predict_orbit_data = (None, None, None, None, None, None, None)
         self.change_vessel = []
-        self.current_vessel_predicted = False
         self.orbit_prediction_time = 0
+        self.autosave_records = None   # journal records since last full autosave, None if there is no autosave of this game
+        self.autosave_compact = 10   # write full autosave after this many journal records
+        self.autosave_changed = set()   # vessels whose orbit has changed since last autosave
+        self.recorder = None   # records every tick when recording is enabled
+        self.replay = None   # recording being replayed
+        self.replay_tick = 0
+        self.replay_step = 1   # ticks skipped in replay with one key press
+        self.transfer = None   # planned transfer of active vessel to target
+        self.porkchop = None   # delta-v image of planned transfer grid
 
         # DEBUG
         self.physics_debug_time = 1
@@ -269,6 +277,8 @@ class Game():
         self.antial = peripherals.load_settings("graphics", "antialiasing")
         self.mouse_warp = peripherals.load_settings("graphics", "mouse_warp")
         self.bg_stars_enable = peripherals.load_settings("background", "stars")
+        self.floating_origin = peripherals.load_settings("game", "floating_origin")
+        self.record = peripherals.load_settings("game", "record")
         bg_stars.reload_settings()
         graphics.reload_settings()
         physics_body.reload_settings()
@@ -307,6 +317,12 @@ class Game():
 
     def load_system(self, system):
         """Load system from file and convert to kepler orbit if needed"""
+        if self.recorder is not None:
+            self.recorder.flush()
+        self.recorder = None
+        self.replay = None
+        self.transfer = None
+        self.porkchop = None
         game_data, self.sim_conf, body_data, body_orb_data, vessel_data, vessel_orb_data = peripherals.load_file(system)
         self.sim_name = game_data["name"]
         self.sim_time = game_data["time"]
@@ -325,6 +341,8 @@ class Game():
             )
 
         self.file_path = system   # this path will be used for load/save
+        self.autosave_records = None
+        self.autosave_changed = set()
         self.pause_menu = 0
         self.disable_input = False
         self.disable_ui = False
@@ -348,7 +366,7 @@ class Game():
         self.top_ui_imgs = [self.top_ui_img_warp[1], self.top_ui_img_follow[1], self.top_ui_img_grid[0]]
 
         # userevent may not be run in first iteration, but this values are needed in graphics section
-        physics_body.load(self.sim_conf, body_data, body_orb_data)
+        physics_body.load(self.sim_conf, body_data, body_orb_data, system)
 
         body_data, body_orb_data, self.pos, self.ma, ea, self.curves = physics_body.initial(self.warp)
         self.unpack_body(body_data, body_orb_data)
@@ -356,7 +374,6 @@ class Game():
         physics_vessel.load(self.sim_conf, body_data, body_orb_data, vessel_data, vessel_orb_data)
         vessel_orb_data, self.v_pos, self.v_ma, self.v_curves = physics_vessel.initial(self.warp, self.pos, self.ma, ea)
         self.unpack_vessel(vessel_data, vessel_orb_data)
-        self.current_vessel_predicted = False
         self.active_vessel = game_data["vessel"]
         if self.active_vessel is not None and self.active_vessel < len(self.v_ref):
             self.target = self.v_ref[self.active_vessel]
@@ -367,6 +384,12 @@ class Game():
             self.focus_point([0, 0], 0.5)
         self.target_type = 0
 
+        if self.record:   # initial state is first recorded tick
+            self.recorder = recorder.Recorder(recorder.recording_path(system), len(self.names), len(self.v_names))
+            for vessel, _ in enumerate(self.v_names):
+                self.record_orbit(vessel)
+            self.recorder.tick(self.sim_time, physics_body.ma, physics_vessel.ma)
+
 
     def focus_point(self, pos, zoom=None):
         """Calculate offset and zoom, used to focus on specific coordinates"""
@@ -478,6 +501,7 @@ class Game():
 
     def load(self):
         """Load system from 'load' dialog"""
+        peripherals.wait_saves()   # selected file may still be written
         if os.path.exists(self.selected_path):
             self.load_system(self.selected_path)
             self.file_path = self.selected_path
@@ -488,8 +512,8 @@ class Game():
             )
 
 
-    def save(self, path, name=None, silent=False):
-        """Save game to file, if name is None, name is not changed"""
+    def save_data(self, name=None):
+        """Pack current game into dicts, as used in save file"""
         date = time.strftime("%d.%m.%Y %H:%M")
         body_data = {
             "name": self.names,
@@ -510,7 +534,20 @@ class Game():
         }
         vessel_orb_data = {"a": self.v_a, "ecc": self.v_ecc, "pe_arg": self.v_pea, "ma": self.v_ma, "ref": self.v_ref, "dir": self.v_dr}
         game_data = {"name": name, "date": date, "time": self.sim_time, "vessel": self.active_vessel}
-        peripherals.save_file(
+        return game_data, body_data, body_orb_data, vessel_data, vessel_orb_data
+
+
+    def save(self, path, name=None, silent=False, background=False):
+        """
+        Save game to file, if name is None, name is not changed.
+        If background is True, file is written in background thread.
+        """
+        game_data, body_data, body_orb_data, vessel_data, vessel_orb_data = self.save_data(name)
+        if background:
+            save_file = peripherals.save_file_background
+        else:
+            save_file = peripherals.save_file
+        save_file(
             path,
             game_data,
             self.sim_conf,
@@ -528,7 +565,7 @@ class Game():
 
     def quicksave(self):
         """Save game to quicksave file"""
-        self.save("Saves/quicksave.ini", "Quicksave - " + self.sim_name, True)
+        self.save("Saves/quicksave.ini", "Quicksave - " + self.sim_name, True, True)
         graphics.timed_text_init(
             rgb.gray0, self.fontmd,
             "Quicksave...",
@@ -537,9 +574,22 @@ class Game():
 
 
     def autosave(self, e):
-        """Automatically save current game to autosave.ini at predefined interval"""
+        """
+        Automatically save current game to autosave.ini at predefined interval.
+        Full save is written only every few autosaves, in between, only changes are appended to its journal.
+        """
         if e.type == self.autosave_event:
-            self.save("Saves/autosave.ini", "Autosave - " + self.sim_name, True)
+            path = "Saves/autosave.ini"
+            if self.autosave_records is None or self.autosave_records >= self.autosave_compact:
+                self.save(path, "Autosave - " + self.sim_name, True, True)
+                peripherals.new_journal_background(path, self.sim_time)
+                self.autosave_records = 0
+            else:
+                game_data, _, body_orb_data, vessel_data, vessel_orb_data = self.save_data()
+                changed = sorted(self.autosave_changed)
+                peripherals.append_journal_background(path, game_data, body_orb_data, vessel_data, vessel_orb_data, changed)
+                self.autosave_records += 1
+            self.autosave_changed = set()
             graphics.timed_text_init(
                 rgb.gray1, self.fontmd,
                 "Autosave...",
@@ -547,6 +597,18 @@ class Game():
             )
 
 
+    def check_saves(self):
+        """Show error from failed background save, journal is restarted with next autosave"""
+        error = peripherals.save_error()
+        if error is not None:
+            self.autosave_records = None
+            graphics.timed_text_init(
+                rgb.red, self.fontmd,
+                "Saving failed: " + str(error),
+                (self.screen_x/2, self.screen_y-70), 3, True,
+            )
+
+
     def set_pause(self, do=None):
         """Pause game, set warp to x1 and update top UI"""
         if do is not None:
@@ -556,6 +618,92 @@ class Game():
         self.warp_index = 0
         self.warp = self.warp_range[self.warp_index]
         self.top_ui_imgs[0] = self.top_ui_img_warp[int(not self.pause)]
+        if self.replay is not None and not self.pause:   # simulation continues from last recorded tick
+            self.toggle_replay()
+
+
+    def record_orbit(self, vessel):
+        """Record current orbit of vessel"""
+        self.recorder.orbit(
+            vessel,
+            physics_vessel.a[vessel],
+            physics_vessel.ecc[vessel],
+            physics_vessel.pea[vessel],
+            physics_vessel.ref[vessel],
+            physics_vessel.dr[vessel],
+        )
+
+
+    def toggle_replay(self):
+        """Enter replay of recording, with paused simulation, or leave it and return to last recorded tick"""
+        if self.replay is None:
+            if self.recorder is None:
+                graphics.timed_text_init(rgb.gray0, self.fontmd, "Recording is disabled", (self.screen_x/2, self.screen_y-70), 1.5, True)
+                return
+            self.recorder.flush()
+            self.replay = recorder.Replay(self.recorder.path)
+            self.replay_tick = self.replay.ticks - 1
+            self.set_pause(True)
+            graphics.timed_text_init(rgb.gray0, self.fontmd, "Replay", (self.screen_x/2, self.screen_y-70), 1.5, True)
+        else:
+            self.seek_replay(self.replay.ticks - 1, True)
+            self.replay = None
+            graphics.timed_text_init(rgb.gray0, self.fontmd, "Replay ended", (self.screen_x/2, self.screen_y-70), 1.5, True)
+
+
+    def plan_transfer(self):
+        """Plan transfer of active vessel to target with lowest delta-v, or clear planned transfer"""
+        if self.transfer is not None:
+            self.transfer = None
+            self.porkchop = None
+            graphics.timed_text_init(rgb.gray0, self.fontmd, "Transfer cleared", (self.screen_x/2, self.screen_y-70), 1.5, True)
+            return
+        if self.active_vessel is None or self.target is None:
+            graphics.timed_text_init(rgb.gray0, self.fontmd, "Select target to plan transfer", (self.screen_x/2, self.screen_y-70), 1.5, True)
+            return
+        transfer = physics_vessel.plan_transfer(self.active_vessel, self.target, self.target_type == 1)
+        if transfer is None:
+            graphics.timed_text_init(
+                rgb.gray0, self.fontmd,
+                "Target must be on elliptic orbit around same body as vessel",
+                (self.screen_x/2, self.screen_y-70), 1.5, True,
+            )
+            return
+        transfer["time"] = self.sim_time
+        self.transfer = transfer
+        # porkchop image: departure on x axis, flight time on y axis, lower delta-v is brighter
+        dv = np.log(transfer["dv"] / np.nanmin(transfer["dv"]))
+        value = 1 - np.clip(np.nan_to_num(dv / math.log(4), nan=1), 0, 1)   # up to 4x the best delta-v
+        image = np.stack((value * 255, value * 165, 64 * value**4), axis=-1)[:, ::-1].astype(np.uint8)
+        self.porkchop = pygame.transform.smoothscale(pygame.surfarray.make_surface(image), (200, 200))
+        graphics.timed_text_init(
+            rgb.gray0, self.fontmd,
+            "Departure in: " + format_time.to_date(int(transfer["departure"]/self.ptps)) +
+            "   Flight time: " + format_time.to_date(int(transfer["tof"]/self.ptps)) +
+            "   Delta-v: " + metric.format_si(transfer["dv_dep"], 3) + " + " + metric.format_si(transfer["dv_arr"], 3),
+            (self.screen_x/2, self.screen_y-70), 4, True,
+        )
+
+
+    def seek_replay(self, tick, full=False):
+        """
+        Move whole simulation to state in recorded tick.
+        Enter coi is searched only for active vessel, unless full, when leaving replay.
+        """
+        self.replay_tick = min(max(tick, 0), self.replay.ticks - 1)
+        state = self.replay.seek(self.replay_tick)
+        self.sim_time = state["time"]
+        self.pos, self.ma, ea = physics_body.seek(state["body_ma"])
+        if full:
+            vessels = None
+        else:
+            vessels = [] if self.active_vessel is None else [self.active_vessel]
+        for vessel, vessel_data, vessel_orb_data in physics_vessel.seek(state["vessel_ma"], state["vessel_orb"], self.pos, self.ma, ea, vessels):
+            self.update_vessel(vessel, vessel_data, vessel_orb_data)
+            self.autosave_changed.add(vessel)
+        self.v_pos, self.v_ma = physics_vessel.pos, physics_vessel.ma
+        self.curves = physics_body.curve_move()
+        self.v_curves = physics_vessel.curve_move()
 
 
     def set_warp_ui(self, silent=False):
@@ -685,7 +833,7 @@ class Game():
                     if self.active_vessel is not None:
                         pos = self.v_pos[self.active_vessel]
                     else:
-                        pos = [0, 0]
+                        pos = self.pos[0]
                     self.focus_point(pos, self.zoom)
 
                 elif e.key == self.keys["cycle_follow_modes"]:
@@ -727,6 +875,12 @@ class Game():
                 elif e.key == self.keys["quicksave"]:
                     self.quicksave()
 
+                elif e.key == self.keys["toggle_replay"]:
+                    self.toggle_replay()
+
+                elif e.key == self.keys["plan_transfer"]:
+                    self.plan_transfer()
+
                 elif e.key == self.keys["rotate_cw"]:
                     self.hold_key = self.keys["rotate_cw"]
 
@@ -770,6 +924,20 @@ class Game():
                         elif self.warp != 0:
                             self.set_warp_ui()
 
+                # replay: warp keys move through recording
+                elif self.replay is not None:
+                    if e.key == self.keys["decrease_time_warp"]:
+                        self.seek_replay(self.replay_tick - self.replay_step)
+                    elif e.key == self.keys["increase_time_warp"]:
+                        self.seek_replay(self.replay_tick + self.replay_step)
+                    elif e.key == self.keys["stop_time_warp"]:   # cycle step: 1, 10, 100, 1000 ticks
+                        self.replay_step = self.replay_step * 10 if self.replay_step < 1000 else 1
+                    graphics.timed_text_init(
+                        rgb.gray0, self.fontmd,
+                        f"Replay: tick {self.replay_tick + 1}/{self.replay.ticks}, step {self.replay_step}",
+                        (self.screen_x/2, self.screen_y-70), 1.5, True,
+                    )
+
         elif e.type == pygame.KEYUP:
             self.hold_key = None
 
@@ -817,45 +985,32 @@ class Game():
                     mouse_move = math.dist(self.mouse_raw, self.mouse_raw_old)
                     if e.button != 2:   # don't select body with middle click when in insert mode
                         if mouse_move < self.select_sensitivity:
+                            # only objects near mouse are checked for markers and orbit size
+                            mouse_sim = self.sim_coords(self.mouse_raw)
                             # first check for vessels
-                            for vessel, vessel_pos in enumerate(self.v_pos):
-                                curve = self.screen_coords_array(self.v_curves[vessel])   # line coords on screen
-                                diff = np.amax(curve, 0) - np.amin(curve, 0)
-                                if diff[0]+diff[1] > 32:   # skip hidden vessels with too small orbits
-                                    scr_radius = 11
-                                    # if mouse is inside vessel radius on its location: (vessel_x - mouse_x)**2 + (vessel_y - mouse_y)**2 < radius**2
-                                    if sum(np.square(self.screen_coords(vessel_pos) - self.mouse_raw)) < (scr_radius)**2:
-                                        self.vessel_potential_target = vessel   # if clicked only once, timer must change target
-                                        if self.first_click:
-                                            prev_active_vessel = self.active_vessel
-                                            self.active_vessel = vessel
-                                            self.current_vessel_predicted = False
-                                            self.follow = 1
-                                            self.vessel_potential_target = None
-                                            self.target = self.v_ref[self.active_vessel]   # set new active vessel's parent to be target
-                                            self.target_type = 0
-                                            if self.ref[prev_active_vessel] == self.ref[vessel]:
-                                                # calculate new follow offset so view does not move
-                                                diff = self.v_pos[prev_active_vessel] - self.v_pos[self.active_vessel]
-                                                self.follow_offset_x -= diff[0]
-                                                self.follow_offset_y -= diff[1]
-                                            else:
-                                                # reset follow offset
-                                                self.follow_offset_x = self.screen_x / 2
-                                                self.follow_offset_y = self.screen_y / 2
-                                        self.first_click = True
+                            for vessel in physics_vessel.pick(mouse_sim, self.zoom):
+                                self.vessel_potential_target = vessel   # if clicked only once, timer must change target
+                                if self.first_click:
+                                    prev_active_vessel = self.active_vessel
+                                    self.active_vessel = vessel
+                                    self.follow = 1
+                                    self.vessel_potential_target = None
+                                    self.target = self.v_ref[self.active_vessel]   # set new active vessel's parent to be target
+                                    self.target_type = 0
+                                    if self.ref[prev_active_vessel] == self.ref[vessel]:
+                                        # calculate new follow offset so view does not move
+                                        diff = self.v_pos[prev_active_vessel] - self.v_pos[self.active_vessel]
+                                        self.follow_offset_x -= diff[0]
+                                        self.follow_offset_y -= diff[1]
+                                    else:
+                                        # reset follow offset
+                                        self.follow_offset_x = self.screen_x / 2
+                                        self.follow_offset_y = self.screen_y / 2
+                                self.first_click = True
                             if not self.first_click:   # if vessel is selected: don't check for bodies
-                                for body, body_pos in enumerate(self.pos):
-                                    curve = self.screen_coords_array(self.curves[body])   # line coords on screen
-                                    diff = np.amax(curve, 0) - np.amin(curve, 0)
-                                    if body == 0 or diff[0]+diff[1] > 32:   # skip hidden bodies with too small orbits
-                                        scr_radius = self.radius[body]*self.zoom
-                                        if scr_radius < 5:   # if body is small on screen, there is marker
-                                            scr_radius = 8
-                                        # if mouse is inside body radius on its location: (body_x - mouse_x)**2 + (body_y - mouse_y)**2 < radius**2
-                                        if sum(np.square(self.screen_coords(body_pos) - self.mouse_raw)) < (scr_radius)**2:
-                                            self.target = body
-                                            self.target_type = 0
+                                for body in physics_body.pick(mouse_sim, self.zoom):
+                                    self.target = body
+                                    self.target_type = 0
 
             # mouse wheel: change zoom
             if not self.disable_input:
@@ -1233,6 +1388,8 @@ class Game():
 
                 # for each vessel run prediction at Pe and Ap, it is warp independant
                 physics_vessel.predict_enter_coi_service()
+                self.move_origin()
+                rel_pos = physics_body.rel_pos   # to follow origin movement
                 # physical warp
                 if self.warp_phys_active:
                     for _ in range(self.warp_phys):
@@ -1254,14 +1411,19 @@ class Game():
                     self.sim_time += 1 * self.warp   # iterate sim_time
 
                 self.v_rot_dir = 0
+                if physics_body.anchor:   # view offset moves with origin, so view stays in place when not following
+                    moved = physics_body.anchor_moved(rel_pos)
+                    self.offset_x += moved[0]
+                    self.offset_y += moved[1]
                 self.curves = physics_body.curve_move()
 
                 # handling changes on vessel orbit
                 for vessel in self.change_vessel:
-                    if vessel == self.active_vessel:
-                        self.current_vessel_predicted = False
                     vessel_data, vessel_orb_data = physics_vessel.change_vessel(vessel)
                     self.update_vessel(vessel, vessel_data, vessel_orb_data)
+                    self.autosave_changed.add(vessel)
+                    if self.recorder is not None:
+                        self.record_orbit(vessel)
 
                     # resuming warp after orbit changes
                     if self.vessel_crossing is not None and vessel == self.vessel_crossing:
@@ -1289,20 +1451,55 @@ class Game():
 
                 self.v_curves = physics_vessel.curve_move()
 
+                if self.recorder is not None:
+                    self.recorder.tick(self.sim_time, physics_body.ma, physics_vessel.ma)
+
             # culing
             sim_screen = np.array((self.sim_coords((0, 0)), self.sim_coords(self.screen_dim)))
             self.visible_bodies, self.visible_coi, self.visible_body_orbits = physics_body.culling(sim_screen, self.zoom)
             self.visible_vessels, self.visible_vessel_orbits = physics_vessel.culling(sim_screen, self.zoom, self.visible_coi)
-            self.curve_light, self.curve_dark, self.intersect, self.intersect_type, self.intersect_time, self.select_range = physics_vessel.curve_segments()
+            self.segments, self.segment_ends, self.intersect, self.intersect_type, self.intersect_time, self.select_range = physics_vessel.curve_segments()
 
-            if not self.current_vessel_predicted and self.active_vessel is not None:
-                self.current_vessel_predicted = True
-                self.orbit_prediction_time = self.sim_time
-                self.predict_orbit_data = physics_vessel.predict_next_orbit(self.active_vessel)
+            # prediction is updated every tick, but only changed stages are calculated again
+            if self.active_vessel is not None:
+                predict_orbit_data = physics_vessel.predict_next_orbit(self.active_vessel, physics_vessel.predict_budget)
+                if predict_orbit_data is not None:   # otherwise it is not finished in time budget, and continues in next tick
+                    self.orbit_prediction_time = self.sim_time
+                    self.predict_orbit_data = predict_orbit_data
 
             self.physics_debug_time = time.time() - debug_time   # DEBUG
 
 
+    def move_origin(self):
+        """
+        With floating origin, move origin to body orbited by followed vessel, and view offset with it, so view does not jump.
+        Physics positions are then composed relative to that body, in place of absolute positions,
+        so they stay precise far from absolute origin. This must be done before moving bodies.
+        """
+        anchor = physics_body.anchor
+        if not self.floating_origin:
+            anchor = 0
+        elif self.follow and self.active_vessel is not None:
+            anchor = self.v_ref[self.active_vessel]
+        if anchor != physics_body.anchor:
+            shift = self.pos[anchor]   # new origin in current frame
+            self.offset_x += shift[0]
+            self.offset_y += shift[1]
+            physics_body.anchor = anchor
+
+
+    def draw_curve_segment(self, screen, color, curve, segment, ends):
+        """
+        Draw curve segment as slices of curve connected to segment end points, all in screen coords.
+        Segment is drawn with one draw_lines call, but segments are disjoint lines, so each needs its own call.
+        """
+        if segment[0] == 1:   # whole curve
+            graphics.draw_lines(screen, color, curve, 2)
+        elif segment[0] == 2:
+            points = np.concatenate((ends[:1], curve[segment[1]:segment[2]], curve[:segment[3]], ends[1:]))
+            graphics.draw_lines(screen, color, points, 2)
+
+
     def graphics(self, screen):
         """Draw simulation stuff on screen"""
         screen.fill((0, 0, 0))
@@ -1387,14 +1584,14 @@ class Game():
         # background lines grid
         if self.grid_mode:
             if self.grid_mode == 1:   # grid mode: home
-                origin = self.screen_coords([0, 0])
+                origin = self.screen_coords(self.pos[0])
             if self.target is not None:
                 if self.grid_mode == 2:      # grid mode: selected body
                     origin = self.screen_coords(self.v_pos[self.active_vessel])
                 elif self.grid_mode == 3:   # grid mode: orbited body
                     origin = self.screen_coords(self.pos[self.v_ref[self.active_vessel]])
             else:
-                origin = self.screen_coords([0, 0])
+                origin = self.screen_coords(self.pos[0])
             graphics.draw_grid(screen, origin, self.zoom)
 
 
@@ -1511,7 +1708,8 @@ class Game():
             ghost_body_pos = offset - ghost_body_rel_pos
             # draw orbit curve
             curve = self.screen_coords_array(offset - self.predict_orbit_data[0])
-            graphics.draw_lines(screen, rgb.pink, curve, 2)
+            ends = self.screen_coords_array(offset - self.predict_orbit_data[12])
+            self.draw_curve_segment(screen, rgb.pink, curve, self.predict_orbit_data[11], ends)
             # draw points on orbit
             if ap_d > 0:
                 ap_scr = self.screen_coords(offset - ap)
@@ -1571,27 +1769,47 @@ class Game():
             if not enter_coi:
                 graphics.draw_img(screen, self.orb_enter_img_pink, self.screen_coords(offset - entry_point), center=True)
 
+        # draw planned transfer, relative to current reference position
+        if self.transfer is not None:
+            if self.sim_time > self.transfer["time"] + self.transfer["departure"] + self.transfer["tof"]:   # transfer is in past
+                self.transfer = None
+                self.porkchop = None
+            elif self.active_vessel is not None and self.v_ref[self.active_vessel] == self.transfer["ref"]:
+                arc = self.screen_coords_array(self.pos[self.transfer["ref"]] + self.transfer["arc"])
+                graphics.draw_lines(screen, rgb.orange, arc, 2)
+                graphics.draw_circle_fill(screen, rgb.orange, arc[0], 3)   # departure
+                graphics.draw_circle_fill(screen, rgb.orange, arc[-1], 3)   # arrival
+                time = int((self.transfer["time"] + self.transfer["departure"] - self.sim_time) / self.ptps)
+                if time >= 0:
+                    graphics.text(screen, rgb.orange, self.fontsm, "T - " + format_time.to_date(time), (arc[0, 0], arc[0, 1] + 10), True)
+
         # draw vessel orbit curve lines
-        for vessel in self.visible_vessel_orbits:
-            # get curve intersections and ranges
-            curve_light = self.screen_coords_array(self.curve_light[vessel])
-            curve_dark = self.screen_coords_array(self.curve_dark[vessel])
+        visible_curves = self.v_curves[self.visible_vessel_orbits]
+        visible_curves = self.screen_coords_array(visible_curves.reshape(-1, 2)).reshape(visible_curves.shape)
+        visible_ends = self.segment_ends[self.visible_vessel_orbits]
+        visible_ends = self.screen_coords_array(visible_ends.reshape(-1, 2)).reshape(visible_ends.shape)
+        # each vessel has its own segments and colors, so they are drawn one by one
+        for vessel, curve, ends in zip(self.visible_vessel_orbits, visible_curves, visible_ends):
+            # get curve segments
+            light = self.segments[vessel, 0]
+            dark = self.segments[vessel, 1]
+            ends_light = ends[0]
+            ends_dark = ends[1]
             intersect_type = self.intersect_type[vessel]
-            vessel_pos = self.screen_coords(self.v_pos[vessel])
             # active vessel
             if self.active_vessel is not None and self.active_vessel == vessel:
                 if intersect_type in [1, 3]:
-                    graphics.draw_lines(screen, rgb.cyan_1, curve_dark, 2)
-                graphics.draw_lines(screen, rgb.cyan, curve_light, 2)
+                    self.draw_curve_segment(screen, rgb.cyan_1, curve, dark, ends_dark)
+                self.draw_curve_segment(screen, rgb.cyan, curve, light, ends_light)
             # target vessel
             elif self.target is not None and self.target_type == 1 and self.target == vessel:
                 if intersect_type in [1, 3]:
-                    graphics.draw_lines(screen, rgb.gray1, curve_dark, 2)
-                graphics.draw_lines(screen, rgb.gray, curve_light, 2)
+                    self.draw_curve_segment(screen, rgb.gray1, curve, dark, ends_dark)
+                self.draw_curve_segment(screen, rgb.gray, curve, light, ends_light)
             else:
                 if intersect_type in [1, 3]:
-                    graphics.draw_lines(screen, rgb.gray2, curve_dark, 2)
-                graphics.draw_lines(screen, rgb.gray1, curve_light, 2)
+                    self.draw_curve_segment(screen, rgb.gray2, curve, dark, ends_dark)
+                self.draw_curve_segment(screen, rgb.gray1, curve, light, ends_light)
 
         # bodies drawing
         for body in self.visible_bodies:
@@ -1611,9 +1829,7 @@ class Game():
 
         # vessel stuff drawing WITH vessels
         for vessel in self.visible_vessel_orbits:
-            # get curve intersections and ranges
-            curve_light = self.screen_coords_array(self.curve_light[vessel])
-            curve_dark = self.screen_coords_array(self.curve_dark[vessel])
+            # get curve intersections
             intersect = self.screen_coords(self.intersect[vessel])
             time_to_intersect = self.intersect_time[vessel]
             intersect_type = self.intersect_type[vessel]
@@ -1840,6 +2056,17 @@ class Game():
         if not self.disable_ui:
             graphics.timed_text(screen)
 
+            # porkchop of planned transfer, with best transfer marked
+            if self.porkchop is not None:
+                porkchop_pos = (self.btn_s + 10, self.screen_y - 230)
+                screen.blit(self.porkchop, porkchop_pos)
+                pygame.draw.rect(screen, rgb.white, (porkchop_pos[0] - 1, porkchop_pos[1] - 1, 202, 202), 1)
+                best_dep, best_tof = self.transfer["best"]
+                grid_dep, grid_tof = self.transfer["dv"].shape
+                best_pos = (porkchop_pos[0] + (best_dep + 0.5) * 200 / grid_dep, porkchop_pos[1] + 200 - (best_tof + 0.5) * 200 / grid_tof)
+                graphics.draw_circle(screen, rgb.cyan, best_pos, 4, 1)
+                graphics.text(screen, rgb.gray0, self.fontsm, "Departure", (porkchop_pos[0] + 100, porkchop_pos[1] + 210), True)
+
             # left ui
             pygame.draw.rect(screen, rgb.black, (0, 0, self.btn_s, self.screen_y))
             if self.target is not None:
@@ -1979,15 +2206,20 @@ class Game():
                 self.input_keys(event)
                 self.input_mouse(event)
                 self.ui_mouse(event)
+                if self.state != 2 or event.type == pygame.QUIT:
+                    if self.recorder is not None:
+                        self.recorder.flush()
                 if self.state != 2:
                     state = self.state
                     self.state = 2
                     return state
                 if event.type == pygame.QUIT:
+                    peripherals.wait_saves()
                     pygame.quit()
                     sys.exit()
                 self.physics(event)
                 self.autosave(event)
+            self.check_saves()
             self.graphics(screen)
             self.graphics_ui(screen, clock)
             pygame.display.flip()
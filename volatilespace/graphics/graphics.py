@@ -5,6 +5,8 @@ import pygame
 from volatilespace import metric, peripherals
 from volatilespace.graphics import rgb
 
+grid_labels_max = 256   # max number of cached grid labels
+
 
 class Graphics():
     """Graphics class"""
@@ -34,6 +36,7 @@ class Graphics():
         self.click = False
         self.mouse = [0, 0]
         self.disable_buttons = False
+        self.grid_labels = {}   # rendered grid labels by value and color
 
 
     def set_screen(self):
@@ -185,73 +188,48 @@ class Graphics():
         return text
 
 
+    def grid_label(self, value, color):
+        """Get grid line label surface with background, labels are cached by value and color, so they are rendered only once"""
+        label = self.grid_labels.get((value, color))
+        if label is None:
+            if len(self.grid_labels) >= grid_labels_max:   # drop labels from previous zoom levels
+                self.grid_labels.clear()
+            text_surf = self.fontsm.render(metric.format_si(value, 2), True, color)
+            label = pygame.Surface(text_surf.get_size())
+            label.fill(rgb.black)
+            label.blit(text_surf, (0, 0))
+            self.grid_labels[value, color] = label
+        return label
+
+
     def draw_grid(self, screen, origin, zoom):
         """Draw grid of lines expanding from origin with size labels"""
-        spacing = 10 * zoom
-        while spacing < self.spacing_min:
-            spacing *= 2.
-        while spacing > self.spacing_min:
-            spacing /= 2.
-        line_num_x = math.ceil(self.screen_x / spacing)
-        line_num_y = math.ceil(self.screen_y / spacing)
-
-        for line in range(line_num_x):
+        # largest spacing not larger than minimum, that is power of 2 multiple of 10 units
+        spacing = 10 * zoom * 2 ** math.floor(math.log2(self.spacing_min / (10 * zoom)))
+
+        # only lines on screen and one more on each side for partially visible labels, line index is distance from origin in spacings
+        for line in range(math.ceil(-origin[0] / spacing) - 1, math.floor((self.screen_x - origin[0]) / spacing) + 2):
             pos_x = origin[0] + (spacing * line)
-            moved = 0   # how much have line index moved
-            while pos_x > self.screen_x:   # if line is off screen - right
-                pos_x -= spacing * line_num_x   # move it left
-                moved -= line_num_x   # move line index left
-            while pos_x < 0:   # if line is off screen - left
-                pos_x += spacing * line_num_x   # move it right
-                moved += line_num_x   # move line index right
-            if line == 0 and moved == 0:   # at origin
-                self.draw_line(screen, rgb.red2, (pos_x, 0), (pos_x, self.screen_y), 2)   # red line
-                self.text(screen, rgb.red2, self.fontsm, "0", (pos_x, self.screen_y - 10), True, rgb.black)
-            elif abs(line + moved) % 5 == 0:   # every fifth line, but include line index movement
-                self.draw_line(screen, rgb.gray1, (pos_x, 0), (pos_x, self.screen_y), 1)   # gray line
-                sim_pos_x = round(((line + moved) * spacing) / zoom)   # calculate simulation coordinate
-                self.text(
-                    screen, rgb.gray1, self.fontsm,
-                    metric.format_si(sim_pos_x, 2),
-                    (pos_x, self.screen_y - 10), True, rgb.black,
-                )
-            else:   # every other line
-                sim_pos_x = round(((line + moved) * spacing) / zoom)
-                self.draw_line(screen, rgb.gray2, (pos_x, 0), (pos_x, self.screen_y), 1)   # dark gray line
-                self.text(
-                    screen, rgb.gray2, self.fontsm,
-                    metric.format_si(sim_pos_x, 2),
-                    (pos_x, self.screen_y - 10), True, rgb.black,
-                )
-
-        for line in range(line_num_y):
+            if line == 0:   # at origin
+                color = rgb.red2
+                self.draw_line(screen, color, (pos_x, 0), (pos_x, self.screen_y), 2)   # red line
+            else:
+                color = rgb.gray1 if line % 5 == 0 else rgb.gray2   # every fifth line is brighter
+                self.draw_line(screen, color, (pos_x, 0), (pos_x, self.screen_y), 1)
+            label = self.grid_label(round((line * spacing) / zoom), color)   # simulation coordinate
+            screen.blit(label, label.get_rect(center=(pos_x, self.screen_y - 10)))
+
+        for line in range(math.ceil(-origin[1] / spacing) - 1, math.floor((self.screen_y - origin[1]) / spacing) + 2):
             pos_y = origin[1] + (spacing * line)
-            moved = 0
-            while pos_y > self.screen_y:
-                pos_y -= spacing * line_num_y
-                moved -= line_num_y
-            while pos_y < 0:
-                pos_y += spacing * line_num_y
-                moved += line_num_y
-            if line == 0 and moved == 0:
-                self.draw_line(screen, rgb.red2, (0, pos_y), (self.screen_x, pos_y), 2)
-                self.text(screen, rgb.red2, self.fontsm, "0", (10+self.btn_s, pos_y-5), False, rgb.black)
-            elif abs(line + moved) % 5 == 0:
-                self.draw_line(screen, rgb.gray1, (0, pos_y), (self.screen_x, pos_y), 1)
-                sim_pos_y = round(-((line + moved) * spacing) / zoom)
-                self.text(
-                    screen, rgb.gray1, self.fontsm,
-                    metric.format_si(sim_pos_y, 2),
-                    (5+self.btn_s, pos_y-5), False, rgb.black,
-                )
+            if line == 0:
+                color = rgb.red2
+                self.draw_line(screen, color, (0, pos_y), (self.screen_x, pos_y), 2)
+                label_x = 10 + self.btn_s
             else:
-                self.draw_line(screen, rgb.gray2, (0, pos_y), (self.screen_x, pos_y), 1)
-                sim_pos_y = round(-((line + moved) * spacing) / zoom)
-                self.text(
-                    screen, rgb.gray2, self.fontsm,
-                    metric.format_si(sim_pos_y, 2),
-                    (5+self.btn_s, pos_y-5), False, rgb.black,
-                )
+                color = rgb.gray1 if line % 5 == 0 else rgb.gray2
+                self.draw_line(screen, color, (0, pos_y), (self.screen_x, pos_y), 1)
+                label_x = 5 + self.btn_s
+            screen.blit(self.grid_label(round(-(line * spacing) / zoom), color), (label_x, pos_y - 5))
 
 
     def buttons_vertical(self, screen, buttons_txt, pos, prop=None, safe=False):
@@ -20,11 +20,9 @@ def main_text(screen, color, font, text, pos):
 
 stage_texts = [
     "Loading menus",
-    "Compiling quartic solver",
-    "Compiling shared physics",
-    "Compiling COI physics",
-    "Compiling game physics",
-    "Compiling editor physics",
+    "Compiling physics",
+    "Loading game",
+    "Loading editor",
     "Finishing up",
     ]
 
@@ -38,11 +36,29 @@ class Loading:
         self.prev_stages = []
         self.last_stage = ""
         self.last_time = time.time()
+        self.last_progress = 0
 
 
     def stage(self, stage):
         """Set loading stage and draw it"""
         stage_time = time.time() - self.last_time
+        if self.last_stage:
+            self.prev_stages.append(f"{self.last_stage}: {round(stage_time, 2)}s")
+        self.last_stage = stage_texts[stage]
+        self.last_time = time.time()
+        self.draw()
+
+
+    def progress(self, text):
+        """Draw progress of current stage, drawing is limited to 30 times per second"""
+        if time.time() - self.last_progress < 1/30:
+            return
+        self.last_progress = time.time()
+        self.draw(text)
+
+
+    def draw(self, progress_text=""):
+        """Draw loading screen with current stage, its progress and previous stages"""
         self.screen.fill("black")
         main_text(self.screen, rgb.white, FONTTL, "Volatile Space",
                   (self.screen_x/2, self.screen_y/2 - FONTTL.get_height()/2))
@@ -50,18 +66,13 @@ class Loading:
                   (self.screen_x/2, self.screen_y/2 + FONTHD.get_height()/1.5))
         main_text(self.screen, rgb.gray1, FONTMD, "v" + VERSION, (self.screen_x - 25, self.screen_y - 10))
 
-        text = stage_texts[stage]
-        main_text(self.screen, rgb.gray, FONTMD, text, self.loading_pos)
-
-        if self.last_stage:
-            self.prev_stages.append(f"{self.last_stage}: {round(stage_time, 2)}s")
+        main_text(self.screen, rgb.gray, FONTMD, self.last_stage, self.loading_pos)
+        if progress_text:
+            main_text(self.screen, rgb.gray1, FONTMD, progress_text, (self.screen_x/2, self.screen_y - 40))
 
         for i, prev_text in enumerate(self.prev_stages[::-1]):
             pos = (self.loading_pos[0], self.loading_pos[1]+30*(i+1))
             color = [max(rgb.gray0[0] - rgb.gray0[0]/len(stage_texts)*(i+1), 0)]*3
             main_text(self.screen, color, FONTMD, prev_text, pos)
 
-        self.last_stage = text
-        self.last_time = time.time()
-
         pygame.display.flip()
@@ -1,5 +1,4 @@
 import importlib.util
-import os
 import shutil
 import sys
 import time
@@ -265,7 +264,7 @@ class Menu():
             elif e.key == pygame.K_RETURN:
                 if self.are_you_sure:
                     try:
-                        os.remove(self.selected_path)
+                        peripherals.delete_save(self.selected_path)
                         self.selected_item -= 1
                         self.selected_item = max(self.selected_item, 0)
                     except Exception:
@@ -516,7 +515,7 @@ class Menu():
                                     pass
                                 elif num == 1:   # delete
                                     try:
-                                        os.remove(self.selected_path)
+                                        peripherals.delete_save(self.selected_path)
                                         self.selected_item -= 1
                                         self.selected_item = max(self.selected_item, 0)
                                     except Exception:
@@ -628,7 +627,7 @@ class Menu():
                                     pass
                                 elif num == 1:   # delete
                                     try:
-                                        os.remove(self.selected_path)
+                                        peripherals.delete_save(self.selected_path)
                                         self.selected_item -= 1
                                         self.selected_item = max(self.selected_item, 0)
                                     except Exception:
@@ -738,19 +737,21 @@ class Menu():
                                     self.menu = 0
                                     if from_game:
                                         self.state = 2
-                                peripherals.save_settings("graphics", "fullscreen", self.fullscreen)
-                                peripherals.save_settings("graphics", "resolution", list(self.avail_res[self.selected_res]))
-                                peripherals.save_settings("graphics", "antialiasing", self.antial)
-                                peripherals.save_settings("graphics", "vsync", self.vsync)
-                                peripherals.save_settings("graphics", "mouse_warp", self.mouse_warp)
-                                peripherals.save_settings("graphics", "curve_points", self.curve_points)
-                                peripherals.save_settings("background", "stars", self.bg_stars_enable)
-                                peripherals.save_settings("background", "stars_new_color", self.new_color)
-                                peripherals.save_settings("background", "cluster_enable", self.cluster_enable)
-                                peripherals.save_settings("background", "cluster_new", self.cluster_new)
-                                peripherals.save_settings("game", "numba", self.numba)
-                                peripherals.save_settings("game", "fastmath", self.fastmath)
-                                peripherals.save_settings("game", "autosave_time", self.autosave_time)
+                                peripherals.save_settings_many([
+                                    ("graphics", "fullscreen", self.fullscreen),
+                                    ("graphics", "resolution", list(self.avail_res[self.selected_res])),
+                                    ("graphics", "antialiasing", self.antial),
+                                    ("graphics", "vsync", self.vsync),
+                                    ("graphics", "mouse_warp", self.mouse_warp),
+                                    ("graphics", "curve_points", self.curve_points),
+                                    ("background", "stars", self.bg_stars_enable),
+                                    ("background", "stars_new_color", self.new_color),
+                                    ("background", "cluster_enable", self.cluster_enable),
+                                    ("background", "cluster_new", self.cluster_new),
+                                    ("game", "numba", self.numba),
+                                    ("game", "fastmath", self.fastmath),
+                                    ("game", "autosave_time", self.autosave_time),
+                                ])
                                 # change windowed/fullscreen
                                 if self.screen_change is True:
                                     pygame.display.toggle_fullscreen()
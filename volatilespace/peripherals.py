@@ -1,7 +1,9 @@
 import os
+import queue
 import shutil
 import subprocess
 import sys
+import threading
 from ast import literal_eval
 from configparser import ConfigParser
 
@@ -12,7 +14,12 @@ from volatilespace import defaults
 settings = ConfigParser()
 keybindings = ConfigParser()
 settings.read("settings.ini")
+settings_cache = {}
 home_dir = os.path.expanduser("~")
+save_queue = queue.Queue()
+save_thread = None
+save_errors = queue.Queue()   # errors from background saves, read by main thread
+sidecar_ext = (".journal", ".rec", ".eph.npz", ".sweep.csv")   # journal, recording, ephemeris and sweep results next to save
 
 if sys.platform == "linux":
     zenity_path = shutil.which("zenity")
@@ -149,89 +156,136 @@ def import_file(file_filter=None):
     return file_path
 
 
+def read_metadata(path):
+    """Read only name and date from [game_data] section of save file, without parsing whole file"""
+    name = None
+    date = None
+    in_section = False
+    with open(path) as f:
+        for raw_line in f:
+            line = raw_line.strip()
+            if line.startswith("["):
+                if in_section:
+                    break
+                in_section = line == "[game_data]"
+            elif in_section:
+                key, _, value = line.partition("=")
+                key = key.strip().lower()
+                if key == "name":
+                    name = value.strip().strip('"')
+                elif key == "date":
+                    date = value.strip().strip('"')
+                if name is not None and date is not None:
+                    break
+    if name is None or date is None:
+        return None
+    return name, date
+
+
+def read_index(directory, files):
+    """Get name and date for all files in directory, using metadata index file.
+    Index is keyed by file name, size and modification time, and only changed files are read again.
+    Returns dict with file name as key and (name, date) as value."""
+    index_path = os.path.join(directory, ".index")
+    index = ConfigParser(interpolation=None)
+    try:
+        index.read(index_path)
+    except Exception:   # corrupted index is rebuilt
+        index = ConfigParser(interpolation=None)
+    changed = False
+    metadata = {}
+    for file_name in files:
+        try:
+            stat = os.stat(os.path.join(directory, file_name))
+        except OSError:
+            continue
+        stamp = str(stat.st_mtime_ns) + " " + str(stat.st_size)
+        if index.has_section(file_name) and index.get(file_name, "stamp", fallback="") == stamp:
+            metadata[file_name] = (index.get(file_name, "name"), index.get(file_name, "date"))
+            continue
+        try:
+            data = read_metadata(os.path.join(directory, file_name))
+        except Exception:
+            data = None
+        if not index.has_section(file_name):
+            index.add_section(file_name)
+        index.set(file_name, "stamp", stamp)
+        if data is None:   # invalid files are remembered too, so they are not read every time
+            index.set(file_name, "valid", "False")
+            index.set(file_name, "name", "")
+            index.set(file_name, "date", "")
+        else:
+            index.set(file_name, "valid", "True")
+            index.set(file_name, "name", data[0])
+            index.set(file_name, "date", data[1])
+            metadata[file_name] = data
+        changed = True
+
+    # remove deleted files
+    file_set = set(files)
+    for section in index.sections():
+        if section not in file_set:
+            index.remove_section(section)
+            changed = True
+    for file_name in list(metadata.keys()):
+        if index.get(file_name, "valid") != "True":
+            del metadata[file_name]
+
+    if changed:
+        try:
+            write_atomic(index_path, index)
+        except Exception:   # directory may be read-only
+            pass
+    return metadata
+
+
+def sort_list(files):
+    """Sort list of files by name then by date, and move quicksave and autosave at end"""
+    files = np.array(files, dtype=object).reshape(-1, 3)
+    files = files[files[:, 2].argsort(kind="mergesort")]
+    files = files[files[:, 1].argsort(kind="mergesort")]
+    end = np.isin(files[:, 0], ["quicksave.ini", "autosave.ini"])
+    order = np.argsort(files[end, 0])[::-1]   # quicksave then autosave
+    return np.concatenate((files[~end], files[end][order]))
+
+
 def gen_game_list():
-    """Generate list of maps in "Maps" dir. Name and edit date are read from file"""
+    """Generate list of games in "Saves" dir. Name and edit date are read from index"""
     if not os.path.exists("Saves"):
         os.mkdir("Saves")
-    files_list = os.listdir("Saves")
 
     # filter only files with .ini extension
     game_files = []
-    for file_name in files_list:
+    for file_name in os.listdir("Saves"):
         if file_name[-4:] == ".ini":
             game_files.append(file_name)
 
-    # get data
-    games = np.empty((0, 3), dtype=object)
-    for game_file in game_files:
-        game_save = ConfigParser()
-        game_save.read("Saves/" + game_file)
-        try:
-            name = game_save.get("game_data", "name").strip('"')
-            date = game_save.get("game_data", "date").strip('"')
-            games = np.vstack((games, [game_file, name, date]))
-        except Exception:
-            pass
-
-    # sort by name then by date
-    games = games[games[:, 2].argsort()]
-    games = games[games[:, 1].argsort(kind="mergesort")]
-
-    # move quicksave and autosave at end
-    for savetype in ["quicksave", "autosave"]:
-        save_lst = np.where((games[:, 0] == savetype + ".ini"))[0]
-        if len(save_lst) > 0:
-            save_ind = save_lst[0]
-            save_row = games[save_ind]
-            games = np.delete(games, save_ind, 0)
-            games = np.vstack((games, save_row))
-
-    return games
+    games = []
+    for file_name, (name, date) in read_index("Saves", game_files).items():
+        games.append([file_name, name, date])
+    return sort_list(games)
 
 
 def gen_map_list():
-    """Generate list of maps in "Maps" dir, name and edit date are read from file"""
+    """Generate list of maps in "Maps" dir, name and edit date are read from index"""
     if not os.path.exists("Maps"):
         os.mkdir("Maps")
     if not os.path.exists("Resources/BuiltinMaps"):
         os.makedirs(os.path.expanduser("Resources/BuiltinMaps"), exist_ok=True)
 
-    # filter only files with .ini extension
-    map_files = []
-    for file_name in os.listdir("Maps"):
-        if file_name[-4:] == ".ini":
-            map_files.append(os.path.join("Maps", file_name))
-    for file_name in os.listdir("Resources/BuiltinMaps"):
-        if file_name[-4:] == ".ini":
-            map_files.append(os.path.join("Resources", "BuiltinMaps", file_name))
-
-    # get data
-    maps = np.empty((0, 3), dtype=object)
-    for map_file in map_files:
-        map_save = ConfigParser()
-        map_save.read(map_file)
-        try:
-            name = map_save.get("game_data", "name").strip('"')
-            if "BuiltinMaps" in map_file:
-                name += " - Builtin"
-            date = map_save.get("game_data", "date").strip('"')
-            maps = np.vstack((maps, [map_file, name, date]))
-        except Exception:
-            pass
-
-    # sort by name then by date
-    maps = maps[maps[:, 2].argsort()]
-    maps = maps[maps[:, 1].argsort(kind="mergesort")]
-
-    # move quicksave and autosave at end
-    for savetype in ["quicksave", "autosave"]:
-        save_lst = np.where((maps[:, 0] == savetype + ".ini"))[0]
-        if len(save_lst) > 0:
-            save_ind = save_lst[0]
-            save_row = maps[save_ind]
-            maps = np.delete(maps, save_ind, 0)
-            maps = np.vstack((maps, save_row))
-    return maps
+    maps = []
+    for directory, builtin in ((os.path.join("Maps"), False), (os.path.join("Resources", "BuiltinMaps"), True)):
+        # filter only files with .ini extension
+        map_files = []
+        for file_name in os.listdir(directory):
+            if file_name[-4:] == ".ini":
+                map_files.append(file_name)
+        for file_name, (name, date) in read_index(directory, map_files).items():
+            if builtin:
+                maps.append([os.path.join(directory, file_name), name + " - Builtin", date])
+            else:
+                maps.append([os.path.join(directory, file_name), name, date])
+    return sort_list(maps)
 
 
 def load_file(path):
@@ -356,6 +410,10 @@ def load_file(path):
     vessel_data = {"name": v_name, "mass": v_mass, "rot_angle": v_rot_angle, "rot_acc": v_rot_acc, "sprite": v_sprite}
     vessel_orb_data = {"a": v_semi_major, "ecc": v_ecc, "pe_arg": v_pe_arg, "ma": v_ma, "ref": v_parents, "dir": v_direction}
 
+    # apply changes made after this file was written
+    if kepler:
+        replay_journal(path, game_data, body_orb_data, vessel_data, vessel_orb_data)
+
     return game_data, config, body_data, body_orb_data, vessel_data, vessel_orb_data
 
 
@@ -381,10 +439,8 @@ def save_file(path, game_data, conf, body_data, body_orb_data, vessel_data={}, v
                 name = map_name.get("game_data", "name").strip('"')
             except Exception:
                 name = "New map"
-        open(path, "w").close()   # delete file
 
     system = ConfigParser()
-    system.read(path)
 
     system.add_section("game_data")
     system.set("game_data", "name", name)
@@ -493,8 +549,179 @@ def save_file(path, game_data, conf, body_data, body_orb_data, vessel_data={}, v
             system.set(spec_v_name, "rot_acc", str(v_rot_acc[vessel]))
             system.set(spec_v_name, "sprite", str(v_sprite[vessel]))
 
-    with open(path, "w") as f:
-        system.write(f)
+    write_atomic(path, system)
+    # full save replaces all journaled changes
+    if os.path.exists(journal_path(path)):
+        os.remove(journal_path(path))
+
+
+def write_atomic(path, system):
+    """Write config to temporary file, then replace target with it, so file is never left half-written"""
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            system.write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def snapshot(data):
+    """Copy all arrays in data dict, so it can be safely used while original is changing"""
+    return {key: np.copy(value) if isinstance(value, np.ndarray) else value for key, value in data.items()}
+
+
+def journal_path(path):
+    """Path to journal file belonging to save file"""
+    return os.path.splitext(path)[0] + ".journal"
+
+
+def delete_save(path):
+    """Delete save file and all files belonging to it, so they are not used by new save with same name"""
+    os.remove(path)
+    for ext in sidecar_ext:
+        sidecar = os.path.splitext(path)[0] + ext
+        if os.path.isdir(sidecar):
+            shutil.rmtree(sidecar)
+        elif os.path.exists(sidecar):
+            os.remove(sidecar)
+
+
+def new_journal(path, time):
+    """
+    Create empty journal for save file, journal header is sim time of that save file.
+    Journal is then valid only if it matches save file time.
+    """
+    with open(journal_path(path), "wb") as f:
+        np.save(f, np.array([time], dtype=float))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def append_journal(path, game_data, body_orb_data, vessel_data, vessel_orb_data, changed):
+    """
+    Append one record to save file journal, record contains:
+    time and active vessel, mean anomaly of all bodies and vessels, vessel rotation,
+    and all orbital parameters only for vessels whose orbit has changed.
+    """
+    vessel = game_data["vessel"]
+    if vessel is None:
+        vessel = -1
+    changed_orb = np.column_stack((
+        changed,
+        vessel_orb_data["a"][changed],
+        vessel_orb_data["ecc"][changed],
+        vessel_orb_data["pe_arg"][changed],
+        vessel_orb_data["ref"][changed],
+        vessel_orb_data["dir"][changed],
+    )).astype(float)
+    with open(journal_path(path), "ab") as f:
+        np.save(f, np.array([game_data["time"], vessel, len(changed)], dtype=float))
+        np.save(f, np.asarray(body_orb_data["ma"], dtype=float))
+        np.save(f, np.asarray(vessel_orb_data["ma"], dtype=float))
+        np.save(f, np.asarray(vessel_data["rot_angle"], dtype=float))
+        np.save(f, changed_orb)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def replay_journal(path, game_data, body_orb_data, vessel_data, vessel_orb_data):
+    """
+    Apply all complete records from save file journal to loaded data.
+    Journal not matching save file time is ignored, and so is incomplete last record.
+    """
+    if not os.path.exists(journal_path(path)):
+        return
+    with open(journal_path(path), "rb") as f:
+        try:
+            header = np.load(f)
+        except Exception:
+            return
+        if len(header) != 1 or header[0] != game_data["time"]:
+            return
+        while True:
+            try:
+                record = np.load(f)
+                body_ma = np.load(f)
+                vessel_ma = np.load(f)
+                rot_angle = np.load(f)
+                changed_orb = np.load(f)
+            except Exception:   # end of file or record is incomplete
+                break
+            if len(body_ma) != len(body_orb_data["ma"]) or len(vessel_ma) != len(vessel_orb_data["ma"]):
+                break
+            game_data["time"] = record[0]
+            if record[1] < 0:
+                game_data["vessel"] = None
+            else:
+                game_data["vessel"] = int(record[1])
+            body_orb_data["ma"] = body_ma
+            vessel_orb_data["ma"] = vessel_ma
+            vessel_data["rot_angle"] = rot_angle
+            vessels = changed_orb[:, 0].astype(int)
+            vessel_orb_data["a"][vessels] = changed_orb[:, 1]
+            vessel_orb_data["ecc"][vessels] = changed_orb[:, 2]
+            vessel_orb_data["pe_arg"][vessels] = changed_orb[:, 3]
+            vessel_orb_data["ref"][vessels] = changed_orb[:, 4].astype(int)
+            vessel_orb_data["dir"][vessels] = changed_orb[:, 5]
+
+
+def save_worker():
+    """Run functions from save queue, one by one, in background thread"""
+    while True:
+        function, args = save_queue.get()
+        try:
+            function(*args)
+        except Exception as error:   # keep worker running, so following saves are not blocked
+            save_errors.put(error)
+        finally:
+            save_queue.task_done()
+
+
+def run_background(function, args):
+    """Add function to save queue, so it is run in background thread, after all previously added"""
+    global save_thread
+    if save_thread is None or not save_thread.is_alive():
+        save_thread = threading.Thread(target=save_worker, daemon=True)
+        save_thread.start()
+    save_queue.put((function, args))
+
+
+def save_file_background(path, game_data, conf, body_data, body_orb_data, vessel_data={}, vessel_orb_data={}):
+    """
+    Save system to file in background thread, so game loop is not blocked.
+    All data is copied first, so it can be changed while saving.
+    """
+    args = (path, dict(game_data), dict(conf)) + tuple(map(snapshot, (body_data, body_orb_data, vessel_data, vessel_orb_data)))
+    run_background(save_file, args)
+
+
+def new_journal_background(path, time):
+    """Create empty journal for save file in background thread, after save file is written"""
+    run_background(new_journal, (path, time))
+
+
+def append_journal_background(path, game_data, body_orb_data, vessel_data, vessel_orb_data, changed):
+    """Append record to save file journal in background thread"""
+    args = (path, dict(game_data)) + tuple(map(snapshot, (body_orb_data, vessel_data, vessel_orb_data))) + (np.array(changed, dtype=int), )
+    run_background(append_journal, args)
+
+
+def wait_saves():
+    """Block until all background saves are written to disk"""
+    save_queue.join()
+
+
+def save_error():
+    """Get next error from background saves, or None if there is none"""
+    try:
+        return save_errors.get_nowait()
+    except queue.Empty:
+        return None
 
 
 def new_map(name, date):
@@ -619,46 +846,123 @@ def rename_game(path, name):
         game.write(f)
 
 
-def save_settings(header, key, value):
-    """Save value of specified setting to settings file"""
+def parse_setting(value):
+    """Convert setting string to python value, if it fails, keep it as string"""
     try:
-        settings.set(header, key, str(value))
+        return literal_eval(value.replace("\\", "\\\\"))
+    except (ValueError, SyntaxError):
+        return value
+
+
+def valid_setting(value, default):
+    """Check if setting value has same type as its default value"""
+    if isinstance(default, bool):
+        return isinstance(value, bool)
+    if isinstance(default, (int, float)):
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if isinstance(default, list):
+        return isinstance(value, (list, tuple)) and len(value) == len(default)
+    return True
+
+
+def write_settings():
+    """Write all settings to settings file"""
+    try:
+        write_atomic("settings.ini", settings)
     except Exception:
-        settings.add_section(header)
+        pass
+
+
+def init_settings():
+    """
+    Parse all settings from settings file once and validate them against defaults.
+    Missing and invalid settings are replaced with defaults and written to file in single write.
+    """
+    settings_cache.clear()
+    changed = False
+    for header, header_defaults in defaults.settings.items():
+        if not settings.has_section(header):
+            settings.add_section(header)
+        for key, default_raw in header_defaults.items():
+            default = parse_setting(str(default_raw))
+            if settings.has_option(header, key):
+                value = parse_setting(settings.get(header, key))
+                if valid_setting(value, default):
+                    settings_cache[header, key] = value
+                    continue
+            settings.set(header, key, str(default))
+            settings_cache[header, key] = default
+            changed = True
+    # settings that have no defaults are kept as they are
+    for header in settings.sections():
+        for key, value in settings.items(header):
+            if (header, key) not in settings_cache:
+                settings_cache[header, key] = parse_setting(value)
+    if changed:
+        write_settings()
+
+
+def override_setting(header, key, value):
+    """Set value of setting for this process only, without saving it to settings file"""
+    if not settings_cache:
+        init_settings()
+    settings_cache[header, key] = value
+
+
+def save_settings(header, key, value):
+    """Save value of specified setting to settings file"""
+    save_settings_many([(header, key, value)])
+
+
+def save_settings_many(changes):
+    """Save multiple settings, given as list of (header, key, value), to settings file in single write"""
+    if not settings_cache:
+        init_settings()
+    changed = False
+    for header, key, value in changes:
+        if not settings.has_section(header):
+            settings.add_section(header)
         settings.set(header, key, str(value))
-    with open("settings.ini", "w") as f:
-        settings.write(f)
+        parsed = parse_setting(str(value))
+        if settings_cache.get((header, key)) != parsed:
+            settings_cache[header, key] = parsed
+            changed = True
+    if changed:
+        write_settings()
 
 
 def load_settings(header, key):
     """
     Load one or multiple settings from same header in settings file.
-    Key must be str, tuple or list. If loading failed, create that header/setting from defaults.
+    Key must be str, tuple or list. If setting is missing, default is used.
     """
+    if not settings_cache:
+        init_settings()
+    if isinstance(key, str):
+        return load_setting(header, key)
+    # if it is not string, it should be tuple or list
+    return [load_setting(header, one_key) for one_key in key]
+
+
+def load_setting(header, key):
+    """Load one setting from cache, if it is missing, add it from defaults. Unknown setting raises KeyError"""
     try:
-        if isinstance(key, str):
-            setting_raw = settings.get(header, key)
-            try:
-                setting = literal_eval(setting_raw.replace("\\", "\\\\"))
-            except ValueError:
-                setting = setting_raw
-        else:   # if it is not string, it should be tuple or list
-            setting = []
-            for one_key in key:
-                setting_raw = settings.get(header, key)
-                try:
-                    setting.append(literal_eval(setting_raw.replace("\\", "\\\\")))
-                except ValueError:
-                    setting.append(setting_raw)
-    except Exception:
-        setting = defaults.settings.get(key)
-        save_settings(header, key, setting)
-    return setting
+        value = settings_cache[header, key]
+    except KeyError:
+        default = parse_setting(str(defaults.settings[header][key]))
+        save_settings(header, key, default)
+        return default
+    if isinstance(value, list):   # so cached value is not modified by caller
+        return value.copy()
+    return value
 
 
 def delete_settings():
     """Remove all text from settings.ini so settings can be reverted to default"""
     open("settings.ini", "w").close()
+    for header in settings.sections():
+        settings.remove_section(header)
+    settings_cache.clear()
 
 
 def default_keybindings():
@@ -2,66 +2,46 @@ import math
 
 import numpy as np
 
+try:   # to allow building without numba
+    from numba import float64, int64, njit
+    from numba.types import UniTuple
+    numba_avail = True
+except ImportError:
+    numba_avail = False
+
+from volatilespace import peripherals
 from volatilespace.physics.enhanced_kepler_solver import solve_kepler_ell
 from volatilespace.physics.phys_shared import (
     compare_coord,
     cross_2d,
     dot_2d,
-    impl_derivative_rot_ell,
-    impl_derivative_rot_hyp,
     mag,
     newton_root_kepler_hyp,
     orb2xy,
-    rot_ellipse_by_y,
-    rot_hyperbola_by_y,
 )
+from volatilespace.physics.spatial_index import SpatialIndex
 
 
 def kepler_to_velocity(rel_pos, a, ecc, pe_arg, u, dr):
     """
     Convert from keplerian parameters to relative velocity vector, given that relative position vector is known.
-    True anomaly can be inverted for ellipse and hyperbola separately, if needed
+    Velocity is calculated in perifocal frame from true anomaly, then rotated same as position in orb2xy().
+    Same equation is valid for ellipse and hyperbola, since it has negative semi-major axis.
     """
-    if ecc < 1:   # ellipse
-        b = a * math.sqrt(1 - ecc**2)
-        f = math.sqrt(a**2 - b**2)
-        f_rot = [f * math.cos(pe_arg), f * math.sin(pe_arg)]    # focus rotated by pe_arg
-        # calculate position vector
-        p_x, p_y = rel_pos[0] - f * np.cos(pe_arg), rel_pos[1] - f * np.sin(pe_arg)   # point on ellipse relative to its center
-        # implicit derivative of rotated ellipse
-        rel_vel_angle = impl_derivative_rot_ell(p_x, p_y, a, b, pe_arg)
-        # calcualte angle of velocity vector
-        # calculate domain of function and subtract some small value (10**-6) so y can be calculated
-        x_max = math.sqrt(a**2 * math.cos(2*pe_arg) + a**2 - b**2 * math.cos(2*pe_arg) + b**2)/math.sqrt(2) - 10**-6
-        y_max = rot_ellipse_by_y(x_max, a, b, pe_arg)
-        x_max1, y_max1 = x_max + f_rot[0], y_max + f_rot[1]   # add rotated focus since it is origin
-        x_max2, y_max2 = -x_max + f_rot[0], -y_max + f_rot[1]   # function domain is symmetrical, so there are 2 points
-        # same angle is calculated on positive and negative part of ellipse curve, so:
-        if ((x_max2 - x_max1) * (rel_pos[1] - y_max1)) - ((y_max2 - y_max1) * (rel_pos[0] - x_max1)) < 0:   # when in positive part of curve:
-            rel_vel_angle += np.pi   # add pi to angle, put it in range (-1/2pi, 3/2pi) range
-    else:   # hyperbola
-        # note: a is negative
-        f = a * ecc
-        f_rot = [f * math.cos(pe_arg), f * math.sin(pe_arg)]
-        b = math.sqrt(f**2 - a**2)
-        p_x, p_y = rel_pos[0] - f * np.cosh(pe_arg), rel_pos[1] - f * np.sinh(pe_arg)
-        rel_vel_angle = impl_derivative_rot_hyp(p_x, p_y, a, b, pe_arg)
-        try:
-            x_max = math.sqrt(a**2 * math.cos(2*pe_arg) + a**2 + b**2 * math.cos(2*pe_arg) - b**2)/math.sqrt(2) - 10**-6
-            y_max = rot_hyperbola_by_y(x_max, a, b, pe_arg)
-            x_max1, y_max1 = x_max + f_rot[0], y_max + f_rot[1]
-            x_max2, y_max2 = -x_max + f_rot[0], -y_max + f_rot[1]
-            if ((x_max2 - x_max1) * (rel_pos[1] - y_max1)) - ((y_max2 - y_max1) * (rel_pos[0] - x_max1)) < 0:
-                rel_vel_angle += np.pi
-        except ValueError:
-            if np.pi <= pe_arg < 2*np.pi:
-                rel_vel_angle += np.pi
-    rel_vel_angle = rel_vel_angle % (2*np.pi)   # put it in (0, 2pi) range
-    distance = mag(rel_pos)
-    rel_speed = dr * math.sqrt(u * ((2 / distance) - (1 / a)))   # velocity magnitude from vis-viva eq
-    rel_vel_x = rel_speed * math.cos(rel_vel_angle)
-    rel_vel_y = rel_speed * math.sin(rel_vel_angle)
-    return np.array([rel_vel_x, rel_vel_y])
+    rot = pe_arg - np.pi
+    ta = math.atan2(rel_pos[1], rel_pos[0]) - rot   # true anomaly from position angle
+    speed = dr * math.sqrt(u / (a * (1 - ecc**2)))   # sqrt(u / semi-latus rectum)
+    vel_x = -speed * math.sin(ta)
+    vel_y = speed * (ecc + math.cos(ta))
+    return np.array([vel_x * math.cos(rot) - vel_y * math.sin(rot), vel_x * math.sin(rot) + vel_y * math.cos(rot)])
+
+
+def kepler_to_velocity_batch(rel_pos, a, ecc, pe_arg, u, dr):
+    """Convert from keplerian parameters to relative velocity vectors for multiple bodies, see kepler_to_velocity()"""
+    rel_vel = np.empty((rel_pos.shape[0], 2))
+    for body in range(rel_pos.shape[0]):
+        rel_vel[body] = kepler_to_velocity(rel_pos[body], a[body], ecc[body], pe_arg[body], u[body], dr[body])
+    return rel_vel
 
 
 def velocity_to_kepler(rel_pos, rel_vel, u, failsafe=0):
@@ -129,133 +109,162 @@ def velocity_to_kepler(rel_pos, rel_vel, u, failsafe=0):
     return a, ecc, pe_arg, ma, dr
 
 
-def to_newton(mass, orb_data, gc, coi_coef):
-    """Convert form keplerian orbit parameters to newtonian (position, velocity)"""
-    semi_major_l = orb_data["a"]
-    ecc_l = orb_data["ecc"]
-    pe_arg_l = orb_data["pe_arg"]
-    ma_l = orb_data["ma"]
-    ref_l = orb_data["ref"]
-    direction_l = orb_data["dir"]
-
-    coi = np.zeros([len(mass)])
-    pos = np.zeros((len(mass), 2), float)
-    vel = np.zeros((len(mass), 2), float)
-
-    # find coi sizes so bodies can be calculated in that order
-    for body, _ in enumerate(mass):
-        a = semi_major_l[body]
-        ref = ref_l[body]
-        coi[body] = a * (mass[body] / mass[ref])**(coi_coef)
-
-    # calculate positions from largest coi to smallest
-    # because parent position is needed to calculate correct position
-    bodies_sorted = np.argsort(coi)[-1::-1]
-    for body_s in bodies_sorted:
-        body = np.where(bodies_sorted == body_s)[0][0]   # sorted body index
-        if body:
-            a = semi_major_l[body]
-            ecc = ecc_l[body]
-            pe_arg = pe_arg_l[body]
-            ma = ma_l[body]
-            dr = direction_l[body]
-            ref = ref_l[body]
-            u = gc * mass[ref]
-
-            if dr > 0:
-                ma = -ma
+def kepler_elements(rel_pos, rel_vel, u):
+    """Calculate keplerian parameters of multiple bodies from their relative positions and velocities"""
+    num = rel_pos.shape[0]
+    semi_major = np.empty(num)
+    ecc = np.empty(num)
+    pe_arg = np.empty(num)
+    ma = np.empty(num)
+    direction = np.empty(num)
+    for body in range(num):
+        pos_x, pos_y = rel_pos[body, 0], rel_pos[body, 1]
+        vel_x, vel_y = rel_vel[body, 0], rel_vel[body, 1]
+        distance = math.sqrt(pos_x**2 + pos_y**2)
+        semi_major[body] = -1 * u[body] / (2*((vel_x**2 + vel_y**2) / 2 - u[body] / distance))
+        momentum = pos_x * vel_y - pos_y * vel_x
+        # since this is 2d and momentum is scalar, cross product is not needed, so just multiply, swap axes and negate y:
+        ecc_x = vel_y * momentum / u[body] - pos_x / distance
+        ecc_y = -vel_x * momentum / u[body] - pos_y / distance
+        ecc[body] = math.sqrt(ecc_x**2 + ecc_y**2)
+        pe_arg[body] = ((3 * np.pi / 2) + math.atan2(-ecc_x, ecc_y)) % (2*np.pi)
+        direction[body] = math.copysign(1, momentum)   # if moment is negative, rotation is clockwise (-1)
+        ta = (pe_arg[body] - (math.atan2(pos_y, pos_x) - np.pi)) % (2*np.pi)
+        if direction[body] == -1:   # clockwise
+            ta = 2*np.pi - ta   # invert Ta to be calculated in opposite direction
+        if ecc[body] < 1:
+            ea = math.acos((ecc[body] + math.cos(ta))/(1 + (ecc[body] * math.cos(ta))))   # eccentric from true anomaly
+            if np.pi < ta < 2*np.pi:
+                ea = 2*np.pi - ea   # quadrant problems
+            ma[body] = (ea - ecc[body] * math.sin(ea)) % (2*np.pi)   # mean anomaly from Keplers equation
+        else:
+            ea = math.acosh((ecc[body] + math.cos(ta))/(1 + (ecc[body] * math.cos(ta))))
+            ma[body] = ecc[body] * math.sinh(ea) - ea
+    return semi_major, ecc, pe_arg, ma, direction
 
-            if ecc == 0:   # to avoid division by zero
-                ecc = 0.00001
-            if ecc == 1:   # to avoid parabola
-                ecc = 1.00001
 
-            b = a * math.sqrt(1 - ecc**2)
-            f = math.sqrt(a**2 - b**2)
-            if ecc < 1:
-                ea = solve_kepler_ell(ecc, ma, 1e-10)
-                rel_pos_x = a * math.cos(ea) - f
-                rel_pos_y = b * math.sin(ea)
-            else:
-                ea = newton_root_kepler_hyp(ecc, ma, 0.0)
-                rel_pos_x = a * math.cosh(ea) - f
-                rel_pos_y = b * math.sinh(ea)
-            rel_pos = np.array([rel_pos_x * math.cos(pe_arg - np.pi) - rel_pos_y * math.sin(pe_arg - np.pi),
-                                rel_pos_x * math.sin(pe_arg - np.pi) + rel_pos_y * math.cos(pe_arg - np.pi)])
-            rel_vel = kepler_to_velocity(rel_pos, a, ecc, pe_arg, u, dr)
+def kepler_positions(a, ecc, pe_arg, ma):
+    """Calculate relative positions of multiple bodies from keplerian parameters"""
+    rel_pos = np.empty((a.shape[0], 2))
+    for body in range(a.shape[0]):
+        f = a[body] * ecc[body]
+        b = math.sqrt(abs(f**2 - a[body]**2))
+        if ecc[body] < 1:
+            ea = solve_kepler_ell(ecc[body], ma[body], 1e-10)
+            pos_x = a[body] * math.cos(ea) - f
+            pos_y = b * math.sin(ea)
+        else:
+            ea = newton_root_kepler_hyp(ecc[body], ma[body], 0.0)
+            pos_x = a[body] * math.cosh(ea) - f
+            pos_y = b * math.sinh(ea)
+        rel_pos[body, 0] = pos_x * math.cos(pe_arg[body] - np.pi) - pos_y * math.sin(pe_arg[body] - np.pi)
+        rel_pos[body, 1] = pos_x * math.sin(pe_arg[body] - np.pi) + pos_y * math.cos(pe_arg[body] - np.pi)
+    return rel_pos
+
+
+def relative_to_absolute(rel_vectors, ref):
+    """Add vectors of all parents to each relative vector, root is body 0"""
+    vectors = rel_vectors.copy()
+    for body in range(1, ref.shape[0]):
+        parent = ref[body]
+        for _ in range(ref.shape[0]):   # limit in case of invalid parents loop
+            if parent == 0:
+                break
+            vectors[body] += rel_vectors[parent]
+            parent = ref[parent]
+    return vectors
+
+
+def select_parents(rank, offsets, found):
+    """From COIs containing each body, select smallest one belonging to body heavier than it. Default parent is root."""
+    ref = np.zeros(rank.shape[0], dtype=np.int64)
+    for body in range(rank.shape[0]):
+        parent_rank = -1
+        for parent in found[offsets[body]:offsets[body+1]]:
+            if parent_rank < rank[parent] < rank[body]:
+                ref[body] = parent
+                parent_rank = rank[parent]
+    return ref
 
-            pos[body] = pos[ref] + rel_pos
-            vel[body] = vel[ref] + rel_vel
 
+def find_parents(mass, pos, vel, gc, coi_coef):
+    """
+    Find parent of each body, which is the lightest heavier body whose COI contains it.
+    COI depends on parent, so parents are searched in index of COIs until they stop changing,
+    which takes about as many iterations as there are levels in body hierarchy.
+    """
+    rank = np.empty(len(mass), dtype=np.int64)   # position of body when sorted by mass
+    rank[np.argsort(mass)[-1::-1]] = np.arange(len(mass))
+    ref = np.zeros(len(mass), dtype=np.int64)
+    index = SpatialIndex()
+    for _ in range(len(mass)):
+        coi = np.zeros(len(mass))
+        semi_major = kepler_elements(pos[1:] - pos[ref[1:]], vel[1:] - vel[ref[1:]], gc * mass[ref[1:]])[0]
+        # if orbit is hyperbola or parabola, body has no COI, otherwise it would be infinite
+        coi[1:] = np.where(semi_major > 0, semi_major * (mass[1:] / mass[ref[1:]])**coi_coef, 0)
+        index.build(pos, coi)
+        new_ref = select_parents(rank, *index.query_points(pos))
+        if np.array_equal(new_ref, ref):
+            break
+        ref = new_ref
+    return ref
+
+
+def to_newton(mass, orb_data, gc):
+    """Convert form keplerian orbit parameters to newtonian (position, velocity)"""
+    semi_major = np.asarray(orb_data["a"], dtype=np.float64)
+    ecc = np.asarray(orb_data["ecc"], dtype=np.float64)
+    pe_arg = np.asarray(orb_data["pe_arg"], dtype=np.float64)
+    direction = np.asarray(orb_data["dir"], dtype=np.float64)
+    ref = np.asarray(orb_data["ref"]).astype(np.int64)
+    ma = np.asarray(orb_data["ma"], dtype=np.float64)
+    ma = np.where(direction > 0, -ma, ma)
+    ecc = np.where(ecc == 0, 0.00001, ecc)   # to avoid division by zero
+    ecc = np.where(ecc == 1, 1.00001, ecc)   # to avoid parabola
+
+    # root stays in origin
+    rel_pos = np.zeros((len(mass), 2))
+    rel_vel = np.zeros((len(mass), 2))
+    rel_pos[1:] = kepler_positions(semi_major[1:], ecc[1:], pe_arg[1:], ma[1:])
+    rel_vel[1:] = kepler_to_velocity_batch(rel_pos[1:], semi_major[1:], ecc[1:], pe_arg[1:], gc * mass[ref[1:]], direction[1:])
+
+    # parents positions and velocities are added to relative ones
+    pos = relative_to_absolute(rel_pos, ref)
+    vel = relative_to_absolute(rel_vel, ref)
     return {"kepler": False, "pos": pos, "vel": vel}
 
 
 def to_kepler(mass, orb_data, gc, coi_coef):
     """Convert form newtonian (position, velocity) orbit parameters to keplerian"""
-    pos = orb_data["pos"]
-    vel = orb_data["vel"]
-
-    coi = np.zeros([len(mass)])
-    ref_l = np.zeros([len(mass)], dtype=int)
-    semi_major_l = np.zeros([len(mass)])
-    ecc_l = np.zeros([len(mass)])
-    pe_arg_l = np.zeros([len(mass)])
-    ma_l = np.zeros([len(mass)])
-    direction_l = np.zeros([len(mass)])
-
-    # calculate coi and find parents
-    bodies_sorted = np.argsort(mass)[-1::-1]   # get indices for sort bodies by mass
-    for body_s in range(len(mass)):
-        body = np.where(bodies_sorted == body_s)[0][0]   # sorted body index
-        ref = 0   # parent is root, until other is found
-        for num_l in range(len(bodies_sorted[:body])):   # for previously calculated bodies:
-            pot_parent = bodies_sorted[num_l]
-            rel_pos = pos[body_s] - pos[pot_parent]
-            if rel_pos[0]*rel_pos[0] + rel_pos[1]*rel_pos[1] < coi[pot_parent]*coi[pot_parent]:   # ultra fast check if point is inside circle - COI
-                ref = pot_parent
-                # loop continues until smallest parent body is found
-        ref_l[body_s] = ref
-        rel_pos = pos[ref] - pos[body]
-        rel_vel = vel[ref] - vel[body]
-        u = gc * mass[ref]   # standard gravitational parameter
-        semi_major = -1 * u / (2*(dot_2d(rel_vel, rel_vel) / 2 - u / mag(rel_pos)))   # semi-major axis
-        if semi_major > 0:
-            coi[body] = semi_major * (mass[body] / mass[ref])**coi_coef   # calculate its COI and save to index
-        else:
-            coi[body] = 0   # if orbit is hyperbola or parabola, body has no COI, otherwise it would be infinite
-
-    # calculate all other stuff
-    for body in range(len(mass)):
-        if body:   # skip root
-            ref = ref_l[body]
-            rel_pos = pos[body] - pos[ref]
-            rel_vel = vel[body] - vel[ref]
-            u = gc * mass[ref]
-            semi_major = -1 * u / (2*(dot_2d(rel_vel, rel_vel) / 2 - u / mag(rel_pos)))
-            momentum = cross_2d(rel_pos, rel_vel)
-            # since this is 2d and momentum is scalar, cross product is not needed, so just multiply, swap axes and negate y:
-            rel_vel[0], rel_vel[1] = rel_vel[1], -rel_vel[0]
-            ecc_v = (rel_vel * momentum / u) - rel_pos / mag(rel_pos)
-            ecc = mag(ecc_v)
-            pe_arg = ((3 * np.pi / 2) + math.atan2(-ecc_v[0], ecc_v[1])) % (2*np.pi)
-            direction = int(math.copysign(1, momentum[0]))   # if moment is negative, rotation is clockwise (-1)
-
-            ta = (pe_arg - (math.atan2(rel_pos[1], rel_pos[0]) - np.pi)) % (2*np.pi)
-            if direction == -1:   # clockwise
-                ta = 2*np.pi - ta   # invert Ta to be calculated in opposite direction
-            if ecc < 1:
-                ea = math.acos((ecc + math.cos(ta))/(1 + (ecc * math.cos(ta))))   # eccentric from true anomaly
-                if np.pi < ta < 2*np.pi:
-                    ea = 2*np.pi - ea   # quadrant problems
-                ma = (ea - ecc * math.sin(ea)) % (2*np.pi)   # mean anomaly from Keplers equation
-            else:
-                ea = math.acosh((ecc + math.cos(ta))/(1 + (ecc * math.cos(ta))))
-                ma = ecc * math.sinh(ea) - ea
+    pos = np.asarray(orb_data["pos"], dtype=np.float64)
+    vel = np.asarray(orb_data["vel"], dtype=np.float64)
+    ref = find_parents(mass, pos, vel, gc, coi_coef)
+
+    # calculate all other stuff, root is skipped
+    semi_major = np.zeros(len(mass))
+    ecc = np.zeros(len(mass))
+    pe_arg = np.zeros(len(mass))
+    ma = np.zeros(len(mass))
+    direction = np.zeros(len(mass))
+    semi_major[1:], ecc[1:], pe_arg[1:], ma[1:], direction[1:] = kepler_elements(pos[1:] - pos[ref[1:]], vel[1:] - vel[ref[1:]], gc * mass[ref[1:]])
+
+    return {"kepler": True, "a": semi_major, "ecc": ecc, "pe_arg": pe_arg, "ma": ma, "ref": ref, "dir": direction}
 
-            semi_major_l[body] = semi_major
-            ecc_l[body] = ecc
-            pe_arg_l[body] = pe_arg
-            ma_l[body] = ma
-            direction_l[body] = direction
 
-    return {"kepler": True, "a": semi_major_l, "ecc": ecc_l, "pe_arg": pe_arg_l, "ma": ma_l, "ref": ref_l, "dir": direction_l}
+# if numba is enabled, compile functions ahead of time
+use_numba = peripherals.load_settings("game", "numba")
+if numba_avail and use_numba:
+    enable_fastmath = peripherals.load_settings("game", "fastmath")
+    jitkw = {"cache": True, "fastmath": enable_fastmath}   # numba JIT setings
+    kepler_to_velocity = njit(float64[:](float64[:], float64, float64, float64, float64, float64), **jitkw)(kepler_to_velocity)
+    kepler_to_velocity_batch = njit(
+        float64[:, :](float64[:, :], float64[:], float64[:], float64[:], float64[:], float64[:]),
+        **jitkw,
+    )(kepler_to_velocity_batch)
+    kepler_elements = njit(
+        UniTuple(float64[:], 5)(float64[:, :], float64[:, :], float64[:]),
+        **jitkw,
+    )(kepler_elements)
+    kepler_positions = njit(float64[:, :](float64[:], float64[:], float64[:], float64[:]), **jitkw)(kepler_positions)
+    relative_to_absolute = njit(float64[:, :](float64[:, :], int64[:]), **jitkw)(relative_to_absolute)
+    select_parents = njit(int64[:](int64[:], int64[:], int64[:]), **jitkw)(select_parents)
@@ -8,8 +8,10 @@ Adapted to python with numba
 
 import math
 
+import numpy as np
+
 try:
-    from numba import float64, njit
+    from numba import float64, int64, njit
     numba_avail = True
 except ImportError:
     numba_avail = False
@@ -69,7 +71,108 @@ def solve_kepler_ell(ecc, ma, tol):
     return ma + flip * (mr - eapp)
 
 
+def solve_kepler_ell_batch(ecc, ma, tol):
+    """Find roots of keplers equation for multiple orbits with ENRKE"""
+    ea = np.empty(len(ma))
+    for num in range(len(ma)):
+        ea[num] = solve_kepler_ell(ecc[num], ma[num], tol)
+    return ea
+
+
+# tabulated solver grid, above table_ecc_max ENRKE is used
+table_ecc_max = 0.9
+table_ecc_num = 64
+table_ma_num = 1024
+
+
+def kepler_table():
+    """
+    Build table of ea(ma, ecc) for tabulated solver, for ma in (0, pi) and ecc in (0, table_ecc_max).
+    Table also contains derivatives of ea by ma and by ecc, used for interpolation. Shape: (ecc, ma, 3).
+    """
+    table = np.empty((table_ecc_num, table_ma_num, 3))
+    for i in range(table_ecc_num):
+        ecc = i * table_ecc_max / (table_ecc_num - 1)
+        for j in range(table_ma_num):
+            ea = solve_kepler_ell(ecc, j * math.pi / (table_ma_num - 1), 1e-15)
+            table[i, j, 0] = ea
+            table[i, j, 1] = 1 / (1 - ecc * math.cos(ea))
+            table[i, j, 2] = math.sin(ea) / (1 - ecc * math.cos(ea))
+    return table
+
+
+def hermite(p0, p1, m0, m1, t, h):
+    """Cubic Hermite interpolation between two points with known derivatives"""
+    t2 = t * t
+    t3 = t2 * t
+    return (2*t3 - 3*t2 + 1) * p0 + (t3 - 2*t2 + t) * h * m0 + (-2*t3 + 3*t2) * p1 + (t3 - t2) * h * m1
+
+
+def solve_kepler_table(table, ecc, ma):
+    """
+    Find root of keplers equaion: ma = ea - e * sin(ea)
+    By cubic Hermite interpolation in table from kepler_table(), finished with one Newton step.
+    If ecc is outside of table, ENRKE is used.
+    """
+    if ecc > table_ecc_max:
+        return solve_kepler_ell(ecc, ma, 1e-10)
+    turns = ma - ma % (2 * math.pi)
+    mr = ma - turns
+    if mr > math.pi:
+        mr = 2 * math.pi - mr
+        flip = True
+    else:
+        flip = False
+
+    # position in table
+    h_ma = math.pi / (table_ma_num - 1)
+    h_ecc = table_ecc_max / (table_ecc_num - 1)
+    j = min(int(mr / h_ma), table_ma_num - 2)
+    t = mr / h_ma - j
+    i = min(int(ecc / h_ecc), table_ecc_num - 2)
+    u = ecc / h_ecc - i
+
+    # interpolate by ma in two neighbouring ecc rows, then by ecc between them
+    ea_0 = hermite(table[i, j, 0], table[i, j+1, 0], table[i, j, 1], table[i, j+1, 1], t, h_ma)
+    ea_1 = hermite(table[i+1, j, 0], table[i+1, j+1, 0], table[i+1, j, 1], table[i+1, j+1, 1], t, h_ma)
+    dea_0 = (1 - t) * table[i, j, 2] + t * table[i, j+1, 2]
+    dea_1 = (1 - t) * table[i+1, j, 2] + t * table[i+1, j+1, 2]
+    ea = hermite(ea_0, ea_1, dea_0, dea_1, u, h_ecc)
+
+    # one Newton step
+    ea -= (ea - ecc * math.sin(ea) - mr) / (1 - ecc * math.cos(ea))
+    if flip:
+        ea = 2 * math.pi - ea
+    return ea + turns
+
+
+def solve_kepler_table_batch(table, ecc, ma):
+    """Find roots of keplers equation for multiple orbits with tabulated solver"""
+    ea = np.empty(len(ma))
+    for num in range(len(ma)):
+        ea[num] = solve_kepler_table(table, ecc[num], ma[num])
+    return ea
+
+
+def kepler_table_error(table, step):
+    """Get largest difference between tabulated solver and ENRKE, at middle of every step-th table cell, where interpolation is worst"""
+    error = 0.0
+    for i in range(table_ecc_num - 1):
+        ecc = (i + 0.5) * table_ecc_max / (table_ecc_num - 1)
+        for j in range(0, table_ma_num - 1, step):
+            ma = (j + 0.5) * math.pi / (table_ma_num - 1)
+            for mr in (ma, 2 * math.pi - ma):
+                error = max(error, abs(solve_kepler_table(table, ecc, mr) - solve_kepler_ell(ecc, mr, 1e-15)))
+    return error
+
+
 # if numba is available, compile functions ahead of time
 if numba_avail:
     jitkw = {"cache": True}
     solve_kepler_ell = njit(float64(float64, float64, float64), **jitkw)(solve_kepler_ell)
+    solve_kepler_ell_batch = njit(float64[:](float64[:], float64[:], float64), **jitkw)(solve_kepler_ell_batch)
+    kepler_table = njit(float64[:, :, :](), **jitkw)(kepler_table)
+    hermite = njit(float64(float64, float64, float64, float64, float64, float64), **jitkw)(hermite)
+    solve_kepler_table = njit(float64(float64[:, :, :], float64, float64), **jitkw)(solve_kepler_table)
+    solve_kepler_table_batch = njit(float64[:](float64[:, :, :], float64[:], float64[:]), **jitkw)(solve_kepler_table_batch)
+    kepler_table_error = njit(float64(float64[:, :, :], int64), **jitkw)(kepler_table_error)
@@ -0,0 +1,187 @@
+import hashlib
+import math
+import os
+
+import numpy as np
+
+try:   # to allow building without numba
+    from numba import float64, int64, njit
+    from numba.types import Tuple, UniTuple
+    numba_avail = True
+except ImportError:
+    numba_avail = False
+
+from volatilespace import peripherals
+from volatilespace.physics.enhanced_kepler_solver import solve_kepler_ell
+
+degree = 12   # degree of chebyshev polynomial in each segment
+segments_min = 8   # number of segments in first fit, doubled until fit is accurate enough
+segments_max = 4096   # bodies needing more segments are not tabulated
+tolerance = 1e-12   # max fit error of position relative to semi-major axis, and of ea in radians
+# table values: x, y, ea - ma
+empty_table = (np.zeros((0, 3, degree + 1)), np.zeros((0, 2), dtype=np.int64))
+
+
+def ephemeris_path(path):
+    """Path to ephemeris cache belonging to save file"""
+    return os.path.splitext(path)[0] + ".eph.npz"
+
+
+def chebyshev(coeffs, x):
+    """Evaluate chebyshev series at x in (-1, 1) with Clenshaw recurrence"""
+    b1 = 0.0
+    b2 = 0.0
+    for j in range(len(coeffs) - 1, 0, -1):
+        b1, b2 = 2 * x * b1 - b2 + coeffs[j], b1
+    return x * b1 - b2 + coeffs[0]
+
+
+def kepler_state(a, b, f, ecc, pea, ma):
+    """Calculate relative position and ea on elliptic orbit from ma, with tight tolerance"""
+    ea = solve_kepler_ell(ecc, ma, 1e-15)
+    x_n = a * math.cos(ea) - f
+    y_n = b * math.sin(ea)
+    x = x_n * math.cos(pea - math.pi) - y_n * math.sin(pea - math.pi)
+    y = x_n * math.sin(pea - math.pi) + y_n * math.cos(pea - math.pi)
+    return x, y, ea
+
+
+def fit_body(a, b, f, ecc, pea, segments):
+    """Fit chebyshev series to relative position and ea of body over one period, split into segments of same ma width"""
+    nodes = degree + 1
+    width = 2 * math.pi / segments
+    coeffs = np.zeros((segments, 3, nodes))
+    values = np.empty((3, nodes))
+    for segment in range(segments):
+        for k in range(nodes):
+            ma = segment * width + (math.cos(math.pi * (k + 0.5) / nodes) + 1) * width / 2
+            x, y, ea = kepler_state(a, b, f, ecc, pea, ma)
+            values[0, k] = x
+            values[1, k] = y
+            values[2, k] = ea - ma
+        for j in range(nodes):
+            for k in range(nodes):
+                weight = math.cos(math.pi * j * (k + 0.5) / nodes) * 2 / nodes
+                for value in range(3):
+                    coeffs[segment, value, j] += values[value, k] * weight
+        for value in range(3):
+            coeffs[segment, value, 0] /= 2
+    return coeffs
+
+
+def fit_error(coeffs, a, b, f, ecc, pea):
+    """Get largest position error relative to semi-major axis, and ea error, of fitted body, checked between fit nodes"""
+    segments = coeffs.shape[0]
+    width = 2 * math.pi / segments
+    scale = max(abs(a), 1.0)
+    error = 0.0
+    for segment in range(segments):
+        for k in range(2 * degree + 1):
+            x_seg = k / degree - 1
+            ma = segment * width + (x_seg + 1) * width / 2
+            x, y, ea = kepler_state(a, b, f, ecc, pea, ma)
+            error = max(
+                error,
+                abs(chebyshev(coeffs[segment, 0], x_seg) - x) / scale,
+                abs(chebyshev(coeffs[segment, 1], x_seg) - y) / scale,
+                abs(chebyshev(coeffs[segment, 2], x_seg) + ma - ea),
+            )
+    return error
+
+
+def build_tables(a, b, f, ecc, pea):
+    """
+    Build ephemeris tables for all bodies, number of segments is doubled for each body until fit is accurate.
+    Returns coefficients of all segments, and first segment and number of segments for each body.
+    Hyperbolic bodies and bodies needing too many segments have no segments.
+    """
+    tables = []
+    ranges = np.zeros((len(a), 2), dtype=np.int64)
+    start = 0
+    for body in range(len(a)):
+        if ecc[body] >= 1:
+            ranges[body, 0] = start
+            continue
+        segments = segments_min
+        while segments <= segments_max:
+            coeffs = fit_body(a[body], b[body], f[body], ecc[body], pea[body], segments)
+            if fit_error(coeffs, a[body], b[body], f[body], ecc[body], pea[body]) <= tolerance:
+                tables.append(coeffs)
+                break
+            segments *= 2
+        else:
+            segments = 0
+        ranges[body, 0] = start
+        ranges[body, 1] = segments
+        start += segments
+    if not tables:
+        return empty_table[0].copy(), ranges
+    return np.concatenate(tables), ranges
+
+
+def table_key(a, b, f, ecc, pea):
+    """Get key of body orbits and table settings, used to check if cached tables are still valid"""
+    hasher = hashlib.sha256()
+    hasher.update(f"{degree} {segments_min} {segments_max} {tolerance}".encode())
+    for array in (a, b, f, ecc, pea):
+        hasher.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+    return hasher.hexdigest()
+
+
+def load_tables(path, a, b, f, ecc, pea):
+    """Load ephemeris tables from cache next to save if they match body orbits, otherwise build and cache them"""
+    key = table_key(a, b, f, ecc, pea)
+    cache = ephemeris_path(path) if path else None
+    if cache:
+        try:
+            with np.load(cache) as data:
+                if str(data["key"]) == key:
+                    return data["coeffs"], data["ranges"]
+        except (OSError, ValueError, KeyError):
+            pass
+    coeffs, ranges = build_tables(np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64), np.asarray(f, dtype=np.float64),
+                                  np.asarray(ecc, dtype=np.float64), np.asarray(pea, dtype=np.float64))
+    if cache:
+        try:
+            with open(cache, "wb") as file:
+                np.savez(file, key=key, coeffs=coeffs, ranges=ranges)
+        except OSError:
+            pass
+    return coeffs, ranges
+
+
+def table_at(coeffs, start, segments, ma):
+    """Get relative position and ea of tabulated body at ma, all three series are evaluated in one Clenshaw recurrence"""
+    ma = ma % (2 * math.pi)
+    width = 2 * math.pi / segments
+    segment = min(int(ma / width), segments - 1)
+    x = 2 * (ma - segment * width) / width - 1
+    row = coeffs[start + segment]
+    x1 = x2 = y1 = y2 = e1 = e2 = 0.0
+    for j in range(degree, 0, -1):
+        x1, x2 = 2 * x * x1 - x2 + row[0, j], x1
+        y1, y2 = 2 * x * y1 - y2 + row[1, j], y1
+        e1, e2 = 2 * x * e1 - e2 + row[2, j], e1
+    return x * x1 - x2 + row[0, 0], x * y1 - y2 + row[1, 0], x * e1 - e2 + row[2, 0] + ma
+
+
+def tables_at(coeffs, ranges, ma):
+    """Get relative positions and ea of all bodies at their ma, values are nan for bodies that are not tabulated"""
+    rel_pos = np.full((len(ma), 2), np.nan)
+    ea = np.full(len(ma), np.nan)
+    for body in range(len(ma)):
+        if ranges[body, 1]:
+            rel_pos[body, 0], rel_pos[body, 1], ea[body] = table_at(coeffs, ranges[body, 0], ranges[body, 1], ma[body])
+    return rel_pos, ea
+
+
+# if numba is enabled, compile functions ahead of time
+use_numba = peripherals.load_settings("game", "numba")
+if numba_avail and use_numba:
+    jitkw = {"cache": True, "fastmath": False}   # fastmath would lower fit accuracy
+    chebyshev = njit(float64(float64[:], float64), **jitkw)(chebyshev)
+    kepler_state = njit(UniTuple(float64, 3)(float64, float64, float64, float64, float64, float64), **jitkw)(kepler_state)
+    fit_body = njit(float64[:, :, :](float64, float64, float64, float64, float64, int64), **jitkw)(fit_body)
+    fit_error = njit(float64(float64[:, :, :], float64, float64, float64, float64, float64), **jitkw)(fit_error)
+    table_at = njit(UniTuple(float64, 3)(float64[:, :, :], int64, int64, float64), **jitkw)(table_at)
+    tables_at = njit(Tuple((float64[:, :], float64[:]))(float64[:, :, :], int64[:, :], float64[:]), **jitkw)(tables_at)
@@ -0,0 +1,229 @@
+import math
+
+import numpy as np
+
+try:   # to allow building without numba
+    from numba import float64, int64, njit
+    from numba.types import Tuple, UniTuple
+    numba_avail = True
+except ImportError:
+    numba_avail = False
+
+from volatilespace import peripherals
+from volatilespace.physics.convert import kepler_to_velocity
+from volatilespace.physics.orbit_intersect import body_position_at, position_at
+
+grid_size = 100   # number of flight times, and minimal number of departure times in porkchop grid
+departures_per_period = 32   # departure times per period of shorter orbit, so vessel position is sampled densely enough
+departures_max = 1000
+tof_range = (0.3, 2.0)   # flight times searched, relative to hohmann transfer time
+window_max = 5   # departure window is at most this many periods of longer orbit
+
+
+def stumpff(z):
+    """Calculate Stumpff functions C(z) and S(z), series is used near zero to avoid cancellation"""
+    if z > 1e-3:
+        sz = math.sqrt(z)
+        return (1 - math.cos(sz)) / z, (sz - math.sin(sz)) / (sz * z)
+    if z < -1e-3:
+        sz = math.sqrt(-z)
+        return (math.cosh(sz) - 1) / -z, (math.sinh(sz) - sz) / (sz * -z)
+    return 1/2 - z/24 + z**2/720 - z**3/40320, 1/6 - z/120 + z**2/5040 - z**3/362880
+
+
+def propagate_universal(rel_pos, rel_vel, u, dt):
+    """
+    Propagate relative position and velocity by time dt, with universal variable formulation.
+    Same for all conics: ellipse, parabola and hyperbola. Returns new relative position and velocity.
+    """
+    r0 = math.sqrt(rel_pos[0]**2 + rel_pos[1]**2)
+    sigma0 = (rel_pos[0] * rel_vel[0] + rel_pos[1] * rel_vel[1]) / math.sqrt(u)
+    alpha = 2 / r0 - (rel_vel[0]**2 + rel_vel[1]**2) / u   # inverse of semi-major axis
+    if alpha > 1e-12:   # for ellipse, whole periods are skipped
+        dt = dt % (2 * np.pi / math.sqrt(u * alpha**3))
+    sqrt_u_dt = math.sqrt(u) * dt
+
+    # solve universal Kepler equation with Laguerre-Conway method
+    if alpha > 1e-12:
+        chi = sqrt_u_dt * alpha
+    else:
+        chi = sqrt_u_dt / r0
+    for _ in range(50):
+        z = alpha * chi**2
+        cz, sz = stumpff(z)
+        f = sigma0 * chi**2 * cz + (1 - alpha * r0) * chi**3 * sz + r0 * chi - sqrt_u_dt
+        df = sigma0 * chi * (1 - z * sz) + (1 - alpha * r0) * chi**2 * cz + r0
+        ddf = sigma0 * (1 - z * cz) + (1 - alpha * r0) * chi * (1 - z * sz)
+        delta = 5 * f / (df + math.copysign(math.sqrt(abs(16 * df**2 - 20 * f * ddf)), df))
+        chi -= delta
+        if abs(delta) < 1e-12 * max(1, abs(chi)):
+            break
+
+    # Lagrange coefficients
+    z = alpha * chi**2
+    cz, sz = stumpff(z)
+    f = 1 - chi**2 / r0 * cz
+    g = dt - chi**3 / math.sqrt(u) * sz
+    pos = np.array((f * rel_pos[0] + g * rel_vel[0], f * rel_pos[1] + g * rel_vel[1]))
+    r = math.sqrt(pos[0]**2 + pos[1]**2)
+    df = math.sqrt(u) / (r * r0) * (z * sz - 1) * chi
+    dg = 1 - chi**2 / r * cz
+    vel = np.array((df * rel_pos[0] + dg * rel_vel[0], df * rel_pos[1] + dg * rel_vel[1]))
+    return pos, vel
+
+
+def lambert_time(z, r1, r2, k_a, sqrt_u):
+    """Calculate transfer time and y for universal variable z, time is -1 if y is negative (z too small)"""
+    cz, sz = stumpff(z)
+    y = r1 + r2 + k_a * (z * sz - 1) / math.sqrt(cz)
+    if y < 0:
+        return -1.0, y
+    return ((y / cz)**1.5 * sz + k_a * math.sqrt(y)) / sqrt_u, y
+
+
+def lambert(r1x, r1y, r2x, r2y, tof, u, direction):
+    """
+    Solve Lambert problem in 2D with universal variables: find velocities at start and end of transfer from r1 to r2 in time tof.
+    Only single revolution transfer in direction (1 - counter-clockwise, -1 - clockwise) is searched.
+    Root is found with Newton method, safeguarded with bisection. Returns nan velocities if there is no solution.
+    """
+    r1 = math.sqrt(r1x**2 + r1y**2)
+    r2 = math.sqrt(r2x**2 + r2y**2)
+    cos_dta = min(max((r1x * r2x + r1y * r2y) / (r1 * r2), -1.0), 1.0)
+    dta = math.acos(cos_dta)
+    if (r1x * r2y - r1y * r2x) * direction < 0:
+        dta = 2 * np.pi - dta
+    k_a = math.sin(dta) * math.sqrt(r1 * r2 / (1 - cos_dta)) if cos_dta < 1 else 0.0   # constant A of transfer geometry
+    if abs(k_a) < 1e-12 * (r1 + r2) or tof <= 0:   # transfer angle is 0 or 180 degrees, plane is not defined
+        return np.nan, np.nan, np.nan, np.nan
+    sqrt_u = math.sqrt(u)
+
+    # bracket root, time is increasing with z, and it is infinite at 4 pi^2
+    z_hi = 4 * np.pi**2 - 1e-9
+    z_lo = -4 * np.pi**2
+    for _ in range(12):
+        if lambert_time(z_lo, r1, r2, k_a, sqrt_u)[0] < tof:
+            break
+        z_lo *= 2
+    else:
+        return np.nan, np.nan, np.nan, np.nan
+
+    z = 0.0
+    y = r1 + r2 - k_a * math.sqrt(2)
+    for _ in range(100):
+        t, y = lambert_time(z, r1, r2, k_a, sqrt_u)
+        if t < tof:
+            z_lo = z
+        else:
+            z_hi = z
+        if abs(t - tof) < 1e-12 * tof or z_hi - z_lo < 1e-14 * max(1.0, abs(z)):
+            break
+        # derivative of time by z
+        if t < 0:
+            dt = 0.0
+        elif abs(z) < 1e-3:
+            dt = (math.sqrt(2) / 40 * y**1.5 + k_a / 8 * (math.sqrt(y) + k_a * math.sqrt(1 / (2 * y)))) / sqrt_u
+        else:
+            cz, sz = stumpff(z)
+            dt = ((y / cz)**1.5 * (1 / (2 * z) * (cz - 1.5 * sz / cz) + 0.75 * sz**2 / cz) +
+                  k_a / 8 * (3 * sz / cz * math.sqrt(y) + k_a * math.sqrt(cz / y))) / sqrt_u
+        z_new = z - (t - tof) / dt if dt > 0 else z_lo
+        if not z_lo < z_new < z_hi:   # newton step left bracket
+            z_new = (z_lo + z_hi) / 2
+        z = z_new
+    if y < 0:
+        return np.nan, np.nan, np.nan, np.nan
+
+    # Lagrange coefficients
+    f = 1 - y / r1
+    g = k_a * math.sqrt(y / u)
+    dg = 1 - y / r2
+    return (r2x - f * r1x) / g, (r2y - f * r1y) / g, (dg * r2x - r1x) / g, (dg * r2y - r1y) / g
+
+
+def transfer(vessel_data, target_data, coeffs, u, departure, tof):
+    """
+    Calculate transfer from vessel to target orbiting same reference, departing after time departure and flying for time tof.
+    Transfer is in same direction as vessel orbit. Returns vessel position, transfer velocity at departure, and delta-v at departure and arrival.
+    """
+    a, b, f, ecc, ma, ea, pea, n, dr = vessel_data
+    t_a, _, _, t_ecc, _, t_ea, t_pea, _, t_dr, _, _, _ = target_data
+    r1x, r1y, _, _ = position_at(a, b, f, ecc, ma, pea, n, dr, departure, ea)
+    r1 = np.array((r1x, r1y))
+    v_vessel = kepler_to_velocity(r1, a, ecc, pea, u, dr)
+    r2x, r2y, _, _ = body_position_at(target_data, coeffs, departure + tof, t_ea)
+    v_target = kepler_to_velocity(np.array((r2x, r2y)), t_a, t_ecc, t_pea, u, t_dr)
+    direction = 1.0 if r1x * v_vessel[1] - r1y * v_vessel[0] >= 0 else -1.0
+    v1x, v1y, v2x, v2y = lambert(r1x, r1y, r2x, r2y, tof, u, direction)
+    dv_dep = math.sqrt((v1x - v_vessel[0])**2 + (v1y - v_vessel[1])**2)
+    dv_arr = math.sqrt((v_target[0] - v2x)**2 + (v_target[1] - v2y)**2)
+    return r1x, r1y, v1x, v1y, dv_dep, dv_arr
+
+
+def porkchop(vessel_data, target_data, coeffs, u, departures, tofs):
+    """Calculate delta-v at departure and arrival of transfers, for all combinations of departure and flight times"""
+    dv_dep = np.empty((len(departures), len(tofs)))
+    dv_arr = np.empty((len(departures), len(tofs)))
+    for i in range(len(departures)):
+        for j in range(len(tofs)):
+            _, _, _, _, dv_dep[i, j], dv_arr[i, j] = transfer(vessel_data, target_data, coeffs, u, departures[i], tofs[j])
+    return dv_dep, dv_arr
+
+
+def transfer_arc(r1x, r1y, v1x, v1y, u, tof, points):
+    """Get points on transfer orbit, relative to reference, from departure to arrival, each point is propagated from previous one"""
+    arc = np.empty((points, 2))
+    rel_pos = np.array((r1x, r1y))
+    rel_vel = np.array((v1x, v1y))
+    arc[0] = rel_pos
+    for point in range(1, points):
+        rel_pos, rel_vel = propagate_universal(rel_pos, rel_vel, u, tof / (points - 1))
+        arc[point] = rel_pos
+    return arc
+
+
+def plan(vessel_data, target_data, coeffs, u, vessel_period, target_period):
+    """
+    Find transfer with lowest total delta-v from porkchop grid over one synodic period of departures.
+    Returns dict with grid axes, delta-v grids, indices of best transfer, and its departure state.
+    """
+    if vessel_period != target_period:
+        synodic = 1 / abs(1 / vessel_period - 1 / target_period)
+    else:
+        synodic = np.inf
+    longer = max(vessel_period, target_period)
+    window = min(max(synodic, longer), longer * window_max)
+    hohmann = np.pi * math.sqrt(((abs(vessel_data[0]) + abs(target_data[0])) / 2)**3 / u)
+    departures_num = int(min(max(grid_size, window / min(vessel_period, target_period) * departures_per_period), departures_max))
+    departures = np.linspace(0, window, departures_num, endpoint=False)
+    tofs = np.linspace(tof_range[0] * hohmann, tof_range[1] * hohmann, grid_size)
+    dv_dep, dv_arr = porkchop(vessel_data, target_data, coeffs, u, departures, tofs)
+    dv = dv_dep + dv_arr
+    if np.all(np.isnan(dv)):
+        return None
+    best_dep, best_tof = np.unravel_index(np.nanargmin(dv), dv.shape)
+    r1x, r1y, v1x, v1y, _, _ = transfer(vessel_data, target_data, coeffs, u, departures[best_dep], tofs[best_tof])
+    return {
+        "departures": departures,
+        "tofs": tofs,
+        "dv": dv,
+        "best": (best_dep, best_tof),
+        "departure": departures[best_dep],
+        "tof": tofs[best_tof],
+        "dv_dep": dv_dep[best_dep, best_tof],
+        "dv_arr": dv_arr[best_dep, best_tof],
+        "state": (r1x, r1y, v1x, v1y),
+    }
+
+
+# if numba is enabled, compile functions ahead of time
+use_numba = peripherals.load_settings("game", "numba")
+if numba_avail and use_numba:
+    jitkw = {"cache": True, "fastmath": False}   # fastmath is disabled because transfers without solution are nan
+    stumpff = njit(UniTuple(float64, 2)(float64), **jitkw)(stumpff)
+    propagate_universal = njit(Tuple((float64[:], float64[:]))(float64[:], float64[:], float64, float64), **jitkw)(propagate_universal)
+    lambert_time = njit(UniTuple(float64, 2)(float64, float64, float64, float64, float64), **jitkw)(lambert_time)
+    lambert = njit(UniTuple(float64, 4)(float64, float64, float64, float64, float64, float64, float64), **jitkw)(lambert)
+    transfer = njit(UniTuple(float64, 6)(UniTuple(float64, 9), UniTuple(float64, 12), float64[:, :, :], float64, float64, float64), **jitkw)(transfer)
+    porkchop = njit(Tuple((float64[:, :], float64[:, :]))(UniTuple(float64, 9), UniTuple(float64, 12), float64[:, :, :], float64, float64[:], float64[:]), **jitkw)(porkchop)
+    transfer_arc = njit(float64[:, :](float64, float64, float64, float64, float64, float64, int64), **jitkw)(transfer_arc)
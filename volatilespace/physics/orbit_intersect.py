@@ -3,55 +3,106 @@ import math
 import numpy as np
 
 try:
-    from numba import float64, int32, njit
-    from numba.types import UniTuple
+    from numba import float64, int32, int64, njit
+    from numba.types import Tuple, UniTuple
     numba_avail = True
 except ImportError:
     numba_avail = False
 from volatilespace import peripherals
 from volatilespace.physics.enhanced_kepler_solver import solve_kepler_ell
+from volatilespace.physics.ephemeris import table_at
 from volatilespace.physics.phys_shared import newton_root_kepler_hyp
-from volatilespace.physics.quartic_solver import solve_quartic
+from volatilespace.physics.quartic_solver import solve_quartic_batch
 
+imag_tol = 1e-9   # quartic roots with imaginary part smaller than this (relative to real part) are real
 
-def ell_hyp_intersect_circle(a, b, ecc, c_x, c_y, r):
+
+def circle_quartic(a, b, ecc, c_x, c_y, r):
     """
-    Calculate eccentric anomalies of intersecting points
+    Calculate coefficients of quartic equation for intersecting points
     on non-rotated ellipse/hyperbola in origin, and translated circle
     """
-    # quartic equation coefficients
     if ecc < 1:    # ellipse
         a_0 = a**2 - 2*a*c_x + c_x**2 + c_y**2 - r**2
         a_1 = -4*b*c_y
         a_2 = -2*a**2 + 4*b**2 + 2*c_x**2 + 2*c_y**2 - 2*r**2
         a_3 = -4*b*c_y
         a_4 = a**2 + 2*a*c_x + c_x**2 + c_y**2 - r**2
-        # quartic equation roots
-        roots = solve_quartic(a_4, a_3, a_2, a_1, a_0)
-        # take only non-complex roots
-        real_roots = np.array([x.real for x in roots if not x.imag])
-        if np.any(real_roots):
-            ea = np.arctan2(2 * real_roots, 1.0 - real_roots**2)
-            return ea % (2*np.pi)
-        return np.array([np.nan])
+        return a_4, a_3, a_2, a_1, a_0
     # hyperbola
     a_0 = -a**2 * (c_y**2 + b**2) + b**2 * (c_x + r)**2
     a_1 = -4 * a**2 * r * c_y
     a_2 = -2 * (a**2 * (c_y**2 + b**2 + 2*r**2) + b**2 * (r**2 - c_x**2))
     a_3 = -4 * a**2 * r * c_y
     a_4 = -a**2 * (c_y**2 + b**2) + b**2 * (c_x - r)**2
-    roots = solve_quartic(a_4, a_3, a_2, a_1, a_0)
-    real_roots = np.array([x.real for x in roots if not x.imag])
+    return a_4, a_3, a_2, a_1, a_0
+
+
+def root_to_ea(a, ecc, c_x, c_y, r, root):
+    """Calculate eccentric anomaly of intersecting point from real root of circle_quartic()"""
+    if ecc < 1:    # ellipse
+        return np.arctan2(2 * root, 1.0 - root**2) % (2*np.pi)
+    # hyperbola
+    x = c_x + r * (1-root**2) / (1 + root**2)   # point coordinates
+    y = c_y + r * 2 * root / (1 + root**2)
+    ta = np.arctan2(y, x - (a * ecc))   # ta from coordinates
+    ea = np.arccosh((ecc + np.cos(ta))/(1 + (ecc * np.cos(ta))))   # ea from ta
+    # ea is in (-pi, pi) range because curve calculations get messed up if it is not
+    if root < 0:
+        return -ea
+    return ea
+
+
+def ell_hyp_intersect_circle(a, b, ecc, c_x, c_y, r):
+    """
+    Calculate eccentric anomalies of intersecting points
+    on non-rotated ellipse/hyperbola in origin, and translated circle
+    """
+    coefficients = np.empty((1, 5))
+    coefficients[0] = circle_quartic(a, b, ecc, c_x, c_y, r)
+    roots, real = solve_quartic_batch(coefficients, imag_tol)
+    # take only non-complex roots
+    real_roots = roots[0][real[0]]
     if np.any(real_roots):
-        x = c_x + r * (1-real_roots**2) / (1 + real_roots**2)   # point coordinates
-        y = c_y + r * 2 * real_roots / (1 + real_roots**2)
-        ta = np.arctan2(y, x - (a * ecc))   # ta from coordinates
-        ea = np.arccosh((ecc + np.cos(ta))/(1 + (ecc * np.cos(ta))))   # ea from ta
-        # ea is in (-pi, pi) range because curve calculations get messed up if it is not
-        return np.where(real_roots < 0, -ea, ea)
+        ea = np.empty(len(real_roots))
+        for num, root in enumerate(real_roots):
+            ea[num] = root_to_ea(a, ecc, c_x, c_y, r, root)
+        return ea
     return np.array([np.nan])
 
 
+def intersect_circles(a, b, ecc, c_x, c_y, radii):
+    """
+    Calculate eccentric anomalies of intersecting points for multiple
+    non-rotated ellipses/hyperbolas in origin, each with multiple translated circles.
+    Circles with nan radius are skipped. Returns points with shape (conic, circle, 4) padded with nan, and number of points.
+    """
+    ea_points = np.full((radii.shape[0], radii.shape[1], 4), np.nan)
+    points_num = np.zeros(radii.shape, dtype=np.int64)
+    # all quartic equations are solved at once
+    coefficients = np.zeros((radii.size, 5))
+    coefficients[:, 0] = 1   # skipped circles still get valid equation
+    for conic in range(radii.shape[0]):
+        for circle in range(radii.shape[1]):
+            if not np.isnan(radii[conic, circle]):
+                coefficients[conic * radii.shape[1] + circle] = circle_quartic(
+                    a[conic], b[conic], ecc[conic], c_x[conic], c_y[conic], radii[conic, circle])
+    roots, real = solve_quartic_batch(coefficients, imag_tol)
+    for conic in range(radii.shape[0]):
+        for circle in range(radii.shape[1]):
+            r = radii[conic, circle]
+            if not np.isnan(r):
+                num = conic * radii.shape[1] + circle
+                real_roots = roots[num][real[num]]
+                if np.any(real_roots):
+                    for point, root in enumerate(real_roots):
+                        ea_points[conic, circle, point] = root_to_ea(a[conic], ecc[conic], c_x[conic], c_y[conic], r, root)
+                    points_num[conic, circle] = len(real_roots)
+                else:   # same as ell_hyp_intersect_circle() when there is no intersection
+                    points_num[conic, circle] = 1
+    return ea_points, points_num
+
+
 def next_point(ea_vessel, ea_points, direction):
     """Find next and previous point on orbit in ea_points, from ea_vessel, in orbit direction."""
     if not np.any(np.isnan(ea_points)):
@@ -65,6 +116,16 @@ def next_point(ea_vessel, ea_points, direction):
     return np.array([np.nan, np.nan])
 
 
+def next_points(ea_vessel, ea_points, points_num, direction):
+    """Find next and previous point for multiple orbits and point sets, from intersect_circles(). Returns shape (orbit, set, 2)."""
+    points = np.full((ea_points.shape[0], ea_points.shape[1], 2), np.nan)
+    for orbit in range(ea_points.shape[0]):
+        for num in range(ea_points.shape[1]):
+            if points_num[orbit, num]:
+                points[orbit, num] = next_point(ea_vessel[orbit, num], ea_points[orbit, num, :points_num[orbit, num]], direction[orbit])
+    return points
+
+
 def sort_intersect_indices(ea_vessel, ea_points, direction):
     """Sort points on orbit by their angular (ea) distance from vessel in specified direction"""
     if not np.all(np.isnan(ea_points)):
@@ -106,72 +167,177 @@ def orb2xy(a, b, f, ecc, pea, ea):
     return (x, y)
 
 
-def move(ma, ecc, dr, n, prev_ea, dt):
-    """Move vessel or body"""
+def position_at(a, b, f, ecc, ma, pea, n, dr, t, ea_guess):
+    """Calculate relative position, ea and ma after time t, ea_guess is used only for hyperbola"""
     if ecc < 1:
-        ma += dr * n * dt
-        if ma > 2*np.pi:
-            ma - 2*np.pi
-        elif ma < 0:
-            ma + 2*np.pi
-        ea = solve_kepler_ell(ecc, ma, 1e-10)
+        ma_t = (ma + dr * n * t) % (2*np.pi)
+        ea = solve_kepler_ell(ecc, ma_t, 1e-10)
     else:
-        ma += dr * n * -1 * dt
-        ea = newton_root_kepler_hyp(ecc, ma, prev_ea)
-        prev_ea = ea
-    return ma, ea, prev_ea
-
-
-def predict_enter_coi(vessel_data, body_data, tol, steps_limit):
-    """Search for first enter COI point for given vessel and body, which are orbiting same reference"""
-    a, b, f, ecc, ma, ea, pea, period, n, dr = vessel_data
-    b_a, b_b, b_f, b_ecc, b_ma, b_ea, b_pea, b_n, b_dr, b_coi = body_data
-    prev_ea = ea
-    b_prev_ea = b_ea
-
-    if not period or not b_coi:
-        return np.nan, np.nan, np.nan, np.nan, np.nan
-
-    t = 0
-    # fit planet COI radius in vessel orbit * 5 to compensate for eccentricity and make it easier to refine
-    steps = int(max(min(period / b_coi * 5, period / 2), period / 30))
-    steps = max(steps, steps_limit)
-    dt = period / steps   # larger the period - larger the step
-    t_end = period   # only one full orbit
-    while t < t_end:
-
-        # move vessel and body
-        ma, ea, prev_ea = move(ma, ecc, dr, n, prev_ea, dt)
-        b_ma, b_ea, b_prev_ea = move(b_ma, b_ecc, b_dr, b_n, b_prev_ea, dt)
-
-        # calculate positions
-        rvx, rvy = orb2xy(a, b, f, ecc, pea, ea)
-        rbx, rby = orb2xy(b_a, b_b, b_f, b_ecc, b_pea, b_ea)
-        d = norm2d(rvx - rbx, rvy - rby)
-
-        # refine results
-        if d < b_coi:
-            for _ in range(30):
-                # go in the direction of intersection
-                dt = abs(dt) / 2 * (-1 if d < b_coi else 1)
-                t += dt
-
-                # move vessel and body back
-                ma, ea, prev_ea = move(ma, ecc, dr, n, prev_ea, dt)
-                b_ma, b_ea, b_prev_ea = move(b_ma, b_ecc, b_dr, b_n, b_prev_ea, dt)
-
-                # calculate positions
-                rvx, rvy = orb2xy(a, b, f, ecc, pea, ea)
-                rbx, rby = orb2xy(b_a, b_b, b_f, b_ecc, b_pea, b_ea)
-                d = norm2d(rvx - rbx, rvy - rby)
-
-                # check if result is acceptable
-                if abs(d - b_coi) < tol:
-                    return wrap_angle(ea), wrap_angle(b_ea), wrap_angle(ma), wrap_angle(b_ma), t
-            return wrap_angle(ea), wrap_angle(b_ea), wrap_angle(ma), wrap_angle(b_ma), t
-
-        t += dt
-    return np.nan, np.nan, np.nan, np.nan, np.nan
+        ma_t = ma + dr * n * -1 * t
+        ea = newton_root_kepler_hyp(ecc, ma_t, ea_guess)
+    x, y = orb2xy(a, b, f, ecc, pea, ea)
+    return x, y, ea, ma_t
+
+
+def speed_max(a, ecc, n):
+    """Maximal orbital speed, which is at periapsis"""
+    return n * abs(a) * math.sqrt((1 + ecc) / max(abs(1 - ecc), 1e-10))
+
+
+def body_position_at(body_data, coeffs, t, ea_guess):
+    """Calculate relative position, ea and ma of body after time t, from ephemeris table if body has it"""
+    b_a, b_b, b_f, b_ecc, b_ma, _, b_pea, b_n, b_dr, _, start, segments = body_data
+    if segments:
+        ma_t = (b_ma + b_dr * b_n * t) % (2*np.pi)
+        x, y, ea = table_at(coeffs, int(start), int(segments), ma_t)
+        return x, y, ea, ma_t
+    return position_at(b_a, b_b, b_f, b_ecc, b_ma, b_pea, b_n, b_dr, t, ea_guess)
+
+
+def distance_at(vessel_data, body_data, coeffs, t, ea_guess, b_ea_guess):
+    """Calculate distance between vessel and body after time t, and their ea and ma at that time"""
+    a, b, f, ecc, ma, _, pea, n, dr = vessel_data
+    rvx, rvy, ea, ma_t = position_at(a, b, f, ecc, ma, pea, n, dr, t, ea_guess)
+    rbx, rby, b_ea, b_ma_t = body_position_at(body_data, coeffs, t, b_ea_guess)
+    return norm2d(rvx - rbx, rvy - rby), ea, b_ea, ma_t, b_ma_t
+
+
+def refine_enter_coi(vessel_data, body_data, coeffs, t_out, t_in, d_out, d_in, ea_guess, b_ea_guess, tol):
+    """
+    Find time when distance between vessel and body is equal to body COI radius, with Brent's method.
+    Distance at t_out must be larger, and at t_in smaller than COI radius.
+    """
+    b_coi = body_data[9]
+    t_a, t_b = t_out, t_in
+    g_a, g_b = d_out - b_coi, d_in - b_coi
+    t_c, g_c = t_a, g_a
+    step = t_b - t_a
+    prev_step = step
+    ea, b_ea, ma, b_ma = ea_guess, b_ea_guess, 0.0, 0.0
+    for _ in range(50):
+        if (g_b > 0) == (g_c > 0):
+            t_c, g_c = t_a, g_a
+            step = prev_step = t_b - t_a
+        if abs(g_c) < abs(g_b):   # b is always best guess
+            t_a, t_b, t_c = t_b, t_c, t_b
+            g_a, g_b, g_c = g_b, g_c, g_b
+        tol_t = 4e-16 * abs(t_b) + 1e-12
+        half = (t_c - t_b) / 2
+        if abs(half) <= tol_t:
+            break
+        if abs(prev_step) >= tol_t and abs(g_a) > abs(g_b):
+            # inverse quadratic interpolation, or secant if only two points are distinct
+            s = g_b / g_a
+            if t_a == t_c:
+                p = 2 * half * s
+                q = 1 - s
+            else:
+                q = g_a / g_c
+                r = g_b / g_c
+                p = s * (2 * half * q * (q - r) - (t_b - t_a) * (r - 1))
+                q = (q - 1) * (r - 1) * (s - 1)
+            if p > 0:
+                q = -q
+            else:
+                p = -p
+            if 2 * p < min(3 * half * q - abs(tol_t * q), abs(prev_step * q)):
+                prev_step = step
+                step = p / q
+            else:   # interpolation is not good enough, use bisection
+                step = prev_step = half
+        else:
+            step = prev_step = half
+        t_a, g_a = t_b, g_b
+        if abs(step) > tol_t:
+            t_b += step
+        else:
+            t_b += tol_t if half > 0 else -tol_t
+        d, ea, b_ea, ma, b_ma = distance_at(vessel_data, body_data, coeffs, t_b, ea, b_ea)
+        g_b = d - b_coi
+        if abs(g_b) < tol:
+            break
+    d, ea, b_ea, ma, b_ma = distance_at(vessel_data, body_data, coeffs, t_b, ea, b_ea)
+    return wrap_angle(ea), wrap_angle(b_ea), wrap_angle(ma), wrap_angle(b_ma), t_b
+
+
+def body_row(bodies_data, body):
+    """Get data of one body from array of bodies data, as tuple"""
+    return (
+        bodies_data[body, 0], bodies_data[body, 1], bodies_data[body, 2], bodies_data[body, 3],
+        bodies_data[body, 4], bodies_data[body, 5], bodies_data[body, 6], bodies_data[body, 7],
+        bodies_data[body, 8], bodies_data[body, 9], bodies_data[body, 10], bodies_data[body, 11],
+    )
+
+
+def predict_enter_coi(vessel_data, bodies_data, coeffs, periods, tol, steps_limit):
+    """
+    Search for first enter COI point for given vessel and all given bodies, which are orbiting same reference.
+    Body data ends with first segment and number of segments in ephemeris table, bodies without segments are solved directly.
+    All bodies are searched in single time loop, so vessel is propagated once per step.
+    Step is smallest of conservative steps of all searched bodies: time in which distance between vessel and body
+    can not drop below COI radius, because it can change at most by sum of their maximal speeds, so grazing encounters are not skipped.
+    Then each enter point is refined with Brent's method. Search for each body is limited to time in periods.
+    Returns array with (ea, b_ea, ma, b_ma, t) row for each body, rows are nan where vessel does not enter COI.
+    """
+    a, b, f, ecc, ma, ea, pea, n, dr = vessel_data
+    num = bodies_data.shape[0]
+    enter_data = np.full((num, 5), np.nan)
+    active = np.zeros(num, dtype=np.bool_)
+    speed = np.zeros(num)
+    dt_min = np.zeros(num)
+    dist = np.zeros(num)
+    b_ea = np.zeros(num)
+
+    # body COI must be reachable by vessel radius
+    if ecc < 1:
+        r_max = a * (1 + ecc)
+    else:
+        r_max = np.inf
+    r_min = abs(a) * abs(1 - ecc)
+    v_speed = speed_max(a, ecc, n)
+    rvx, rvy, ea, _ = position_at(a, b, f, ecc, ma, pea, n, dr, 0.0, ea)
+    for body in range(num):
+        b_a, _, _, b_ecc, _, _, _, b_n, _, b_coi, _, _ = body_row(bodies_data, body)
+        if not (periods[body] > 0 and b_coi > 0):
+            continue
+        if b_ecc < 1 and (r_max < b_a * (1 - b_ecc) - b_coi or r_min > b_a * (1 + b_ecc) + b_coi):
+            continue
+        speed[body] = v_speed + speed_max(b_a, b_ecc, b_n)
+        # smallest step, encounters that are less deep than this fraction of COI radius may be skipped
+        dt_min[body] = max(b_coi * 1e-3 / speed[body], periods[body] / (steps_limit * 1000))
+        rbx, rby, b_ea[body], _ = body_position_at(body_row(bodies_data, body), coeffs, 0.0, bodies_data[body, 5])
+        dist[body] = norm2d(rvx - rbx, rvy - rby)
+        active[body] = dist[body] >= b_coi   # skip if already inside
+
+    t = 0.0
+    while True:
+        # next step is limited by all searched bodies, and by nearest end of search
+        t_next = -1.0
+        for body in range(num):
+            if active[body]:
+                t_body = min(t + max((dist[body] - bodies_data[body, 9]) / speed[body], dt_min[body]), periods[body])
+                if t_next < 0 or t_body < t_next:
+                    t_next = t_body
+        if t_next < 0:   # all bodies are searched
+            break
+        rvx, rvy, ea, _ = position_at(a, b, f, ecc, ma, pea, n, dr, t_next, ea)
+        for body in range(num):
+            if not active[body]:
+                continue
+            body_data = body_row(bodies_data, body)
+            rbx, rby, b_ea_next, _ = body_position_at(body_data, coeffs, t_next, b_ea[body])
+            d_next = norm2d(rvx - rbx, rvy - rby)
+            if d_next < body_data[9]:
+                enter = refine_enter_coi(vessel_data, body_data, coeffs, t, t_next, dist[body], d_next, ea, b_ea_next, tol)
+                for i in range(5):
+                    enter_data[body, i] = enter[i]
+                active[body] = False
+            elif t_next >= periods[body]:
+                active[body] = False
+            dist[body] = d_next
+            b_ea[body] = b_ea_next
+        t = t_next
+    return enter_data
 
 
 # if numba is enabled, compile functions ahead of time
@@ -181,10 +347,24 @@ if numba_avail and use_numba:
     jitkw = {"cache": True, "fastmath": enable_fastmath}   # numba JIT setings
     # disabling fastmath for some functions with np.isnan()
     jitkw_nofast = {"cache": True, "fastmath": False}
+    circle_quartic = njit(UniTuple(float64, 5)(float64, float64, float64, float64, float64, float64), **jitkw)(circle_quartic)
+    root_to_ea = njit(float64(float64, float64, float64, float64, float64, float64), **jitkw)(root_to_ea)
     ell_hyp_intersect_circle = njit(float64[:](float64, float64, float64, float64, float64, float64), **jitkw)(ell_hyp_intersect_circle)
     next_point = njit(float64[:](float64, float64[:], float64), **jitkw_nofast)(next_point)
+    intersect_circles = njit(
+        Tuple((float64[:, :, :], int64[:, :]))(float64[:], float64[:], float64[:], float64[:], float64[:], float64[:, :]),
+        **jitkw,
+    )(intersect_circles)
+    next_points = njit(float64[:, :, :](float64[:, :], float64[:, :, :], int64[:, :], float64[:]), **jitkw_nofast)(next_points)
     norm2d = njit(float64(float64, float64), **jitkw)(norm2d)
     wrap_angle = njit(float64(float64), **jitkw)(wrap_angle)
     orb2xy = njit(UniTuple(float64, 2)(float64, float64, float64, float64, float64, float64), **jitkw)(orb2xy)
-    move = njit(UniTuple(float64, 3)(float64, float64, float64, float64, float64, float64), **jitkw)(move)
-    predict_enter_coi = njit(UniTuple(float64, 5)(UniTuple(float64, 10), UniTuple(float64, 10), float64, int32), **jitkw)(predict_enter_coi)
+    position_at = njit(UniTuple(float64, 4)(float64, float64, float64, float64, float64, float64, float64, float64, float64, float64), **jitkw)(position_at)
+    speed_max = njit(float64(float64, float64, float64), **jitkw)(speed_max)
+    body_position_at = njit(UniTuple(float64, 4)(UniTuple(float64, 12), float64[:, :, :], float64, float64), **jitkw)(body_position_at)
+    distance_at = njit(UniTuple(float64, 5)(UniTuple(float64, 9), UniTuple(float64, 12), float64[:, :, :], float64, float64, float64), **jitkw)(distance_at)
+    refine_enter_coi = njit(UniTuple(float64, 5)(
+        UniTuple(float64, 9), UniTuple(float64, 12), float64[:, :, :], float64, float64, float64, float64, float64, float64, float64,
+    ), **jitkw)(refine_enter_coi)
+    body_row = njit(UniTuple(float64, 12)(float64[:, :], int64), **jitkw)(body_row)
+    predict_enter_coi = njit(float64[:, :](UniTuple(float64, 9), float64[:, :], float64[:, :, :], float64[:], float64, int32), **jitkw)(predict_enter_coi)
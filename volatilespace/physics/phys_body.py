@@ -7,8 +7,10 @@ import pygame
 
 from volatilespace import defaults, peripherals
 from volatilespace.physics.enhanced_kepler_solver import solve_kepler_ell
+from volatilespace.physics.ephemeris import empty_table, load_tables, tables_at
 from volatilespace.physics.phys_shared import (
     c,
+    compose_positions,
     culling,
     curve_move_to,
     curve_points,
@@ -147,9 +149,14 @@ class Physics():
         self.n = np.array([])
         self.coi = np.array([])
         self.curves = np.array([])
+        self.curve_size = np.array([])
         self.pos = np.array([])
+        self.rel_pos = np.array([])
+        self.anchor = 0   # positions are relative to this body, it is moved with floating origin
         self.ea = np.array([])
         self.u = np.array([])
+        self.ephemeris = empty_table   # chebyshev tables of body positions: coefficients, and segment range of each body
+        self.path = None   # save file, ephemeris tables are cached next to it
         self.gc = defaults.sim_config["gc"]
         self.rad_mult = defaults.sim_config["rad_mult"]
         self.mass_thermal_mult = defaults.sim_config["mass_thermal_mult"]
@@ -161,7 +168,9 @@ class Physics():
         """Reload all settings, should be run every time game is entered"""
         self.screen_x, self.screen_y = pygame.display.get_surface().get_size()
         self.curve_points = int(peripherals.load_settings("graphics", "curve_points"))   # number of points from which curve is drawn
+        self.use_ephemeris = peripherals.load_settings("game", "ephemeris")
         self.curves = np.zeros((len(self.mass), self.curve_points, 2))
+        self.curve_size = np.zeros(len(self.mass))
         self.t = np.linspace(-np.pi, np.pi, self.curve_points)   # parameter
         for body, _ in enumerate(self.names):
             self.curve(body)
@@ -175,9 +184,10 @@ class Physics():
         self.coi_coef = conf["coi_coef"]
         self.min_mass = conf["min_planet_mass"]
 
-    def load(self, conf, body_data, body_orb_data):
-        """Load new system"""
+    def load(self, conf, body_data, body_orb_data, path=None):
+        """Load new system, optionally from save file path, so ephemeris tables can be cached next to it"""
         self.load_conf(conf)
+        self.path = path
         self.names = body_data["name"]
         self.mass = body_data["mass"]
         self.den = body_data["den"]
@@ -192,9 +202,16 @@ class Physics():
         self.ma = body_orb_data["ma"]
         self.ref = body_orb_data["ref"]
         self.dr = body_orb_data["dir"]
+        # children of each body, so culling can descend reference hierarchy
+        order = np.argsort(self.ref, kind="stable")
+        self.children = np.split(order, np.searchsorted(self.ref[order], np.arange(1, len(self.mass))))
+        self.children[0] = self.children[0][self.children[0] != 0]
         self.pos = np.zeros([len(self.mass), 2])   # position will be updated later
+        self.rel_pos = np.zeros([len(self.mass), 2])   # position relative to parent
+        self.anchor = 0
         self.ea = np.zeros(len(self.mass))
         self.curves = np.zeros((len(self.mass), self.curve_points, 2))   # shape: (vessel, points, axes)
+        self.curve_size = np.zeros(len(self.mass))   # curve width + height, used when picking
         self.curves_mov = np.zeros((len(self.mass), self.curve_points, 2))
 
 
@@ -204,12 +221,20 @@ class Physics():
         - Bodies whose COI is visible on screen
         - Bodies that are visible on screen (atmosphere incl)
         - Bodies whose orbits are inside COI that is visible on screen and COI is larger than N pixels
+        Reference hierarchy is descended only into visible COIs, because bodies can not be outside their parent COI.
         """
-        atm_radius = (self.radius + self.atm_h) * zoom
-        visible_bodies_truth = culling(self.pos, atm_radius, sim_screen, zoom)
-        visible_bodies = np.arange(len(self.mass))[visible_bodies_truth]
-        visible_coi_truth = culling(self.pos, self.coi, sim_screen, zoom)
-        visible_coi = np.concatenate(([0], np.arange(len(self.mass))[visible_coi_truth]))
+        visible_coi_truth = np.zeros(len(self.mass), dtype=bool)
+        visible_coi_truth[0] = True   # main ref COI is infinite
+        parents = np.array([0])
+        while len(parents):
+            level = np.concatenate([self.children[body] for body in parents])
+            # COI is extended by vessel marker size, so vessels at its edge are not culled
+            visible_coi_truth[level] = culling(self.pos[level], self.coi[level] + 10 / zoom, sim_screen, zoom)
+            parents = level[visible_coi_truth[level]]
+        visible_coi = np.where(visible_coi_truth)[0]
+        reached = np.where(visible_coi_truth[self.ref])[0]   # bodies inside visible COI
+        atm_radius = (self.radius[reached] + self.atm_h[reached]) * zoom
+        visible_bodies = reached[culling(self.pos[reached], atm_radius, sim_screen, zoom)]
         visible_orbits_truth = np.logical_and(visible_coi_truth[self.ref], self.coi[self.ref] > 8 / zoom)
         visible_orbits_truth = np.logical_or(visible_orbits_truth, self.ref == 0)   # incl all orbits around main ref
         visible_orbits_truth = np.logical_and(visible_orbits_truth, self.a * zoom < self.screen_x*15)
@@ -218,6 +243,17 @@ class Physics():
         return visible_bodies, visible_coi, visible_orbits
 
 
+    def pick(self, point, zoom):
+        """Get bodies under point, skipping bodies with too small orbits on screen"""
+        # small bodies have marker with fixed size on screen
+        distance = max(8 / zoom, np.max(self.radius, initial=0))
+        candidates = np.where(np.sum((self.pos - point)**2, axis=1) < distance**2)[0]
+        radius = np.where(self.radius[candidates] * zoom < 5, 8 / zoom, self.radius[candidates])
+        inside = np.sum((self.pos[candidates] - point)**2, axis=1) < radius**2
+        large = np.logical_or(candidates == 0, self.curve_size[candidates] * zoom > 32)
+        return candidates[np.logical_and(inside, large)]
+
+
     def initial(self, warp):
         """
         Do all body related physics.
@@ -287,6 +323,10 @@ class Physics():
         # orbit data
         values = list(map(calc_orb_one, list(range(len(self.mass))), self.ref, repeat(self.mass), repeat(self.gc), repeat(self.coi_coef), self.a, self.ecc))
         self.b, self.f, self.coi, self.pe_d, self.ap_d, self.period, self.n, self.u = list(map(np.array, zip(*values)))
+        if self.use_ephemeris:
+            self.ephemeris = load_tables(self.path, self.a, self.b, self.f, self.ecc, self.pea)
+        else:   # no body is tabulated
+            self.ephemeris = (empty_table[0], np.zeros((len(self.mass), 2), dtype=np.int64))
         body_orb = {
             "a": self.a,
             "b": self.b,
@@ -301,6 +341,8 @@ class Physics():
             "dir": self.dr,
             "per": self.period,
             "u": self.u,
+            "eph": self.ephemeris[0],
+            "eph_range": self.ephemeris[1],
         }
 
         # move
@@ -318,34 +360,50 @@ class Physics():
         This should be done only if something changed on body or it's orbit, and after points().
         """
         self.curves[body] = curve_points(self.ecc[body], self.a[body], self.b[body], self.pea[body], self.t)
+        self.curve_size[body] = np.sum(np.ptp(self.curves[body], axis=0))
 
 
     def move(self, warp):
-        """Move body with mean motion"""
+        """
+        Move body with mean motion, tabulated bodies are evaluated from ephemeris tables instead of solving kepler equation.
+        Positions are composed relative to anchor body, which is root, unless it is moved with floating origin.
+        """
         self.ma += self.dr * self.n * warp
         self.ma = np.where(self.ma > 2*np.pi, self.ma - 2*np.pi, self.ma)
         self.ma = np.where(self.ma < 0, self.ma + 2*np.pi, self.ma)
-        bodies_sorted = np.argsort(self.coi)[-1::-1]
-        for body in bodies_sorted:
+        rel_pos, ea = tables_at(*self.ephemeris, self.ma)
+        for body in np.nonzero(self.ephemeris[1][:, 1] == 0)[0]:
             pea = self.pea[body]
             ecc = self.ecc[body]
             a = self.a[body]
             b = self.b[body]
             if ecc < 1:
-                ea = solve_kepler_ell(ecc, self.ma[body], 1e-10)
-                pr_x = a * math.cos(ea) - self.f[body]
-                pr_y = b * math.sin(ea)
+                ea[body] = solve_kepler_ell(ecc, self.ma[body], 1e-10)
+                pr_x = a * math.cos(ea[body]) - self.f[body]
+                pr_y = b * math.sin(ea[body])
             else:
-                ea = newton_root_kepler_hyp(ecc, self.ma[body], self.ea[body])
-                pr_x = a * np.cosh(ea) - self.f[body]
-                pr_y = b * np.sinh(ea)
-            pr = np.array([pr_x * math.cos(pea - np.pi) - pr_y * math.sin(pea - np.pi),
-                           pr_x * math.sin(pea - np.pi) + pr_y * math.cos(pea - np.pi)])
-            self.pos[body] = self.pos[self.ref[body]] + pr
-            self.ea[body] = ea
+                ea[body] = newton_root_kepler_hyp(ecc, self.ma[body], self.ea[body])
+                pr_x = a * np.cosh(ea[body]) - self.f[body]
+                pr_y = b * np.sinh(ea[body])
+            rel_pos[body] = (pr_x * math.cos(pea - np.pi) - pr_y * math.sin(pea - np.pi),
+                             pr_x * math.sin(pea - np.pi) + pr_y * math.cos(pea - np.pi))
+        self.rel_pos = rel_pos
+        self.ea = ea
+        self.pos = compose_positions(self.rel_pos, self.ref, self.anchor, np.arange(len(self.ma)))
         return self.pos, self.ma, self.ea
 
 
+    def anchor_moved(self, rel_pos):
+        """Get movement of anchor body since positions relative to parents were rel_pos, summed along its parents, so it stays precise"""
+        return compose_positions(self.rel_pos - rel_pos, self.ref, 0, np.array([self.anchor]))[0]
+
+
+    def seek(self, ma):
+        """Set mean anomalies of all bodies and move them there, such as when replaying recording"""
+        self.ma = np.array(ma)
+        return self.move(0)
+
+
     def selected(self, body):
         """
         Do physics for selected body.
@@ -365,7 +423,7 @@ class Physics():
             dr = self.dr[body]
             n = self.n[body]
 
-            rel_pos = self.pos[body] - pos_ref
+            rel_pos = self.rel_pos[body]
             distance = mag(rel_pos)   # distance to parent
             speed_orb = math.sqrt(u * ((2 / distance) - (1 / a)))   # velocity vector magnitude from vis-viva eq
             if ecc < 1:
@@ -143,47 +143,6 @@ def rot_ellipse_by_y(x, a, b, p):
             + a2 * x * sin_p * cos_p - b2 * x * sin_p * cos_p) / (a2 * cos_p2 + b2 * sin_p2)
 
 
-def rot_hyperbola_by_y(x, a, b, p):
-    """Rotated hyperbola by y, only positive half"""
-    sin_p = math.sin(p)
-    cos_p = math.cos(p)
-    a2 = a**2
-    b2 = b**2
-    x2 = x**2
-    sin_p2 = sin_p**2
-    cos_p2 = cos_p**2
-    return -((a*b*math.sqrt(-x2 * (cos_p**4 + sin_p**4) + 2 * x2 * cos_p2 * sin_p2 + b2 * sin_p2 - a2 * cos_p2)
-              + a2 * x * sin_p * cos_p + b2 * x * sin_p * cos_p) / (-a2 * cos_p2 + b2 * sin_p2))
-
-
-def impl_derivative_rot_ell(p_x, p_y, a, b, p):
-    """Implicite derivative of rotated ellipse"""
-    sin_p = math.sin(p)
-    cos_p = math.cos(p)
-    a2 = a**2
-    b2 = b**2
-    sin_cos_p = sin_p * cos_p
-    sin_p2 = sin_p**2
-    cos_p2 = cos_p**2
-    return np.arctan(
-        - (b2 * p_x * cos_p2 + a2 * p_x * sin_p2 + b2 * p_y * sin_cos_p - a2 * p_y * sin_cos_p)
-        / (a2 * p_y * cos_p2 + b2 * p_y * sin_p2 + b2 * p_x * sin_cos_p - a2 * p_x * sin_cos_p))
-
-
-def impl_derivative_rot_hyp(p_x, p_y, a, b, p):
-    """Implicite derivative of rotated hyperbola"""
-    sin_p = math.sin(p)
-    cos_p = math.cos(p)
-    a2 = a**2
-    b2 = b**2
-    sin_cos_p = sin_p * cos_p
-    sin_p2 = sin_p**2
-    cos_p2 = cos_p**2
-    return np.arctan(
-        - (+ b2 * p_x * cos_p2 - a2 * p_x * sin_p2 + b2 * p_y * sin_cos_p + a2 * p_y * sin_cos_p)
-        / (- a2 * p_y * cos_p2 + b2 * p_y * sin_p2 + b2 * p_x * sin_cos_p + a2 * p_x * sin_cos_p))
-
-
 def orb2xy(a, b, f, ecc, pea, ref_pos, ea):
     """ Calculate relative x and y coordinates from orbital parameters"""
     if ea:
@@ -221,6 +180,38 @@ def curve_move_to(curves, body_pos, ref, f, pea):
     focus = np.column_stack((f * np.cos(pea), f * np.sin(pea)))
     return curves + focus[:, np.newaxis, :] + body_pos[ref, np.newaxis, :]
 
+
+def compose_positions(rel_pos, ref, anchor, bodies):
+    """
+    Compose positions of bodies relative to anchor body, from positions relative to their reference bodies.
+    Only path from body to first common parent with anchor is summed, so coordinates of distant branches never add up.
+    """
+    # chain of anchor parents, and anchor position relative to each of them
+    chain_index = np.full(len(ref), -1, dtype=np.int64)
+    chain_pos = np.zeros((len(ref), 2))
+    body = anchor
+    num = 0
+    while chain_index[body] == -1:
+        chain_index[body] = num
+        if body == ref[body]:   # root
+            break
+        chain_pos[num + 1] = chain_pos[num] + rel_pos[body]
+        body = ref[body]
+        num += 1
+    pos = np.empty((len(bodies), 2))
+    for num in range(len(bodies)):
+        body = bodies[num]
+        x = 0.0
+        y = 0.0
+        while chain_index[body] == -1:
+            x += rel_pos[body, 0]
+            y += rel_pos[body, 1]
+            body = ref[body]
+        pos[num, 0] = x - chain_pos[chain_index[body], 0]
+        pos[num, 1] = y - chain_pos[chain_index[body], 1]
+    return pos
+
+
 def culling(coords, radius, screen_bounds, zoom):
     """Decide wether provided objecs should be drawn on screen, depending on their position and radius"""
     # swapping y axis because (0, 0) is in top left
@@ -247,9 +238,7 @@ if numba_avail and use_numba:
     newton_root_kepler_ell = njit(float64(float64, float64, float64), **jitkw)(newton_root_kepler_ell)
     newton_root_kepler_hyp = njit(float64(float64, float64, float64), **jitkw)(newton_root_kepler_hyp)
     rot_ellipse_by_y = njit(float64(float64, float64, float64, float64), **jitkw)(rot_ellipse_by_y)
-    rot_hyperbola_by_y = njit(float64(float64, float64, float64, float64), **jitkw)(rot_hyperbola_by_y)
-    impl_derivative_rot_ell = njit(float64(float64, float64, float64, float64, float64), **jitkw)(impl_derivative_rot_ell)
-    impl_derivative_rot_hyp = njit(float64(float64, float64, float64, float64, float64), **jitkw)(impl_derivative_rot_hyp)
     curve_points = njit(float64[:, :](float64, float64, float64, float64, float64[:]), **jitkw)(curve_points)
     curve_move_to = njit(float64[:, :, :](float64[:, :, :], float64[:, :], int64[:], float64[:], float64[:]), **jitkw)(curve_move_to)
+    compose_positions = njit(float64[:, :](float64[:, :], int64[:], int64, int64[:]), **jitkw)(compose_positions)
     culling = njit(bool_[:](float64[:, :], float64[:], float64[:, :], float64), **jitkw)(culling)
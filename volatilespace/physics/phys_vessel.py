@@ -1,25 +1,36 @@
 import math
+import time
 from itertools import repeat
 
 import numpy as np
 import pygame
 
 try:   # to allow building without numba
-    from numba import float64, int32, njit
+    from numba import bool_, float64, int64, njit
     from numba.types import UniTuple
     numba_avail = True
 except ImportError:
     numba_avail = False
 
 from volatilespace import defaults, peripherals
+from volatilespace.physics import maneuver
 from volatilespace.physics.convert import kepler_to_velocity, velocity_to_kepler
-from volatilespace.physics.enhanced_kepler_solver import solve_kepler_ell
+from volatilespace.physics.enhanced_kepler_solver import (
+    kepler_table,
+    kepler_table_error,
+    solve_kepler_ell,
+    solve_kepler_ell_batch,
+    solve_kepler_table_batch,
+)
 from volatilespace.physics.orbit_intersect import (
     ell_hyp_intersect_circle,
+    intersect_circles,
     next_point,
+    next_points,
     predict_enter_coi,
     sort_intersect_indices,
 )
+from volatilespace.physics.orbit_intersect import orb2xy as orb2xy_rel
 from volatilespace.physics.phys_shared import (
     culling,
     curve_move_to,
@@ -32,53 +43,6 @@ from volatilespace.physics.phys_shared import (
 )
 
 
-def concat_wrap(array, point_start, range_start, range_end, point_end):
-    """
-    Concatenate [point_start, range..., point_end] with wraparound, into a fixed-size output.
-    If wrapped range overflows output size, it is truncated to fit.
-    """
-    max_rows = array.shape[0]
-    out = np.empty((max_rows, 2))
-    out[:] = np.nan
-
-    if range_start <= range_end:
-        # normal case
-        n_range = range_end - range_start
-        n_available = max_rows - 2  # room for point_start and point_end
-        n_copy = min(n_range, n_available)
-        out[0, :] = point_start
-        out[1:1+n_copy, :] = array[range_start:range_start+n_copy, :]
-        out[1+n_copy, :] = point_end
-    else:
-        # wrap around
-        range_first = array[range_start:, :]
-        range_second = array[:range_end, :]
-        total_range = range_first.shape[0] + range_second.shape[0]
-        n_available = max_rows - 2  # room for point_end and point_start
-        n_copy = min(total_range, n_available)
-        out[0, :] = point_end
-
-        # copy as much as fits from range_first
-        n_first = min(n_copy, range_first.shape[0])
-        out[1:1+n_first, :] = range_first[:n_first, :]
-
-        # copy remaining from range_second
-        n_second = n_copy - n_first
-        out[1+n_first:1+n_first+n_second, :] = range_second[:n_second, :]
-
-        # final point
-        out[1+n_copy, :] = point_start
-
-    # clear any NaNs left
-    if np.any(np.isnan(array)):
-        out_clean = out[~np.isnan(out[:, 0]), :]
-        out[:] = np.nan
-        out[:out_clean.shape[0], :] = out_clean
-
-    return out
-
-
-
 def calc_orb_one(ref, body_mass, gc, a, ecc):
     """Additional vessel orbital parameters"""
     u = gc * body_mass[ref]   # standard gravitational parameter
@@ -125,13 +89,239 @@ def move(ma, ecc, dr, n, dt):
     return ma, ea
 
 
+def same_key(key, cached):
+    """Check if inputs of prediction stage are same as cached ones, up to rounding errors from moving bodies"""
+    if cached is None or len(key) != len(cached):
+        return False
+    return all(abs(new - old) <= 1e-9 * abs(old) for new, old in zip(key, cached))
+
+
+def segment_range(segments, segment_ends, vessel, segment, curve_points, point_start, range_start, range_end, point_end):
+    """
+    Write segment [point_start, range..., point_end] with wraparound as index ranges on vessel curve.
+    Segment row is: kind, first range start, first range end, second range end (second range always starts at 0).
+    Kind 2 means segment is drawn from ranges and end points.
+    """
+    max_rows = curve_points - 2   # room for point_start and point_end
+    if range_start <= range_end:
+        # normal case
+        n_copy = min(range_end - range_start, max_rows)
+        first_start = slice_index(range_start, curve_points)
+        first_end = max(slice_index(range_start + n_copy, curve_points), first_start)
+        second_end = 0
+        segment_ends[vessel, segment, 0] = point_start
+        segment_ends[vessel, segment, 1] = point_end
+    else:
+        # wrap around
+        first_start = slice_index(range_start, curve_points)
+        n_copy = min(curve_points - first_start + slice_index(range_end, curve_points), max_rows)
+        n_first = min(n_copy, curve_points - first_start)
+        first_end = first_start + n_first
+        second_end = n_copy - n_first
+        segment_ends[vessel, segment, 0] = point_end
+        segment_ends[vessel, segment, 1] = point_start
+    segments[vessel, segment, 0] = 2
+    segments[vessel, segment, 1] = first_start
+    segments[vessel, segment, 2] = first_end
+    segments[vessel, segment, 3] = second_end
+
+
+def slice_index(index, length):
+    """Convert index to range [0, length] same as python slicing does"""
+    if index < 0:
+        index += length
+    return min(max(index, 0), length)
+
+
+def curve_index(ea, ell, curve_points):
+    """Get index of curve point closest to eccentric anomaly"""
+    if ell:
+        return round(ea * curve_points / (2*np.pi))
+    return curve_points - round((ea+np.pi) * curve_points / (2*np.pi))
+
+
+def first_intersect_index(ea_vessel, impact, coi_enter, coi_leave, direction):
+    """Get index of first of impact, coi enter and coi leave points from vessel in specified direction, -1 if there is none"""
+    first = -1
+    first_angle = np.inf
+    for num, ea_point in enumerate((impact, coi_enter, coi_leave)):
+        if not np.isnan(ea_point):
+            angle = abs(ea_vessel - ea_point)
+            if ea_vessel > ea_point:
+                angle = 2*np.pi - angle
+            if direction < 0:
+                angle = 2*np.pi - angle
+            if angle < first_angle:
+                first = num
+                first_angle = angle
+    return first
+
+
+def curve_segments_all(ea_all, ecc_all, ma_all, n_all, dr_all, a_all, b_all, f_all, pea_all, ref, body_pos, pos,
+                       body_impact, coi_enter, coi_leave, visible, curve_points,
+                       segments, segment_ends, first_intersect, intersect_type, intersect_time, select_range):
+    """
+    Calculate light and dark segments of all visible vessel curves, as index ranges on curve, and their end points.
+    Results are written into provided arrays, segment kind is: 0 - not drawn, 1 - whole curve, 2 - ranges and end points.
+    """
+    segments[:] = 0
+    first_intersect[:] = np.nan
+    intersect_type[:] = 0
+    intersect_time[:] = 0
+    select_range[:] = np.nan
+    for vessel in visible:
+        ea = ea_all[vessel]
+        ecc = ecc_all[vessel]
+        a = a_all[vessel]
+        b = b_all[vessel]
+        f = f_all[vessel]
+        pea = pea_all[vessel]
+        dr = dr_all[vessel]
+        ell = ecc < 1   # is True for ellipse (ecc<1) and False for hyperbola (ecc>1)
+        ref_x = body_pos[ref[vessel], 0]
+        ref_y = body_pos[ref[vessel], 1]
+        point_vessel = pos[vessel]
+        ea_vessel = curve_index(ea, ell, curve_points)
+
+        # check where and what is next intesection
+        impact = body_impact[vessel, int(not ell)]
+        coi_leave_next = coi_leave[vessel, int(not ell)]
+        first = first_intersect_index(ea, impact, coi_enter[vessel, 1], coi_leave_next, dr)
+
+        # do all possible scenarios
+        if first == 0 or first == 1:   # IMPACT or COI ENTER
+            segments[vessel, 1, 0] = 1
+            if first == 0:
+                ea_next = body_impact[vessel, 0]
+            else:
+                ea_next = coi_enter[vessel, 1]
+            x, y = orb2xy_rel(a, b, f, ecc, pea, ea_next)
+            coord_next = np.array((x + ref_x, y + ref_y))
+            ea_point_next = curve_index(ea_next, ell, curve_points)
+            if not ell:   # for hyperbola
+                if dr > 0:   # CCW
+                    if ea_vessel == ea_point_next:
+                        ea_vessel += 1
+                    if ea < 0:
+                        segment_range(segments, segment_ends, vessel, 0, curve_points, coord_next, ea_point_next, ea_vessel-1, point_vessel)
+                    else:
+                        segment_range(segments, segment_ends, vessel, 0, curve_points, point_vessel, ea_point_next, ea_vessel-1, coord_next)
+                else:   # CW
+                    if ea_vessel == ea_point_next:
+                        ea_vessel -= 1
+                    if ea < 0:
+                        segment_range(segments, segment_ends, vessel, 0, curve_points, coord_next, ea_vessel+1, ea_point_next, point_vessel)
+                    else:
+                        segment_range(segments, segment_ends, vessel, 0, curve_points, point_vessel, ea_vessel+1, ea_point_next, coord_next)
+            elif first == 0:   # impact on ellipse
+                if dr > 0:   # CCW
+                    if ea_vessel == ea_point_next:
+                        ea_vessel -= 1
+                    segment_range(segments, segment_ends, vessel, 0, curve_points, point_vessel, ea_vessel+1, ea_point_next, coord_next)
+                else:   # CW
+                    if ea_vessel == ea_point_next:
+                        ea_vessel += 1
+                    segment_range(segments, segment_ends, vessel, 0, curve_points, coord_next, ea_point_next, ea_vessel-1, point_vessel)
+            elif dr > 0:   # coi enter on ellipse CCW
+                if ea < np.pi:
+                    if ea_vessel == ea_point_next:
+                        ea_vessel -= 1
+                    segment_range(segments, segment_ends, vessel, 0, curve_points, point_vessel, ea_vessel+1, ea_point_next, coord_next)
+                elif ea > np.pi and ea < np.pi*1.5:   # ???
+                    segment_range(segments, segment_ends, vessel, 0, curve_points, point_vessel, ea_vessel+1, ea_point_next, coord_next)
+                else:
+                    segment_range(segments, segment_ends, vessel, 0, curve_points, coord_next, ea_vessel, ea_point_next, point_vessel)
+            else:   # coi enter on ellipse CW
+                if ea >= np.pi and ea_vessel == ea_point_next:
+                    ea_vessel += 1
+                segment_range(segments, segment_ends, vessel, 0, curve_points, coord_next, ea_point_next, ea_vessel-1, point_vessel)
+            first_intersect[vessel] = coord_next
+            ma_next = ea_next - ecc * np.sin(ea_next)
+            intersect_time[vessel] = orbit_time_to(ma_all[vessel], ma_next, ecc, dr, n_all[vessel])
+            intersect_type[vessel] = first + 1
+            if first == 1:
+                select_range[vessel, 0] = ea
+                select_range[vessel, 1] = ea_next
+
+        if first == -1:
+            segments[vessel, 0, 0] = 1
+        elif not np.isnan(coi_leave_next):   # COI LEAVE
+            ea_next = coi_leave[vessel, 0]
+            ea_prev = coi_leave[vessel, 1]
+            x, y = orb2xy_rel(a, b, f, ecc, pea, ea_next)
+            coord_next = np.array((x + ref_x, y + ref_y))
+            x, y = orb2xy_rel(a, b, f, ecc, pea, ea_prev)
+            coord_prev = np.array((x + ref_x, y + ref_y))
+            ea_point_next = curve_index(ea_next, ell, curve_points)
+            ea_point_prev = curve_index(ea_prev, ell, curve_points)
+
+            if first == 2:   # JUST COI LEAVE
+                if ell:   # for ellipse
+                    ma_next = ea_next - ecc * np.sin(ea_next)
+                    if dr > 0:   # CCW
+                        if ea < np.pi:
+                            if ea_vessel == ea_point_next:
+                                ea_vessel -= 1
+                            segment_range(segments, segment_ends, vessel, 0, curve_points, point_vessel, ea_vessel+1, ea_point_next, coord_next)
+                        else:
+                            segment_range(segments, segment_ends, vessel, 0, curve_points, coord_next, ea_vessel, ea_point_next, point_vessel)
+                        segment_range(segments, segment_ends, vessel, 1, curve_points, coord_next, ea_point_prev, ea_point_next, coord_prev)
+                    else:   # CW
+                        if ea < np.pi:
+                            segment_range(segments, segment_ends, vessel, 0, curve_points, point_vessel, ea_point_next, max(ea_vessel, 0), coord_next)
+                        else:
+                            if ea_vessel == ea_point_next:
+                                ea_vessel += 1
+                            segment_range(segments, segment_ends, vessel, 0, curve_points, coord_next, ea_point_next, max(ea_vessel-1, 0), point_vessel)
+                        segment_range(segments, segment_ends, vessel, 1, curve_points, coord_prev, ea_point_next, ea_point_prev, coord_next)
+                else:   # for hyperbola
+                    ma_next = (ecc * np.sinh(ea_next) - ea_next) * -1
+                    if dr > 0:   # CCW
+                        if ea_vessel == ea_point_next:
+                            ea_vessel += 1
+                        segment_range(segments, segment_ends, vessel, 0, curve_points, coord_next, ea_point_next, max(ea_vessel-1, 0), point_vessel)
+                        segment_range(segments, segment_ends, vessel, 1, curve_points, coord_next, ea_point_next, ea_point_prev, coord_prev)
+                    else:   # CW
+                        if ea_vessel == ea_point_next:
+                            ea_vessel -= 1
+                        segment_range(segments, segment_ends, vessel, 0, curve_points, point_vessel, ea_vessel+1, ea_point_next, coord_next)
+                        segment_range(segments, segment_ends, vessel, 1, curve_points, coord_prev, ea_point_prev, ea_point_next, coord_next)
+                first_intersect[vessel] = coord_next
+                intersect_time[vessel] = orbit_time_to(ma_all[vessel], ma_next, ecc, dr, n_all[vessel])
+                intersect_type[vessel] = 3
+
+            # COI LEAVE FOR 2 INTERSECTIONS
+            elif ell:   # for ellipse
+                if dr > 0:   # CCW
+                    segment_range(segments, segment_ends, vessel, 1, curve_points, coord_next, ea_point_prev, ea_point_next, coord_prev)
+                elif ea < np.pi:
+                    segment_range(segments, segment_ends, vessel, 1, curve_points, coord_prev, ea_point_next, ea_point_prev, coord_next)
+                else:
+                    segment_range(segments, segment_ends, vessel, 1, curve_points, coord_next, ea_point_next, ea_point_prev, coord_prev)
+            elif dr > 0:   # for hyperbola CCW
+                segment_range(segments, segment_ends, vessel, 1, curve_points, coord_next, ea_point_next, ea_point_prev, coord_prev)
+            else:   # for hyperbola CW
+                segment_range(segments, segment_ends, vessel, 1, curve_points, coord_prev, ea_point_prev, ea_point_next, coord_next)
+
+
 # if numba is enabled, compile functions ahead of time
 use_numba = peripherals.load_settings("game", "numba")
 if numba_avail and use_numba:
     enable_fastmath = peripherals.load_settings("game", "fastmath")
     jitkw = {"cache": True, "fastmath": enable_fastmath}   # numba JIT setings
-    concat_wrap = njit((float64[:, :], float64[:], int32, int32, float64[:]), **jitkw)(concat_wrap)
     move = njit(UniTuple(float64, 2)(float64, float64, float64, float64, float64), **jitkw)(move)
+    slice_index = njit(int64(int64, int64), **jitkw)(slice_index)
+    segment_range = njit((int64[:, :, :], float64[:, :, :, :], int64, int64, int64, float64[:], int64, int64, float64[:]), **jitkw)(segment_range)
+    curve_index = njit(int64(float64, bool_, int64), **jitkw)(curve_index)
+    first_intersect_index = njit(int64(float64, float64, float64, float64, float64), **jitkw)(first_intersect_index)
+    curve_segments_all = njit(
+        (
+            float64[:], float64[:], float64[:], float64[:], float64[:], float64[:], float64[:], float64[:], float64[:],
+            int64[:], float64[:, :], float64[:, :], float64[:, :], float64[:, :], float64[:, :], int64[:], int64,
+            int64[:, :, :], float64[:, :, :, :], float64[:, :], int64[:], float64[:], float64[:, :],
+        ),
+        **jitkw,
+    )(curve_segments_all)
 
 
 class Physics():
@@ -159,7 +349,9 @@ class Physics():
         self.period = np.array([])
         self.n = np.array([])
         self.curves = np.array([])
+        self.curve_size = np.array([])
         self.pos = np.array([])
+        self.rel_pos = np.array([])
         self.ea = np.array([])
         self.prev_ea = np.array([])
         self.u = np.array([])
@@ -170,6 +362,8 @@ class Physics():
         self.rad_mult = defaults.sim_config["rad_mult"]
         self.coi_coef = defaults.sim_config["coi_coef"]
         self.vessl_scale = defaults.sim_config["vessel_scale"]
+        self.kepler_table = None   # table for tabulated kepler solver
+        self.prediction = {}   # cached stages of next orbit prediction
         self.reload_settings()
 
 
@@ -178,7 +372,17 @@ class Physics():
         self.screen_x, self.screen_y = pygame.display.get_surface().get_size()
         self.curve_points = int(peripherals.load_settings("graphics", "curve_points"))   # number of points from which curve is drawn
         self.curves = np.zeros((len(self.names), self.curve_points, 2))
+        self.curve_size = np.zeros(len(self.names))
         self.predict_coi_limit = int(peripherals.load_settings("game", "predict_coi_limit"))
+        self.predict_coi_orbits = int(peripherals.load_settings("game", "predict_coi_orbits"))
+        self.predict_budget = float(peripherals.load_settings("game", "predict_orbit_budget")) / 1000   # ms to s
+        self.prediction = {}
+        if not peripherals.load_settings("game", "kepler_table"):
+            self.kepler_table = None
+        elif self.kepler_table is None:
+            self.kepler_table = kepler_table()
+            if kepler_table_error(self.kepler_table, 8) > 1e-10:   # validate against ENRKE
+                self.kepler_table = None
         self.t = np.linspace(-np.pi, np.pi, self.curve_points)   # parameter
         for vessel, _ in enumerate(self.names):
             self.curve(vessel)
@@ -208,6 +412,8 @@ class Physics():
         self.body_coi = body_orb["coi"]
         self.body_atm = body_data["atm_h"]
         self.body_u = body_orb["u"]
+        self.body_eph = body_orb["eph"]
+        self.body_eph_range = body_orb["eph_range"]
         self.load_conf(conf)
         self.physical_hold = np.array([], dtype=int)
         # vessel internal
@@ -224,8 +430,10 @@ class Physics():
         self.ref = vessel_orb_data["ref"]
         self.dr = vessel_orb_data["dir"]
         self.pos = np.zeros([len(self.names), 2])   # position will be updated later
+        self.rel_pos = np.zeros([len(self.names), 2])   # position relative to parent
         self.ea = np.zeros(len(self.names))
         self.curves = np.zeros((len(self.names), self.curve_points, 2))   # shape: (vessel, points, axes)
+        self.curve_size = np.zeros(len(self.names))   # curve width + height, used when picking
         self.curves_mov = np.zeros((len(self.names), self.curve_points, 2))
         self.pe_d = np.array([])   # clear it for culling
         # orbit points
@@ -233,10 +441,22 @@ class Physics():
         self.body_enter_atm = np.zeros((len(self.names), 2)) * np.nan
         self.coi_leave = np.zeros((len(self.names), 2)) * np.nan
         self.coi_enter = np.zeros((len(self.names), 6)) * np.nan
-        self.intersect_time = [0.0] * len(self.names)
+        # cached next enter coi for each vessel and body: ea, body ea, ma, body ma, time
+        self.enter_cache = np.zeros((len(self.names), len(self.body_ref), 5)) * np.nan
+        # time until which enter coi search is done for each vessel and body
+        self.enter_until = np.full((len(self.names), len(self.body_ref)), -np.inf)
+        self.time = 0.0
+        # curve segments: kind, first range start, first range end, second range end
+        self.segments = np.zeros((len(self.names), 2, 4), dtype=np.int64)
+        self.segment_ends = np.zeros((len(self.names), 2, 2, 2))
+        self.first_intersect = np.zeros((len(self.names), 2)) * np.nan
+        self.intersect_type = np.zeros(len(self.names), dtype=np.int64)
+        self.intersect_time = np.zeros(len(self.names))
+        self.select_range = np.zeros((len(self.names), 2)) * np.nan
         self.entered_coi = None
         self.left_coi = None
         self.left_coi_prev_ref = None
+        self.prediction = {}
 
 
         # those need to be cleared, in case game with less vessels is loaded
@@ -261,10 +481,11 @@ class Physics():
         - Vessels that are visible on screen
         - Vessels whose orbits are inside COI that is visible on screen and COI is larger than N pixels
         """
-        visible_vessels_truth = culling(self.pos, np.array([10]*len(self.names)) / zoom, sim_screen, zoom)
-        self.visible_vessels = np.arange(len(self.names))[visible_vessels_truth]
         visible_coi_truth = np.array([False]*len(self.body_dr))
         visible_coi_truth[visible_coi] = True
+        # vessels can not be outside COI of their reference, so only vessels inside visible COI are checked
+        candidates = np.where(visible_coi_truth[self.ref])[0]
+        self.visible_vessels = candidates[culling(self.pos[candidates], np.full(len(candidates), 10 / zoom), sim_screen, zoom)]
         visible_orbits_truth = np.logical_and(visible_coi_truth[self.ref], self.body_coi[self.ref] > 8 / zoom)
         visible_orbits_truth = np.logical_or(visible_orbits_truth, self.ref == 0)   # incl all orbits around main ref
         visible_orbits_truth = np.logical_and(visible_orbits_truth, self.pe_d * zoom < self.screen_x*15)
@@ -273,6 +494,12 @@ class Physics():
         return self.visible_vessels, self.visible_orbits
 
 
+    def pick(self, point, zoom):
+        """Get vessels under point, skipping vessels with too small orbits on screen"""
+        candidates = np.where(np.sum((self.pos - point)**2, axis=1) < (11 / zoom)**2)[0]
+        return candidates[self.curve_size[candidates] * zoom > 32]
+
+
     def initial(self, warp, body_pos, body_ma, body_ea):
         """Generate initial vessel data"""
         # orbit data
@@ -298,13 +525,17 @@ class Physics():
         self.prev_ea = np.array(self.ea)
 
         # get points coordinates
+        self.intersect_points(np.arange(len(self.names)))
         for vessel, _ in enumerate(self.names):
-            self.points(vessel)
+            self.enter_coi_points(vessel)
         return vessel_orb, self.pos, self.ma, self.curves_mov
 
 
-    def change_vessel(self, vessel):
-        """Do all vessel related physics to one vessel. This should be done only if something changed on vessel or it's orbit"""
+    def change_vessel(self, vessel, search_points=True):
+        """
+        Do all vessel related physics to one vessel. This should be done only if something changed on vessel or it's orbit.
+        If search_points is False, points() is skipped, so it can be done later for multiple vessels at once.
+        """
         # output is list because reading from dict is slow
 
         # vessel_data
@@ -355,8 +586,10 @@ class Physics():
             self.ea[vessel] = solve_kepler_ell(self.ecc[vessel], self.ma[vessel], 1e-10)
         else:
             self.ea[vessel] = newton_root_kepler_hyp(self.ecc[vessel], self.ma[vessel], self.ma[vessel])
+        self.rel_pos[vessel] = self.pos[vessel] - self.body_pos[self.ref[vessel]]   # parent may have changed
         # recalculate points and curves
-        self.points(vessel)
+        if search_points:
+            self.points(vessel)
         self.curve(vessel)
         return vessel_data, vessel_orb
 
@@ -367,6 +600,7 @@ class Physics():
         This should be done only if something changed on vessel or it's orbit, and after points().
         """
         self.curves[vessel] = curve_points(self.ecc[vessel], self.a[vessel], self.b[vessel], self.pea[vessel], self.t)
+        self.curve_size[vessel] = np.sum(np.ptp(self.curves[vessel], axis=0))
 
 
     def points(self, vessel, only_enter_coi=False):
@@ -374,6 +608,59 @@ class Physics():
         Find characteristic points on RELATIVE UNROTATED ellipse for one body.
         This should be done only if something changed on vessel or it's orbit, after move().
         """
+        if not only_enter_coi:   # disables irrelevant predictions for prefict_enter_coi_service
+            self.intersect_points(np.array([vessel]))
+            # orbit has changed, so cached enter coi points are invalid
+            self.enter_until[vessel] = -np.inf
+            self.enter_cache[vessel] = np.nan
+        self.enter_coi_points(vessel)
+
+
+    def intersect_points(self, vessels):
+        """
+        Find impact, atmosphere enter and coi leave points for multiple vessels at once.
+        This should be done only if something changed on vessels or their orbits, after move().
+        """
+        ecc = self.ecc[vessels]
+        ell = ecc < 1
+        ref = self.ref[vessels]
+        dr = self.dr[vessels]
+        ea = self.ea[vessels]
+        body_size = self.body_size[ref]
+        radii = np.column_stack((body_size, body_size + self.body_atm[ref], self.body_coi[ref]))
+        # skip circles that are not reached by ellipse
+        radii[np.logical_and(ell, self.pe_d[vessels] > radii[:, 0]), 0] = np.nan
+        radii[np.logical_and(ell, self.pe_d[vessels] > radii[:, 1]), 1] = np.nan
+        radii[np.logical_and(ell, self.ap_d[vessels] < radii[:, 2]), 2] = np.nan
+        ea_from = np.column_stack((ea, ea, ea))
+
+        # after enter-coi, use future position to avoid triggering leave-coi and selecting wrong point
+        entered = np.where(vessels == self.entered_coi)[0]
+        if len(entered):
+            vessel = self.entered_coi
+            ecc_vessel = self.ecc[vessel]
+            # calculate vessel ma and ea for next iteration
+            if ecc_vessel < 1:
+                next_ma = self.ma[vessel] + self.n[vessel] * self.dr[vessel]
+                next_ea = solve_kepler_ell(ecc_vessel, next_ma, 1e-10)
+            else:
+                next_ma = self.ma[vessel] + self.n[vessel] * self.dr[vessel] * -1
+                next_ea = newton_root_kepler_hyp(ecc_vessel, next_ma, self.ea[vessel])
+            ea_from[entered, 2] = next_ea
+
+        # body is in focus
+        ea_points, points_num = intersect_circles(self.a[vessels], self.b[vessels], ecc, self.f[vessels], np.zeros(len(vessels)), radii)
+        next_points_all = next_points(ea_from, ea_points, points_num, dr)
+        self.body_impact[vessels] = next_points_all[:, 0]
+        self.body_enter_atm[vessels] = next_points_all[:, 1]
+        self.coi_leave[vessels] = next_points_all[:, 2]
+
+
+    def enter_coi_points(self, vessel):
+        """
+        Find next coi enter point for one vessel, using cached predictions where possible.
+        This should be done after intersect_points().
+        """
         ecc = self.ecc[vessel]
         ell = ecc < 1
         ref = self.ref[vessel]
@@ -388,40 +675,7 @@ class Physics():
         n = self.n[vessel]
         pea = self.pea[vessel]
 
-        if not only_enter_coi:   # disables irrelevant predictions for prefict_enter_coi_service
-
-            if ell and self.pe_d[vessel] > self.body_size[ref]:
-                body_impact_all = np.array([np.nan])
-            else:
-                body_impact_all = ell_hyp_intersect_circle(a, b, ecc, xc, yc, self.body_size[ref])
-            self.body_impact[vessel] = next_point(ea, body_impact_all, dr)
-
-            if ell and self.pe_d[vessel] > self.body_size[ref] + self.body_atm[ref]:
-                body_enter_atm_all = np.array([np.nan])
-            else:
-                body_enter_atm_all = ell_hyp_intersect_circle(a, b, ecc, xc, yc, self.body_size[ref] + self.body_atm[ref])
-            self.body_enter_atm[vessel] = next_point(ea, body_enter_atm_all, dr)
-
-            if ell and self.ap_d[vessel] < self.body_coi[ref]:
-                coi_leave_all = np.array([np.nan])
-                self.coi_leave[vessel] = np.array([np.nan, np.nan])
-            else:
-                coi_leave_all = ell_hyp_intersect_circle(a, b, ecc, xc, yc, self.body_coi[ref])
-                # after enter-coi, use future position to avoid triggering leave-coi and selecting wrong point
-                if self.entered_coi == vessel:
-                    # calculate vessel ma and ea for next iteration
-                    if ell:
-                        next_ma = ma + n * dr
-                        next_ea = solve_kepler_ell(ecc, next_ma, 1e-10)
-                    else:
-                        next_ma = ma + n * dr * -1
-                        next_ea = newton_root_kepler_hyp(ecc, next_ma, ea)
-                    self.coi_leave[vessel] = next_point(next_ea, coi_leave_all, dr)
-                else:
-                    self.coi_leave[vessel] = next_point(ea, coi_leave_all, dr)
-
         # enter_coi
-        enter_data_all = np.empty([0, 5])
         check_bodies = np.where(self.body_ref == ref)[0]   # all bodies orbiting reference
         check_bodies = check_bodies[np.logical_and(check_bodies != 0, check_bodies != self.left_coi_prev_ref)]
 
@@ -435,7 +689,14 @@ class Physics():
                 next_ma = ma + n * dr * -1
                 next_ea = newton_root_kepler_hyp(ecc, next_ma, ea)
             ea = next_ea
-        for body in check_bodies:
+
+        # search again only bodies whose cached search does not cover next vessel orbit, and have no cached future enter
+        period = self.period[vessel] if ell else 0
+        future_enter = self.enter_cache[vessel, check_bodies, 4] >= self.time
+        search_bodies = check_bodies[np.logical_and(self.enter_until[vessel, check_bodies] < self.time + period, ~future_enter)]
+        bodies_data = np.empty((len(search_bodies), 12))
+        periods = np.full(len(search_bodies), np.nan)
+        for num, body in enumerate(search_bodies):
             b_ma = self.body_ma[body]
             if self.left_coi == vessel:
                 # calculate just body ma for next iteration
@@ -444,8 +705,14 @@ class Physics():
                 else:
                     b_ma += + self.body_n[body] * self.body_dr[body] * -1
             # find vessel and body ma and time when vessel will enter body coi
-            if ecc < 1:
-                period = self.period[vessel]
+            if ell:
+                # search until relative position of vessel and body repeats (synodic period), limited by number of orbits
+                b_period = self.body_period[body]
+                if b_period and b_period != period:
+                    synodic = 1 / abs(1 / period - 1 / b_period)
+                else:
+                    synodic = np.inf
+                periods[num] = min(max(synodic, period), period * self.predict_coi_orbits)
             else:
                 if self.ref[vessel] == 0:
                     # make ma_leave be at the radius of apoapsis + coi of currently checked body
@@ -453,23 +720,39 @@ class Physics():
                     max_point_all = ell_hyp_intersect_circle(a, b, ecc, xc, yc, max_radius)
                     ea_leave = next_point(ea, max_point_all, dr)[0]
                     if np.isnan(ea_leave):
+                        self.enter_until[vessel, body] = np.inf   # vessel will never reach this body
                         continue
                 else:
                     ea_leave = self.coi_leave[vessel, 0]
                 ma_leave = (ecc * np.sinh(ea_leave) - ea_leave) * -1
-                period = orbit_time_to(ma, ma_leave, ecc, dr, n)
-            vessel_data = (a, b, f, ecc, ma, ea, pea, period, n, dr)
-            body_data = (
+                periods[num] = orbit_time_to(ma, ma_leave, ecc, dr, n)
+            bodies_data[num] = (
                 self.body_a[body], self.body_b[body], self.body_f[body],
                 self.body_ecc[body], b_ma, self.body_ea[body], self.body_pea[body],
                 self.body_n[body], self.body_dr[body], self.body_coi[body],
+                self.body_eph_range[body, 0], self.body_eph_range[body, 1],
             )
-            enter_data_one = predict_enter_coi(vessel_data, body_data, 1e-5, 300)
-            enter_data_all = np.vstack((enter_data_all, enter_data_one))
-        coi_enter_all = enter_data_all[:, 0]
-        first_enter = sort_intersect_indices(ea, coi_enter_all, dr)[0]
-        if not np.isnan(first_enter):
-            self.coi_enter[vessel] = np.append(check_bodies[first_enter], enter_data_all[first_enter])
+        # bodies that are skipped have nan period, so they are not searched
+        bodies_data[np.isnan(periods)] = 0
+        vessel_data = (a, b, f, ecc, ma, ea, pea, n, dr)
+        enter_data = predict_enter_coi(vessel_data, bodies_data, self.body_eph, periods, 1e-5, self.predict_coi_limit)
+        searched = ~np.isnan(periods)
+        enter_data[:, 4] += self.time   # store absolute time
+        self.enter_cache[vessel, search_bodies[searched]] = enter_data[searched]
+        # hyperbolic orbit is searched until it leaves, so it is valid until orbit changes
+        if ell:
+            self.enter_until[vessel, search_bodies[searched]] = self.time + periods[searched]
+        else:
+            self.enter_until[vessel, search_bodies[searched]] = np.inf
+
+        # use first enter, but only if it is in next vessel orbit, otherwise vessel could pass it before entering
+        enter_time = self.enter_cache[vessel, check_bodies, 4] - self.time
+        enter_time[np.logical_or(np.isnan(enter_time), enter_time < 0)] = np.inf
+        if len(check_bodies) and np.min(enter_time) < np.inf and (not ell or np.min(enter_time) <= period):
+            first_enter = np.argmin(enter_time)
+            body = check_bodies[first_enter]
+            self.coi_enter[vessel] = np.append(body, self.enter_cache[vessel, body])
+            self.coi_enter[vessel, 5] = enter_time[first_enter]
         else:
             self.coi_enter[vessel] = np.array([np.nan]*6)
 
@@ -481,19 +764,61 @@ class Physics():
         self.body_ea = body_ea
         hyp = np.where(self.ecc > 1, -1, 1)
         self.ma += self.dr * self.n * warp * hyp
+        self.time += warp
         self.ma = np.where(np.logical_and(self.ecc < 1, self.ma > 2*np.pi), self.ma - 2*np.pi, self.ma)
         self.ma = np.where(np.logical_and(self.ecc < 1, self.ma < 0), self.ma + 2*np.pi, self.ma)
         self.prev_ea = np.array(self.ea)
-        for vessel, _ in enumerate(self.names):
-            if self.ecc[vessel] < 1:
-                ea = solve_kepler_ell(self.ecc[vessel], self.ma[vessel], 1e-10)
-            else:
-                ea = newton_root_kepler_hyp(self.ecc[vessel], self.ma[vessel], self.ea[vessel])
-            self.pos[vessel] = self.ea2coord(vessel, ea)
-            self.ea[vessel] = ea
+        ell = self.ecc < 1
+        ea = np.array(self.ea)
+        if self.kepler_table is None:
+            ea[ell] = solve_kepler_ell_batch(self.ecc[ell], self.ma[ell], 1e-10)
+        else:
+            ea[ell] = solve_kepler_table_batch(self.kepler_table, self.ecc[ell], self.ma[ell])
+        for vessel in np.where(~ell)[0]:
+            ea[vessel] = newton_root_kepler_hyp(self.ecc[vessel], self.ma[vessel], self.ea[vessel])
+        self.ea = ea
+        # positions of all vessels
+        x_n = np.where(ell, self.a * np.cos(ea), self.a * np.cosh(ea)) - self.f
+        y_n = np.where(ell, self.b * np.sin(ea), self.b * np.sinh(ea))
+        angle = self.pea - np.pi
+        self.rel_pos = np.column_stack((
+            x_n * np.cos(angle) - y_n * np.sin(angle),
+            x_n * np.sin(angle) + y_n * np.cos(angle),
+        ))
+        self.pos = self.rel_pos + self.body_pos[self.ref]
         return self.pos, self.ma
 
 
+    def seek(self, ma, orbits, body_pos, body_ma, body_ea, vessels=None):
+        """
+        Set mean anomalies and orbits (a, ecc, pe_arg, ref, dir) of all vessels and move them there, such as when replaying recording.
+        Enter coi is searched only for vessels in list (all if None), others have no enter until searched again, so scrubbing is fast.
+        Returns vessels whose orbit has changed, with their data from change_vessel().
+        """
+        orbits = np.asarray(orbits)
+        changed = np.nonzero(np.any(np.column_stack((self.a, self.ecc, self.pea, self.ref, self.dr)) != orbits, axis=1))[0]
+        self.a[changed] = orbits[changed, 0]
+        self.ecc[changed] = orbits[changed, 1]
+        self.pea[changed] = orbits[changed, 2]
+        self.ref[changed] = orbits[changed, 3]
+        self.dr[changed] = orbits[changed, 4]
+        self.ma = np.array(ma)
+        changes = [(vessel, *self.change_vessel(vessel, False)) for vessel in changed]
+        self.move(0, body_pos, body_ma, body_ea)
+        self.prev_ea = np.array(self.ea)
+        if len(changed):
+            self.intersect_points(changed)
+        # time may have gone back, so all cached enter coi predictions are invalid
+        self.enter_until[:] = -np.inf
+        self.enter_cache[:] = np.nan
+        self.coi_enter[:] = np.nan
+        if vessels is None:
+            vessels = range(len(self.names))
+        for vessel in vessels:
+            self.enter_coi_points(vessel)
+        return changes
+
+
     def curve_move(self):
         """
         Move all orbit curves to parent position.
@@ -632,21 +957,37 @@ class Physics():
         return None
 
 
-    def predict_next_orbit(self, vessel):
-        """Predict next orbit for specified vessel, calculate orbit line and ghost body"""
+    def prediction_key(self, vessel):
+        """
+        Get inputs of next orbit prediction, they change only when vessel orbit or its next COI change changes.
+        Returns None if there is no orbit change.
+        """
+        if not self.intersect_time[vessel]:
+            return None
+        if not np.isnan(self.coi_enter[vessel, 1]):
+            return (vessel, 1, self.a[vessel], self.ecc[vessel], self.pea[vessel], self.dr[vessel], *self.coi_enter[vessel, :3])
+        if not np.isnan(self.coi_leave[vessel, 0]) and np.isnan(self.body_impact[vessel, 0]):
+            ref = self.ref[vessel]
+            ref_ma = self.body_ma[ref] + self.body_dr[ref] * self.body_n[ref] * self.intersect_time[vessel]   # at leave coi
+            return (vessel, 0, self.a[vessel], self.ecc[vessel], self.pea[vessel], self.dr[vessel], self.coi_leave[vessel, 0], ref_ma)
+        return None
+
+
+    def predict_elements(self, vessel):
+        """
+        Predict orbit of vessel after next COI change: new reference, orbital elements,
+        and positions of new reference and vessel at change. Returns None if there is no orbit change.
+        """
         coi_enter = self.coi_enter[vessel]
         if not np.isnan(coi_enter[1]):
             ref = self.ref[vessel]
             new_ref = int(coi_enter[0])
-            dt = self.intersect_time[vessel]
-            if not dt:
-                return None, None, None, None, None, None, None, None, None, None, None
             # predict new bodies position
             future_new_ref_ea = coi_enter[2]
             future_new_ref_pos = orb2xy(self.body_a[new_ref], self.body_b[new_ref], self.body_f[new_ref], self.body_ecc[new_ref], self.body_pea[new_ref], np.array((0.0, 0.0)), future_new_ref_ea)
             # calculate next orbit parameters
             if ref == new_ref:
-                return None, None, None, None, None, None, None, None, None, None, None
+                return None
             new_u = self.gc * self.body_mass[new_ref]
             future_ves_pos = orb2xy(self.a[vessel], self.b[vessel], self.f[vessel], self.ecc[vessel], self.pea[vessel], np.array((0.0, 0.0)), coi_enter[1])
             ves_vel = kepler_to_velocity(future_ves_pos, self.a[vessel], self.ecc[vessel], self.pea[vessel], self.u[vessel], self.dr[vessel])
@@ -661,8 +1002,6 @@ class Physics():
             ref = self.ref[vessel]
             new_ref = self.body_ref[ref]
             dt = self.intersect_time[vessel]
-            if not dt:
-                return None, None, None, None, None, None, None, None, None, None, None
             # predict new bodies positions
             _, future_ref_ea = move(self.body_ma[ref], self.body_ecc[ref], self.body_dr[ref], self.body_n[ref], dt)
             future_new_ref_pos = np.array((0.0, 0.0))
@@ -679,20 +1018,30 @@ class Physics():
             enter_coi = False
 
         else:
-            return None, None, None, None, None, None, None, None, None, None, None
+            return None
+
+        return a, ecc, pea, ma, dr, new_ref, future_new_ref_pos, future_ves_pos, enter_coi
 
-        # calculate curve
-        pea_inv = pea
-        pea = pea + np.pi
-        if pea >= 2 * np.pi:
-            pea -= 2 * np.pi
+
+    def predict_curve(self, a, ecc, pea, new_ref, future_new_ref_pos):
+        """Calculate curve of predicted orbit, and its extra orbital parameters"""
+        pea = (pea + np.pi) % (2 * np.pi)
         b, f, pe_d, ap_d, _, n, _ = calc_orb_one(0, np.array([self.body_mass[new_ref]]), self.gc, a, ecc)
         curve = curve_points(ecc, a, b, pea, self.t)
         focus = np.column_stack((f * np.cos(pea), f * np.sin(pea)))
         curve = curve + focus - future_new_ref_pos
-        ell = ecc < 1
+        return curve, b, f, pe_d, ap_d, n
+
 
-        # intersect curve with coi and cut it
+    def predict_cut(self, a, b, f, ecc, pea, ap_d, ma, n, dr, new_ref, future_new_ref_pos):
+        """
+        Intersect predicted orbit curve with COI of new reference, and get segment of curve inside it.
+        Segment is written same as vessel curve segments, so curve is not copied, kind 1 is whole curve.
+        """
+        segment = np.zeros((1, 1, 4), dtype=np.int64)
+        segment_ends = np.zeros((1, 1, 2, 2))
+        segment[0, 0, 0] = 1
+        ell = ecc < 1
         if not ell or ap_d > self.body_coi[new_ref]:
             coi_leave_all = ell_hyp_intersect_circle(a, b, ecc, f, 0, self.body_coi[new_ref])
             if ell:
@@ -705,47 +1054,86 @@ class Physics():
             ea_next = coi_leave_all[0]
             ea_prev = coi_leave_all[1]
             if not np.isnan(ea_next):
-                coord_next = - orb2xy(a, b, f, ecc, pea_inv, future_new_ref_pos, ea_next)
-                coord_prev = - orb2xy(a, b, f, ecc, pea_inv, future_new_ref_pos, ea_prev)
+                coord_next = - orb2xy(a, b, f, ecc, pea, future_new_ref_pos, ea_next)
+                coord_prev = - orb2xy(a, b, f, ecc, pea, future_new_ref_pos, ea_prev)
                 if ell:
                     ea_point_next = round(ea_next * self.curve_points / (2*np.pi))
                     ea_point_prev = round(ea_prev * self.curve_points / (2*np.pi))
                     if dr > 0:
-                        curve = concat_wrap(curve, coord_next, ea_point_prev, ea_point_next, coord_prev)
+                        segment_range(segment, segment_ends, 0, 0, self.curve_points, coord_next, ea_point_prev, ea_point_next, coord_prev)
                     else:
-                        curve = concat_wrap(curve, coord_prev, ea_point_next, ea_point_prev, coord_next)
+                        segment_range(segment, segment_ends, 0, 0, self.curve_points, coord_prev, ea_point_next, ea_point_prev, coord_next)
                 else:
                     ea_point_next = self.curve_points - round((ea_next+np.pi) * self.curve_points / (2*np.pi))
                     ea_point_prev = self.curve_points - round((ea_prev+np.pi) * self.curve_points / (2*np.pi))
                     if dr > 0:
-                        curve = concat_wrap(curve, coord_next, ea_point_next, ea_point_prev, coord_prev)
+                        segment_range(segment, segment_ends, 0, 0, self.curve_points, coord_next, ea_point_next, ea_point_prev, coord_prev)
                     else:
-                        curve = concat_wrap(curve, coord_prev, ea_point_prev, ea_point_next, coord_next)
-
-        # calculate ap and pe
-        if ecc != 0:   # not circle
-            if ecc < 1:   # ellipse
-                pe_t = orbit_time_to(ma, 0, ecc, dr, n) + dt
-                ap = np.array([ap_d * math.cos(pea), ap_d * math.sin(pea)]) - future_new_ref_pos
-                ap_t = orbit_time_to(ma, np.pi, ecc, dr, n) + dt
-            else:
-                pe_t = orbit_time_to(ma, 0, ecc, dr, n) + dt
-                ap = np.array([0, 0])
-                ap_t = 0
-        else:   # circle
-            pe_t = orbit_time_to(ma, 0, ecc, dr, n) + dt
+                        segment_range(segment, segment_ends, 0, 0, self.curve_points, coord_prev, ea_point_prev, ea_point_next, coord_next)
+        return segment[0, 0], segment_ends[0, 0]
+
+
+    def predict_markers(self, ecc, pea, pe_d, ap_d, ma, n, dr, dt, future_new_ref_pos):
+        """Calculate apoapsis and periapsis of predicted orbit, and time to them from now"""
+        pea = (pea + np.pi) % (2 * np.pi)
+        pe_t = orbit_time_to(ma, 0, ecc, dr, n) + dt
+        if 0 < ecc < 1:   # ellipse
+            ap = np.array([ap_d * math.cos(pea), ap_d * math.sin(pea)]) - future_new_ref_pos
+            ap_t = orbit_time_to(ma, np.pi, ecc, dr, n) + dt
+        else:   # there is no apoapsis
             ap = np.array([0, 0])
             ap_t = 0
         pe = np.array([pe_d * math.cos(pea - np.pi), pe_d * math.sin(pea - np.pi)]) - future_new_ref_pos
+        return ap, ap_t, pe, pe_t
 
-        return curve, ap, ap_d, ap_t, pe, pe_d, pe_t, new_ref, -future_new_ref_pos, -future_ves_pos, enter_coi
+
+    def predict_next_orbit(self, vessel, budget=None):
+        """
+        Predict next orbit for specified vessel, calculate orbit line and ghost body.
+        Prediction is done in stages: elements, curve, cut curve and markers. Each stage is cached,
+        and calculated again only when its inputs change, so this can run every tick. Markers depend on time, so they are always calculated.
+        If budget time (in seconds) is exceeded after a stage, None is returned, and prediction continues from cached stages in next call.
+        """
+        start = time.perf_counter()
+        key = self.prediction_key(vessel)
+        if key is None:
+            self.prediction = {}
+            return None, None, None, None, None, None, None, None, None, None, None, None, None
+
+        if not same_key(key, self.prediction.get("elements_key")):
+            self.prediction["elements_key"] = key
+            self.prediction["elements"] = self.predict_elements(vessel)
+            if budget is not None and time.perf_counter() - start > budget:
+                return None
+        if self.prediction["elements"] is None:
+            return None, None, None, None, None, None, None, None, None, None, None, None, None
+        a, ecc, pea, ma, dr, new_ref, future_new_ref_pos, future_ves_pos, enter_coi = self.prediction["elements"]
+
+        curve_key = (a, ecc, pea, new_ref, future_new_ref_pos[0], future_new_ref_pos[1])
+        if not same_key(curve_key, self.prediction.get("curve_key")):
+            self.prediction["curve_key"] = curve_key
+            self.prediction["curve"] = self.predict_curve(a, ecc, pea, new_ref, future_new_ref_pos)
+            self.prediction.pop("cut_key", None)
+            if budget is not None and time.perf_counter() - start > budget:
+                return None
+        curve, b, f, pe_d, ap_d, n = self.prediction["curve"]
+
+        cut_key = (ma, dr)
+        if not same_key(cut_key, self.prediction.get("cut_key")):
+            self.prediction["cut_key"] = cut_key
+            self.prediction["cut"] = self.predict_cut(a, b, f, ecc, pea, ap_d, ma, n, dr, new_ref, future_new_ref_pos)
+        segment, segment_ends = self.prediction["cut"]
+
+        dt = self.intersect_time[vessel]
+        ap, ap_t, pe, pe_t = self.predict_markers(ecc, pea, pe_d, ap_d, ma, n, dr, dt, future_new_ref_pos)
+        return curve, ap, ap_d, ap_t, pe, pe_d, pe_t, new_ref, -future_new_ref_pos, -future_ves_pos, enter_coi, segment, segment_ends
 
 
     def predict_enter_coi_service(self):
         """
-        Run predict_enter_coi for each vessel periodically,
-        because used algorithm predicts only up to one full orbit.
-        This service runs predict_enter_coi every half orbit, after vessel passes Pe and Ap.
+        Update enter coi for each vessel periodically, because only enter in next orbit is used.
+        This service runs every half orbit, after vessel passes Pe and Ap.
+        Enter coi is searched again only when cached search does not cover next orbit.
         """
         for vessel, _ in enumerate(self.names):
             if np.isnan(self.coi_enter[vessel, 0]):
@@ -758,6 +1146,44 @@ class Physics():
                             self.points(vessel, True)
 
 
+    def plan_transfer(self, vessel, target, target_vessel, arc_points=200):
+        """
+        Plan transfer from vessel to target body or vessel, with porkchop grid of Lambert solutions.
+        Both must be on elliptic orbits around same reference, otherwise None is returned.
+        Returned plan times are relative to current time, and transfer arc is relative to reference.
+        """
+        ref = self.ref[vessel]
+        if self.ecc[vessel] >= 1:
+            return None
+        if target_vessel:
+            if target == vessel or self.ref[target] != ref or self.ecc[target] >= 1:
+                return None
+            target_data = (
+                self.a[target], self.b[target], self.f[target], self.ecc[target], self.ma[target], self.ea[target],
+                self.pea[target], self.n[target], self.dr[target], 0, 0, 0,
+            )
+            target_period = self.period[target]
+        else:
+            if target == 0 or self.body_ref[target] != ref or self.body_ecc[target] >= 1:
+                return None
+            target_data = (
+                self.body_a[target], self.body_b[target], self.body_f[target], self.body_ecc[target],
+                self.body_ma[target], self.body_ea[target], self.body_pea[target], self.body_n[target],
+                self.body_dr[target], self.body_coi[target], self.body_eph_range[target, 0], self.body_eph_range[target, 1],
+            )
+            target_period = self.body_period[target]
+        vessel_data = (
+            self.a[vessel], self.b[vessel], self.f[vessel], self.ecc[vessel], self.ma[vessel],
+            self.ea[vessel], self.pea[vessel], self.n[vessel], self.dr[vessel],
+        )
+        u = float(self.u[vessel])
+        plan = maneuver.plan(tuple(map(float, vessel_data)), tuple(map(float, target_data)), self.body_eph, u, self.period[vessel], target_period)
+        if plan is not None:
+            plan["ref"] = ref
+            plan["arc"] = maneuver.transfer_arc(*plan["state"], u, plan["tof"], arc_points)
+        return plan
+
+
     def rotate(self, warp, vessel, direction):
         """
         Rotate all vessels, and changes rotation speed of active vessel,
@@ -789,7 +1215,7 @@ class Physics():
         u = self.u[vessel]
         n = self.n[vessel]
 
-        rel_pos = self.pos[vessel] - pos_ref
+        rel_pos = self.rel_pos[vessel]
         distance = mag(rel_pos)   # distance to parent
         speed_orb = math.sqrt(u * ((2 / distance) - (1 / a)))   # velocity magnitude from vis-viva eq
         if ecc < 1:
@@ -828,202 +1254,14 @@ class Physics():
     def curve_segments(self):
         """
         Calculate two segments for each curve on screen.
-        Returns arrays of all x and y points for each segment for all curves on screen.
-        Dimensions: (curve, points, axis).
+        Segments are index ranges on moved curve, with end points, they are drawn as slices of curve.
+        Dimensions: segments (vessel, segment, [kind, first start, first end, second end]), ends (vessel, segment, point, axis).
         This should be done every tick after curve_move(), and after points(), which must be run at least once.
         """
-        curves_light = np.empty((len(self.names), self.curve_points, 2))   # shape: (vessel, points, axes)
-        curves_dark = np.empty((len(self.names), self.curve_points, 2))
-        intersect_type = [0] * len(self.names)
-        self.intersect_time = [0.0] * len(self.names)
-        select_range = np.empty((len(self.names), 2)) * np.nan
-        first_intersect = np.empty((len(self.names), 2)) * np.nan
-        for vessel in self.visible_orbits:
-            ea = self.ea[vessel]
-            ecc = self.ecc[vessel]
-            if ecc < 1:
-                ell = True   # is True for ellipse (ecc<1) and False for hyperbola (ecc>1)
-            else:
-                ell = False
-            dr = self.dr[vessel]
-            point_vessel = self.pos[vessel]
-            curve_light = np.array(self.curves_mov[vessel])   # np.array is same as np.copy but faster
-            curve_dark = np.array(self.curves_mov[vessel])
-
-            # check where and what is next intesection
-            impact = self.body_impact[vessel, int(not ell)]
-            coi_enter = self.coi_enter[vessel, 1]
-            coi_leave = self.coi_leave[vessel, int(not ell)]
-            all_intersect = np.array((impact, coi_enter, coi_leave))
-            next_intersect = sort_intersect_indices(self.ea[vessel], all_intersect, dr)
-
-            # do all possible scenarios
-            if next_intersect[0] == 0:   # IMPACT
-                curves_dark[vessel] = curve_dark
-                ea_next = self.body_impact[vessel, 0]
-                coord_next = self.ea2coord(vessel, ea_next)
-                if ell:   # for ellipse
-                    ma_next = ea_next - ecc * np.sin(ea_next)
-                    ea_vessel = round(ea * self.curve_points / (2*np.pi))
-                    ea_point_next = round(ea_next * self.curve_points / (2*np.pi))
-                    if dr > 0:   # CCW
-                        if ea_vessel == ea_point_next:
-                            ea_vessel -= 1
-                        curves_light[vessel] = concat_wrap(curve_light, point_vessel, ea_vessel+1, ea_point_next, coord_next)
-                    else:   # CW
-                        if ea_vessel == ea_point_next:
-                            ea_vessel += 1
-                        curves_light[vessel] = concat_wrap(curve_light, coord_next, ea_point_next, ea_vessel-1, point_vessel)
-                else:   # for hyperbola
-                    ma_next = (ecc * np.sinh(ea_next) - ea_next) * -1
-                    ea_vessel = self.curve_points - round((ea+np.pi) * self.curve_points / (2*np.pi))
-                    ea_point_next = self.curve_points - round((ea_next+np.pi) * self.curve_points / (2*np.pi))
-                    if dr > 0:   # CCW
-                        if ea_vessel == ea_point_next:
-                            ea_vessel += 1
-                        if ea < 0:
-                            curves_light[vessel] = concat_wrap(curve_light, coord_next, ea_point_next, ea_vessel-1, point_vessel)
-                        else:
-                            curves_light[vessel] = concat_wrap(curve_light, point_vessel, ea_point_next, ea_vessel-1, coord_next)
-                    else:   # CW
-                        if ea_vessel == ea_point_next:
-                            ea_vessel -= 1
-                        if ea < 0:
-                            curves_light[vessel] = concat_wrap(curve_light, coord_next, ea_vessel+1, ea_point_next, point_vessel)
-                        else:
-                            curves_light[vessel] = concat_wrap(curve_light, point_vessel, ea_vessel+1, ea_point_next, coord_next)
-                first_intersect[vessel] = coord_next
-                ma = self.ma[vessel]
-                ma_next = ea_next - ecc * np.sin(ea_next)
-                self.intersect_time[vessel] = orbit_time_to(ma, ma_next, ecc, self.dr[vessel], self.n[vessel])
-                intersect_type[vessel] = 1
-
-            if next_intersect[0] == 1:   # COI ENTER
-                curves_dark[vessel] = curve_dark
-                ea_next = coi_enter
-                coord_next = self.ea2coord(vessel, ea_next)
-                if ell:   # for ellipse
-                    ma_next = ea_next - ecc * np.sin(ea_next)
-                    ea_vessel = round(ea * self.curve_points / (2*np.pi))
-                    ea_point_next = round(ea_next * self.curve_points / (2*np.pi))
-                    if dr > 0:   # CCW
-                        if ea < np.pi:
-                            if ea_vessel == ea_point_next:
-                                ea_vessel -= 1
-                            curves_light[vessel] = concat_wrap(curve_light, point_vessel, ea_vessel+1, ea_point_next, coord_next)
-                        elif ea > np.pi and ea < np.pi*1.5:   # ???
-                            curves_light[vessel] = concat_wrap(curve_light, point_vessel, ea_vessel+1, ea_point_next, coord_next)
-                        else:
-                            curves_light[vessel] = concat_wrap(curve_light, coord_next, ea_vessel, ea_point_next, point_vessel)
-                    elif ea < np.pi:
-                        curves_light[vessel] = concat_wrap(curve_light, coord_next, ea_point_next, ea_vessel-1, point_vessel)
-                    else:
-                        if ea_vessel == ea_point_next:
-                            ea_vessel += 1
-                        curves_light[vessel] = concat_wrap(curve_light, coord_next, ea_point_next, ea_vessel-1, point_vessel)
-                else:   # for hyperbola
-                    ma_next = (ecc * np.sinh(ea_next) - ea_next) * -1
-                    ea_vessel = self.curve_points - round((ea+np.pi) * self.curve_points / (2*np.pi))
-                    ea_point_next = self.curve_points - round((ea_next+np.pi) * self.curve_points / (2*np.pi))
-                    if dr > 0:   # CCW
-                        if ea_vessel == ea_point_next:
-                            ea_vessel += 1
-                        if ea < 0:
-                            curves_light[vessel] = concat_wrap(curve_light, coord_next, ea_point_next, ea_vessel-1, point_vessel)
-                        else:
-                            curves_light[vessel] = concat_wrap(curve_light, point_vessel, ea_point_next, ea_vessel-1, coord_next)
-                    else:   # CW
-                        if ea_vessel == ea_point_next:
-                            ea_vessel -= 1
-                        if ea < 0:
-                            curves_light[vessel] = concat_wrap(curve_light, coord_next, ea_vessel+1, ea_point_next, point_vessel)
-                        else:
-                            curves_light[vessel] = concat_wrap(curve_light, point_vessel, ea_vessel+1, ea_point_next, coord_next)
-                first_intersect[vessel] = coord_next
-                ma = self.ma[vessel]
-                ma_next = ea_next - ecc * np.sin(ea_next)
-                self.intersect_time[vessel] = orbit_time_to(ma, ma_next, ecc, self.dr[vessel], self.n[vessel])
-                intersect_type[vessel] = 2
-                select_range[vessel] = [ea, ea_next]
-
-            if next_intersect[0] == 2:   # JUST COI LEAVE
-                if ell:   # for ellipse
-                    ea_next = self.coi_leave[vessel, 0]
-                    ea_prev = self.coi_leave[vessel, 1]
-                    coord_next = self.ea2coord(vessel, ea_next)
-                    coord_prev = self.ea2coord(vessel, ea_prev)
-                    ma_next = ea_next - ecc * np.sin(ea_next)
-                    ea_vessel = round(ea * self.curve_points / (2*np.pi))
-                    ea_point_next = round(ea_next * self.curve_points / (2*np.pi))
-                    ea_point_prev = round(ea_prev * self.curve_points / (2*np.pi))
-                    if dr > 0:   # CCW
-                        if ea < np.pi:
-                            if ea_vessel == ea_point_next:
-                                ea_vessel -= 1
-                            curves_light[vessel] = concat_wrap(curve_light, point_vessel, ea_vessel+1, ea_point_next, coord_next)
-                        else:
-                            curves_light[vessel] = concat_wrap(curve_light, coord_next, ea_vessel, ea_point_next, point_vessel)
-                        curves_dark[vessel] = concat_wrap(curve_dark, coord_next, ea_point_prev, ea_point_next, coord_prev)
-                    else:   # CW
-                        if ea < np.pi:
-                            curves_light[vessel] = concat_wrap(curve_light, point_vessel, ea_point_next, max(ea_vessel, 0), coord_next)
-                        else:
-                            if ea_vessel == ea_point_next:
-                                ea_vessel += 1
-                            curves_light[vessel] = concat_wrap(curve_light, coord_next, ea_point_next, max(ea_vessel-1, 0), point_vessel)
-                        curves_dark[vessel] = concat_wrap(curve_dark, coord_prev, ea_point_next, ea_point_prev, coord_next)
-                else:   # for hyperbola
-                    ea_next = self.coi_leave[vessel, 0]
-                    ea_prev = self.coi_leave[vessel, 1]
-                    coord_next = self.ea2coord(vessel, ea_next)
-                    coord_prev = self.ea2coord(vessel, ea_prev)
-                    ma_next = (ecc * np.sinh(ea_next) - ea_next) * -1
-                    ea_vessel = self.curve_points - round((ea+np.pi) * self.curve_points / (2*np.pi))
-                    ea_point_next = self.curve_points - round((ea_next+np.pi) * self.curve_points / (2*np.pi))
-                    ea_point_prev = self.curve_points - round((ea_prev+np.pi) * self.curve_points / (2*np.pi))
-                    if dr > 0:   # CCW
-                        if ea_vessel == ea_point_next:
-                            ea_vessel += 1
-                        curves_light[vessel] = concat_wrap(curve_light, coord_next, ea_point_next, max(ea_vessel-1, 0), point_vessel)
-                        curves_dark[vessel] = concat_wrap(curve_dark, coord_next, ea_point_next, ea_point_prev, coord_prev)
-                    else:   # CW
-                        if ea_vessel == ea_point_next:
-                            ea_vessel -= 1
-                        curves_light[vessel] = concat_wrap(curve_light, point_vessel, ea_vessel+1, ea_point_next, coord_next)
-                        curves_dark[vessel] = concat_wrap(curve_dark, coord_prev, ea_point_prev, ea_point_next, coord_next)
-                first_intersect[vessel] = coord_next
-                ma = self.ma[vessel]
-                self.intersect_time[vessel] = orbit_time_to(ma, ma_next, ecc, self.dr[vessel], self.n[vessel])
-                intersect_type[vessel] = 3
-
-            elif any(next_intersect == 2):   # COI LEAVE FOR 2 INTERSECTIONS
-                if ell:   # for ellipse
-                    ea_next = self.coi_leave[vessel, 0]
-                    ea_prev = self.coi_leave[vessel, 1]
-                    coord_next = self.ea2coord(vessel, ea_next)
-                    coord_prev = self.ea2coord(vessel, ea_prev)
-                    ea_point_next = round(ea_next * self.curve_points / (2*np.pi))
-                    ea_point_prev = round(ea_prev * self.curve_points / (2*np.pi))
-                    if dr > 0:   # CCW
-                        curves_dark[vessel] = concat_wrap(curve_dark, coord_next, ea_point_prev, ea_point_next, coord_prev)
-                    elif ea < np.pi:
-                        curves_dark[vessel] = concat_wrap(curve_dark, coord_prev, ea_point_next, ea_point_prev, coord_next)
-                    else:
-                        curves_dark[vessel] = concat_wrap(curve_dark, coord_next, ea_point_next, ea_point_prev, coord_prev)
-                else:   # for hyperbola
-                    ea_next = self.coi_leave[vessel, 0]
-                    ea_prev = self.coi_leave[vessel, 1]
-                    coord_next = self.ea2coord(vessel, ea_next)
-                    coord_prev = self.ea2coord(vessel, ea_prev)
-                    ea_vessel = self.curve_points - round((ea+np.pi) * self.curve_points / (2*np.pi))
-                    ea_point_next = self.curve_points - round((ea_next+np.pi) * self.curve_points / (2*np.pi))
-                    ea_point_prev = self.curve_points - round((ea_prev+np.pi) * self.curve_points / (2*np.pi))
-                    if dr > 0:   # CCW
-                        curves_dark[vessel] = concat_wrap(curve_dark, coord_next, ea_point_next, ea_point_prev, coord_prev)
-                    else:   # CW
-                        curves_dark[vessel] = concat_wrap(curve_dark, coord_prev, ea_point_prev, ea_point_next, coord_next)
-
-            if np.isnan(next_intersect[0]):
-                curves_light[vessel] = curve_light
-                first_intersect[vessel] = np.array([np.nan, np.nan])
-        return curves_light, curves_dark, first_intersect, intersect_type, self.intersect_time, select_range
+        curve_segments_all(
+            self.ea, self.ecc, self.ma, self.n, self.dr, self.a, self.b, self.f, self.pea, self.ref,
+            self.body_pos, self.pos, self.body_impact, self.coi_enter, self.coi_leave,
+            np.asarray(self.visible_orbits, dtype=np.int64), self.curve_points,
+            self.segments, self.segment_ends, self.first_intersect, self.intersect_type, self.intersect_time, self.select_range,
+        )
+        return self.segments, self.segment_ends, self.first_intersect, self.intersect_type, self.intersect_time, self.select_range
@@ -12,9 +12,11 @@ Licence: GNU General Public License v3.0
 import cmath
 import math
 
+import numpy as np
+
 try:
-    from numba import complex128, float64, njit
-    from numba.types import UniTuple
+    from numba import bool_, complex128, float64, njit
+    from numba.types import Tuple, UniTuple
     numba_avail = True
 except ImportError:
     numba_avail = False
@@ -93,8 +95,24 @@ def solve_quartic(a, b, c, d, e):
     return (z1, z2, z3, z4)
 
 
+def solve_quartic_batch(coefficients, tol):
+    """Solves multiple quartic equations, with coefficients in rows: a, b, c, d, e.
+    Returns real parts of roots and mask of real roots, both with shape (N, 4).
+    Root is real if its imaginary part is within tolerance, relative to its real part."""
+
+    roots = np.empty((coefficients.shape[0], 4))
+    real = np.zeros((coefficients.shape[0], 4), dtype=np.bool_)
+    for num in range(coefficients.shape[0]):
+        z = solve_quartic(coefficients[num, 0], coefficients[num, 1], coefficients[num, 2], coefficients[num, 3], coefficients[num, 4])
+        for root in range(4):
+            roots[num, root] = z[root].real
+            real[num, root] = abs(z[root].imag) <= tol * max(1, abs(z[root].real))
+    return roots, real
+
+
 # if numba is available, compile functions ahead of time
 if numba_avail:
     jitkw = {"cache": True}
     solve_cubic_one = njit(float64(float64, float64, float64), **jitkw)(solve_cubic_one)
     solve_quartic = njit(UniTuple(complex128, 4)(float64, float64, float64, float64, float64), **jitkw)(solve_quartic)
+    solve_quartic_batch = njit(Tuple((float64[:, :], bool_[:, :]))(float64[:, :], float64), **jitkw)(solve_quartic_batch)
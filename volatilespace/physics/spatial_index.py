@@ -0,0 +1,234 @@
+import numpy as np
+
+try:   # to allow building without numba
+    from numba import float64, int64, njit
+    from numba.types import Tuple
+    numba_avail = True
+except ImportError:
+    numba_avail = False
+
+from volatilespace import peripherals
+
+leaf_size = 8   # max number of objects in leaf node
+max_depth = 16   # max tree depth, also number of morton code bits per axis
+stack_size = 3 * max_depth + 4   # each visited node replaces itself with at most 4 children
+# order, node ranges, node children, node boxes
+empty_tree = (np.zeros(0, dtype=np.int64), np.zeros((0, 2), dtype=np.int64), np.zeros((0, 4), dtype=np.int64), np.zeros((0, 4)))
+
+
+def morton_codes(centers):
+    """Calculate morton code of each center, inside bounding box of all centers"""
+    x_min = np.min(centers[:, 0])
+    y_min = np.min(centers[:, 1])
+    size = max(np.max(centers[:, 0]) - x_min, np.max(centers[:, 1]) - y_min)
+    scale = (2**max_depth - 1) / size if size > 0 else 0.0
+    codes = np.empty(centers.shape[0], dtype=np.int64)
+    for num in range(centers.shape[0]):
+        x = int((centers[num, 0] - x_min) * scale)
+        y = int((centers[num, 1] - y_min) * scale)
+        code = 0
+        for bit in range(max_depth):
+            code |= ((x >> bit) & 1) << (2 * bit + 1) | ((y >> bit) & 1) << (2 * bit)
+        codes[num] = code
+    return codes
+
+
+def build_index(centers, radius):
+    """
+    Build loose quadtree over circles. Tree is split by morton codes of circle centers,
+    and each node bounding box is expanded to fit whole circles in it, so large circles need no special handling.
+    Returns object order, node ranges in that order, node children (-1 if none) and node bounding boxes.
+    """
+    codes = morton_codes(centers)
+    order = np.argsort(codes)
+    codes = codes[order]
+    capacity = 4 * (centers.shape[0] // leaf_size + 1)
+    node_range = np.zeros((capacity, 2), dtype=np.int64)
+    node_child = np.full((capacity, 4), -1, dtype=np.int64)
+    node_box = np.empty((capacity, 4))
+    node_depth = np.zeros(capacity, dtype=np.int64)
+    node_range[0, 1] = centers.shape[0]
+    nodes_num = 1
+    stack = [0]
+    while stack:
+        node = stack.pop()
+        start = node_range[node, 0]
+        end = node_range[node, 1]
+        # bounding box containing all circles in node
+        node_box[node, 0] = np.inf
+        node_box[node, 1] = np.inf
+        node_box[node, 2] = -np.inf
+        node_box[node, 3] = -np.inf
+        for num in order[start:end]:
+            node_box[node, 0] = min(node_box[node, 0], centers[num, 0] - radius[num])
+            node_box[node, 1] = min(node_box[node, 1], centers[num, 1] - radius[num])
+            node_box[node, 2] = max(node_box[node, 2], centers[num, 0] + radius[num])
+            node_box[node, 3] = max(node_box[node, 3], centers[num, 1] + radius[num])
+        depth = node_depth[node]
+        if end - start <= leaf_size or depth >= max_depth:
+            continue
+        # skip levels where all objects are in same quadrant, objects are sorted so only first and last are checked
+        while depth < max_depth - 1 and (codes[start] >> 2 * (max_depth - 1 - depth)) == (codes[end - 1] >> 2 * (max_depth - 1 - depth)):
+            depth += 1
+        # split into quadrants, they are contiguous because objects are sorted by morton code
+        shift = 2 * (max_depth - 1 - depth)
+        child_start = start
+        for quadrant in range(4):
+            child_end = child_start
+            while child_end < end and ((codes[child_end] >> shift) & 3) == quadrant:
+                child_end += 1
+            if child_end > child_start:
+                if nodes_num == capacity:   # grow node arrays
+                    capacity *= 2
+                    node_range = np.concatenate((node_range, np.zeros_like(node_range)))
+                    node_child = np.concatenate((node_child, np.full_like(node_child, -1)))
+                    node_box = np.concatenate((node_box, np.empty_like(node_box)))
+                    node_depth = np.concatenate((node_depth, np.zeros_like(node_depth)))
+                node_range[nodes_num, 0] = child_start
+                node_range[nodes_num, 1] = child_end
+                node_depth[nodes_num] = depth + 1
+                node_child[node, quadrant] = nodes_num
+                stack.append(nodes_num)
+                nodes_num += 1
+            child_start = child_end
+    return order, node_range[:nodes_num], node_child[:nodes_num], node_box[:nodes_num]
+
+
+def query_index(order, node_range, node_child, node_box, centers, radius, box):
+    """Find all circles overlapping box (x_min, y_min, x_max, y_max), box edges are exclusive. Returns sorted indices."""
+    found = np.empty(len(order), dtype=np.int64)
+    found_num = 0
+    if not len(node_range):
+        return found[:0]
+    stack = np.empty(stack_size, dtype=np.int64)
+    stack[0] = 0
+    stack_num = 1
+    while stack_num:
+        stack_num -= 1
+        node = stack[stack_num]
+        if (node_box[node, 0] >= box[2] or node_box[node, 2] <= box[0] or
+                node_box[node, 1] >= box[3] or node_box[node, 3] <= box[1]):
+            continue
+        if node_child[node, 0] == node_child[node, 1] == node_child[node, 2] == node_child[node, 3] == -1:   # leaf
+            for item in range(node_range[node, 0], node_range[node, 1]):
+                num = order[item]
+                if (centers[num, 0] - radius[num] < box[2] and centers[num, 0] + radius[num] > box[0] and
+                        centers[num, 1] - radius[num] < box[3] and centers[num, 1] + radius[num] > box[1]):
+                    found[found_num] = num
+                    found_num += 1
+        else:
+            for quadrant in range(4):
+                if node_child[node, quadrant] != -1:
+                    stack[stack_num] = node_child[node, quadrant]
+                    stack_num += 1
+    return np.sort(found[:found_num])
+
+
+def query_index_point(order, node_range, node_child, node_box, centers, radius, x, y, stack, found, found_num):
+    """Append circles strictly containing point to found, starting at found_num. Returns new found_num, or -1 if found is full."""
+    stack[0] = 0
+    stack_num = 1
+    while stack_num:
+        stack_num -= 1
+        node = stack[stack_num]
+        if node_box[node, 0] >= x or node_box[node, 2] <= x or node_box[node, 1] >= y or node_box[node, 3] <= y:
+            continue
+        if node_child[node, 0] == node_child[node, 1] == node_child[node, 2] == node_child[node, 3] == -1:   # leaf
+            for item in range(node_range[node, 0], node_range[node, 1]):
+                num = order[item]
+                if (centers[num, 0] - x)**2 + (centers[num, 1] - y)**2 < radius[num]**2:
+                    if found_num == len(found):
+                        return -1
+                    found[found_num] = num
+                    found_num += 1
+        else:
+            for quadrant in range(4):
+                if node_child[node, quadrant] != -1:
+                    stack[stack_num] = node_child[node, quadrant]
+                    stack_num += 1
+    return found_num
+
+
+def query_index_points(order, node_range, node_child, node_box, centers, radius, points):
+    """
+    Find circles strictly containing each point. Returns offsets into found indices,
+    so circles containing point are: found[offsets[point]:offsets[point+1]], each sorted.
+    """
+    offsets = np.zeros(points.shape[0] + 1, dtype=np.int64)
+    found = np.empty(2 * points.shape[0] + 1, dtype=np.int64)
+    if not len(node_range):
+        return offsets, found[:0]
+    stack = np.empty(stack_size, dtype=np.int64)
+    for point in range(points.shape[0]):
+        found_num = -1
+        while found_num == -1:
+            found_num = query_index_point(
+                order, node_range, node_child, node_box, centers, radius,
+                points[point, 0], points[point, 1], stack, found, offsets[point],
+            )
+            if found_num == -1:   # grow found array and repeat this point
+                found = np.concatenate((found, np.empty_like(found)))
+        if found_num - offsets[point] > 1:
+            found[offsets[point]:found_num] = np.sort(found[offsets[point]:found_num])
+        offsets[point + 1] = found_num
+    return offsets, found[:offsets[-1]]
+
+
+class SpatialIndex():
+    """Loose quadtree index over circles, it should be rebuilt every time circles are moved"""
+
+    def __init__(self):
+        self.centers = np.zeros((0, 2))
+        self.radius = np.zeros(0)
+        self.tree = empty_tree
+
+
+    def build(self, centers, radius):
+        """Build index from circle centers and radii"""
+        self.centers = np.ascontiguousarray(centers, dtype=np.float64).reshape(-1, 2)
+        self.radius = np.ascontiguousarray(radius, dtype=np.float64)
+        if len(self.centers):
+            self.tree = build_index(self.centers, self.radius)
+        else:
+            self.tree = empty_tree
+
+
+    def query(self, box):
+        """Get sorted indices of circles overlapping box: (x_min, y_min, x_max, y_max)"""
+        return query_index(*self.tree, self.centers, self.radius, np.asarray(box, dtype=np.float64))
+
+
+    def query_point(self, point, pad=0):
+        """Get sorted indices of circles, expanded by pad, containing point"""
+        x, y = point
+        candidates = self.query((x - pad, y - pad, x + pad, y + pad))
+        distance = np.sqrt(np.sum((self.centers[candidates] - (x, y))**2, axis=1))
+        return candidates[distance <= self.radius[candidates] + pad]
+
+
+    def query_points(self, points):
+        """Get circles containing each point, as offsets and indices, see query_index_points()"""
+        return query_index_points(*self.tree, self.centers, self.radius, np.ascontiguousarray(points, dtype=np.float64))
+
+
+# if numba is enabled, compile functions ahead of time
+use_numba = peripherals.load_settings("game", "numba")
+if numba_avail and use_numba:
+    jitkw = {"cache": True, "fastmath": False}   # fastmath is disabled because node boxes start as infinite
+    morton_codes = njit(int64[:](float64[:, :]), **jitkw)(morton_codes)
+    build_index = njit(
+        Tuple((int64[:], int64[:, :], int64[:, :], float64[:, :]))(float64[:, :], float64[:]),
+        **jitkw,
+    )(build_index)
+    query_index = njit(
+        int64[:](int64[:], int64[:, :], int64[:, :], float64[:, :], float64[:, :], float64[:], float64[:]),
+        **jitkw,
+    )(query_index)
+    query_index_point = njit(
+        int64(int64[:], int64[:, :], int64[:, :], float64[:, :], float64[:, :], float64[:], float64, float64, int64[:], int64[:], int64),
+        **jitkw,
+    )(query_index_point)
+    query_index_points = njit(
+        Tuple((int64[:], int64[:]))(int64[:], int64[:, :], int64[:, :], float64[:, :], float64[:, :], float64[:], float64[:, :]),
+        **jitkw,
+    )(query_index_points)
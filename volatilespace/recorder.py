@@ -0,0 +1,118 @@
+import os
+
+import numpy as np
+
+buffer_ticks = 1024   # number of ticks kept in memory, before they are written to recording
+# per tick columns and their type, widths depend on number of bodies and vessels
+columns = {
+    "time": float,
+    "body_ma": float,
+    "vessel_ma": float,
+    "vessel_orbit": np.int64,   # index of current orbit of each vessel in orbits file
+}
+orbit_width = 7   # orbit row: tick, vessel, a, ecc, pe_arg, ref, dir
+
+
+def recording_path(path):
+    """Path to recording directory belonging to save file"""
+    return os.path.splitext(path)[0] + ".rec"
+
+
+def column_widths(bodies_num, vessels_num):
+    """Get number of values per tick for each column"""
+    return {
+        "time": 1,
+        "body_ma": bodies_num,
+        "vessel_ma": vessels_num,
+        "vessel_orbit": vessels_num,
+    }
+
+
+class Recorder():
+    """
+    Record simulation state every tick: time, mean anomaly of all bodies and vessels, and vessel orbit changes.
+    Ticks are kept in ring buffer that is appended to recording when full, so memory stays bounded during long runs.
+    Recording is directory with one file per column and fixed row size, so any tick can be read without reading others.
+    """
+    def __init__(self, path, bodies_num, vessels_num):
+        self.path = path
+        self.widths = column_widths(bodies_num, vessels_num)
+        self.buffer = {column: np.zeros((buffer_ticks, self.widths[column]), dtype=columns[column]) for column in columns}
+        self.buffer_num = 0   # ticks in buffer
+        self.written = 0   # ticks already in recording files
+        self.orbits = []   # orbit rows not yet written
+        self.orbits_num = 0   # all orbit rows, including written
+        self.vessel_orbit = np.full(vessels_num, -1, dtype=np.int64)
+        # new recording replaces old one
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "header.npy"), np.array([bodies_num, vessels_num], dtype=np.int64))
+        for column in list(columns) + ["orbits"]:
+            open(os.path.join(path, column), "wb").close()
+
+
+    def ticks(self):
+        """Number of recorded ticks, including ones in buffer"""
+        return self.written + self.buffer_num
+
+
+    def orbit(self, vessel, a, ecc, pe_arg, ref, direction):
+        """Record new orbit of vessel, it is valid from tick that is recorded next"""
+        self.orbits.append((self.ticks(), vessel, a, ecc, pe_arg, ref, direction))
+        self.vessel_orbit[vessel] = self.orbits_num
+        self.orbits_num += 1
+
+
+    def tick(self, time, body_ma, vessel_ma):
+        """Record state in one tick, recording is written when buffer is full"""
+        num = self.buffer_num
+        self.buffer["time"][num] = time
+        self.buffer["body_ma"][num] = body_ma
+        self.buffer["vessel_ma"][num] = vessel_ma
+        self.buffer["vessel_orbit"][num] = self.vessel_orbit
+        self.buffer_num += 1
+        if self.buffer_num == buffer_ticks:
+            self.flush()
+
+
+    def flush(self):
+        """Append all buffered ticks and orbits to recording files, and empty buffer"""
+        for column in columns:
+            with open(os.path.join(self.path, column), "ab") as f:
+                f.write(self.buffer[column][:self.buffer_num].tobytes())
+        if self.orbits:
+            with open(os.path.join(self.path, "orbits"), "ab") as f:
+                f.write(np.array(self.orbits, dtype=float).tobytes())
+        self.written += self.buffer_num
+        self.buffer_num = 0
+        self.orbits = []
+
+
+class Replay():
+    """Read recording written by Recorder, columns are memory mapped so seek to any tick is O(1)"""
+    def __init__(self, path):
+        self.path = path
+        bodies_num, vessels_num = np.load(os.path.join(path, "header.npy"))
+        widths = column_widths(bodies_num, vessels_num)
+        self.ticks = os.path.getsize(os.path.join(path, "time")) // np.dtype(float).itemsize
+        self.columns = {column: self.map(column, columns[column], widths[column]) for column in columns}
+        self.orbits = self.map("orbits", float, orbit_width)
+
+
+    def map(self, name, dtype, width):
+        """Memory map whole recording file with given row width, empty files can not be mapped"""
+        if not width:
+            return np.zeros((self.ticks, 0), dtype=dtype)
+        rows = os.path.getsize(os.path.join(self.path, name)) // (np.dtype(dtype).itemsize * width)
+        if not rows:
+            return np.zeros((0, width), dtype=dtype)
+        return np.memmap(os.path.join(self.path, name), dtype=dtype, mode="r", shape=(rows, width))
+
+
+    def seek(self, tick):
+        """Get state in tick: time, mean anomalies, and orbits of all vessels: a, ecc, pe_arg, ref, dir"""
+        return {
+            "time": float(self.columns["time"][tick, 0]),
+            "body_ma": np.array(self.columns["body_ma"][tick]),
+            "vessel_ma": np.array(self.columns["vessel_ma"][tick]),
+            "vessel_orb": np.array(self.orbits[self.columns["vessel_orbit"][tick], 2:]),
+        }
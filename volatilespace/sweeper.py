@@ -0,0 +1,211 @@
+import csv
+import itertools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import pygame
+
+from volatilespace import compiler, peripherals
+
+orbit_params = ("a", "ecc", "pe_arg", "ma", "ref", "dir")   # vessel orbit parameters that can be swept
+event_names = ["impact", "enter_coi", "leave_coi"]
+default_schedule = ((3600, 1), )   # warp schedule: sequence of (ticks, warp)
+event_dtype = [("scenario", np.int64), ("time", np.float64), ("vessel", np.int64), ("event", np.int64), ("body", np.int64)]
+
+# worker process state
+base = None   # save data and initial body data, shared by all scenarios
+physics_vessel = None
+ephemeris_cache = {}   # attached shared memory by name
+
+
+def results_path(path):
+    """Path to sweep results table belonging to save file"""
+    return os.path.splitext(path)[0] + ".sweep.csv"
+
+
+def headless():
+    """Physics reads screen size from display, so hidden display is created if there is none"""
+    if pygame.display.get_surface() is None:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        pygame.display.init()
+        pygame.display.set_mode((1, 1))
+
+
+def scenarios(grid):
+    """Get list of all scenarios from parameter grid: dict of parameter name and list of its values"""
+    for param in grid:
+        if param not in orbit_params + ("vessel", "warp"):
+            raise ValueError(f"Unknown sweep parameter: {param}")
+    return [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+
+
+def load_base(path):
+    """Load save and do initial body physics, without modifying save file"""
+    from volatilespace.physics import convert, phys_body
+    game_data, conf, body_data, body_orb_data, vessel_data, vessel_orb_data = peripherals.load_file(path)
+    if not body_orb_data["kepler"]:
+        body_orb_data = convert.to_kepler(body_data["mass"], body_orb_data, conf["gc"], conf["coi_coef"])
+    physics_body = phys_body.Physics()
+    physics_body.load(conf, body_data, dict(body_orb_data, ma=np.array(body_orb_data["ma"])), path)   # physics moves ma in place
+    body_phys_data, body_orb, _, _, _, _ = physics_body.initial(1)
+    return {
+        "path": path,
+        "game": game_data,
+        "conf": conf,
+        "body_data": body_data,
+        "body_phys_data": body_phys_data,
+        "body_orb": body_orb,
+        "body_orb_data": body_orb_data,
+        "vessel_data": vessel_data,
+        "vessel_orb_data": vessel_orb_data,
+    }
+
+
+def body_ephemeris(base_data, schedule):
+    """
+    Calculate body positions, mean and eccentric anomalies in each tick of warp schedule.
+    Returns array of rows: time, x positions, y positions, ma, ea, first row is initial state.
+    """
+    from volatilespace.physics import phys_body
+    physics_body = phys_body.Physics()
+    physics_body.load(base_data["conf"], base_data["body_data"], dict(base_data["body_orb_data"], ma=np.array(base_data["body_orb_data"]["ma"])), base_data["path"])
+    _, _, pos, ma, ea, _ = physics_body.initial(1)
+    ephemeris = np.empty((sum(ticks for ticks, _ in schedule) + 1, 1 + 4 * len(ma)))
+    ephemeris[0] = np.concatenate(([base_data["game"]["time"]], pos[:, 0], pos[:, 1], ma, ea))
+    row = 1
+    for ticks, warp in schedule:
+        for _ in range(ticks):
+            pos, ma, ea = physics_body.move(warp)
+            ephemeris[row] = np.concatenate(([ephemeris[row - 1, 0] + warp], pos[:, 0], pos[:, 1], ma, ea))
+            row += 1
+    return ephemeris
+
+
+def share(array):
+    """Copy array to new shared memory block, returns block and description used to attach to it"""
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+    return block, (block.name, array.shape)
+
+
+def attach(shared):
+    """Get read-only array from shared memory block description, blocks stay attached for lifetime of worker"""
+    name, shape = shared
+    if name not in ephemeris_cache:
+        ephemeris_cache[name] = shared_memory.SharedMemory(name=name)
+    array = np.ndarray(shape, dtype=np.float64, buffer=ephemeris_cache[name].buf)
+    array.flags.writeable = False
+    return array
+
+
+def init_worker(path):
+    """Setup worker process for running scenarios"""
+    global base, physics_vessel
+    compiler.setup()
+    headless()
+    from volatilespace.physics import phys_vessel
+    base = load_base(path)
+    physics_vessel = phys_vessel.Physics()
+
+
+def run_scenario(num, scenario, schedule, shared):
+    """Run one scenario with body ephemeris from shared memory, returns impact and COI events"""
+    from volatilespace.physics.phys_shared import point_between
+    ephemeris = attach(shared)
+    bodies_num = (ephemeris.shape[1] - 1) // 4
+    vessel_orb_data = {key: np.array(value) for key, value in base["vessel_orb_data"].items()}
+    vessel = scenario.get("vessel", base["game"]["vessel"] or 0)
+    for param in orbit_params:
+        if param in scenario:
+            vessel_orb_data[param][vessel] = scenario[param]
+
+    def body_state(tick):
+        """Get body positions, mean and eccentric anomalies, as copies because physics may keep them"""
+        row = ephemeris[tick]
+        pos = np.column_stack((row[1:1+bodies_num], row[1+bodies_num:1+2*bodies_num]))
+        return pos, np.array(row[1+2*bodies_num:1+3*bodies_num]), np.array(row[1+3*bodies_num:])
+
+    physics_vessel.load(base["conf"], base["body_phys_data"], base["body_orb"], base["vessel_data"], vessel_orb_data)
+    physics_vessel.initial(1, *body_state(0))
+    impacted = np.zeros(len(physics_vessel.names), dtype=bool)
+    events = []
+    tick = 0
+    for ticks, warp in schedule:
+        for _ in range(ticks):
+            tick += 1
+            time = ephemeris[tick, 0]
+            physics_vessel.predict_enter_coi_service()
+            physics_vessel.move(warp, *body_state(tick))
+            for ves in np.nonzero(~impacted)[0]:   # impacted vessels are lost, so their events are not recorded
+                impact = physics_vessel.body_impact[ves, int(physics_vessel.ecc[ves] >= 1)]
+                if not np.isnan(impact) and point_between(impact, physics_vessel.prev_ea[ves], physics_vessel.ea[ves], physics_vessel.dr[ves]):
+                    impacted[ves] = True
+                    events.append((num, time, ves, 0, physics_vessel.ref[ves]))
+            if np.all(impacted):
+                return events
+            changed = physics_vessel.cross_coi()
+            if changed is not None:
+                if not impacted[changed]:
+                    if physics_vessel.entered_coi == changed:
+                        events.append((num, time, changed, 1, physics_vessel.ref[changed]))
+                    else:
+                        events.append((num, time, changed, 2, physics_vessel.left_coi_prev_ref))
+                physics_vessel.change_vessel(changed)
+    return events
+
+
+def sweep(path, grid, schedule=default_schedule, jobs=None, progress=None):
+    """
+    Run all scenarios from parameter grid on save, in parallel processes.
+    Parameters are vessel orbit parameters (applied to "vessel", active vessel by default), and "warp" schedule.
+    Body ephemeris is calculated once for each warp schedule, and shared with all processes through shared memory.
+    Returns list of scenarios, and table of events: scenario, time, vessel, event (see event_names), body.
+    """
+    headless()
+    compiler.setup()
+    all_scenarios = scenarios(grid)
+    base_data = load_base(path)
+    schedules = {tuple(map(tuple, scenario.get("warp", schedule))) for scenario in all_scenarios}
+    blocks = []
+    shared = {}
+    events = []
+    try:
+        for warp_schedule in schedules:
+            block, shared[warp_schedule] = share(body_ephemeris(base_data, warp_schedule))
+            blocks.append(block)
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=context, initializer=init_worker, initargs=(path, )) as executor:
+            futures = []
+            for num, scenario in enumerate(all_scenarios):
+                warp_schedule = tuple(map(tuple, scenario.get("warp", schedule)))
+                futures.append(executor.submit(run_scenario, num, scenario, warp_schedule, shared[warp_schedule]))
+            for done, future in enumerate(as_completed(futures)):
+                events.extend(future.result())
+                if progress:
+                    progress(done + 1, len(futures))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    events = np.array(events, dtype=event_dtype)
+    return all_scenarios, np.sort(events, order=("scenario", "time"))
+
+
+def write_results(path, grid, all_scenarios, events):
+    """Write events table with parameters of their scenarios to csv file"""
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["scenario", *grid, "time", "vessel", "event", "body"])
+        for event in events:
+            scenario = all_scenarios[event["scenario"]]
+            writer.writerow([
+                event["scenario"],
+                *(scenario[param] for param in grid),
+                event["time"],
+                event["vessel"],
+                event_names[event["event"]],
+                event["body"],
+            ])
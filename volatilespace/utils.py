@@ -23,8 +23,8 @@ class ReturnThread(threading.Thread):
             return self.result
 
 
-def responsive_blocking(target, args=()):
-    """Run blocking, function and return value, but keep it pygame responsive"""
+def responsive_blocking(target, args=(), update=None):
+    """Run blocking, function and return value, but keep it pygame responsive, optionally calling update every tick"""
     thread = ReturnThread(target=target, args=args, daemon=True)
     thread.start()
     while thread.is_alive():
@@ -32,5 +32,7 @@ def responsive_blocking(target, args=()):
             if e.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
+        if update:
+            update()
         time.sleep(1/60)
     return (thread.join())